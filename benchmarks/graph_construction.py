@@ -0,0 +1,140 @@
+"""
+Measures how quickly graphs are built: the number of nodes per second created
+and set up (by set_dependencies), and then calculated for the first time.
+
+Usage:
+    python benchmarks/graph_construction.py [--nodes 1000000] [--shape tree|chain|wide] [--edge-store]
+
+Shapes:
+- tree:   Each node depends on (up to) four nodes in the next layer down.
+- chain:  Each node depends on the one before it. Every node is a new generation.
+- wide:   One node depends on all the others.
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from graph import *
+
+
+class TreeNode(GraphNode):
+    """
+    Node i depends on nodes 4i+1 to 4i+4, if they are in the graph.
+    """
+    def __init__(self, index, node_count, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = index
+        self.node_count = node_count
+        self.value = 0
+
+    @staticmethod
+    def make_node_id(index, node_count):
+        return str(index)
+
+    def set_dependencies(self):
+        first_child_index = self.index * 4 + 1
+        for index in range(first_child_index, min(first_child_index + 4, self.node_count)):
+            self.add_parent_node(TreeNode, index, self.node_count)
+
+    def calculate(self):
+        self.value = 1 + sum(x.value for x in self._parent_nodes)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class ChainNode(GraphNode):
+    """
+    Node i depends on node i-1.
+    """
+    def __init__(self, index, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = index
+        self.parent_node = None
+        self.value = 0
+
+    def set_dependencies(self):
+        if self.index > 0:
+            self.parent_node = self.add_parent_node(ChainNode, self.index - 1)
+
+    def calculate(self):
+        self.value = self.parent_node.value + 1 if self.parent_node is not None else 1
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class LeafNode(GraphNode):
+    """
+    A node with no parents.
+    """
+    def __init__(self, index, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.value = 1
+
+    def calculate(self):
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class WideNode(GraphNode):
+    """
+    Depends on node_count - 1 leaf nodes.
+    """
+    def __init__(self, node_count, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.node_count = node_count
+        self.value = 0
+
+    def set_dependencies(self):
+        for index in range(self.node_count - 1):
+            self.add_parent_node(LeafNode, index)
+
+    def calculate(self):
+        self.value = sum(x.value for x in self._parent_nodes)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def build_graph(shape, node_count, use_edge_store):
+    """
+    Builds and calculates a graph, and returns (graph-manager, set-up seconds,
+    calculation seconds).
+    """
+    graph_manager = GraphManager()
+    if use_edge_store:
+        graph_manager.edge_store = EdgeStore()
+
+    start_time = time.perf_counter()
+    if shape == "tree":
+        NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, TreeNode, 0, node_count)
+    elif shape == "chain":
+        NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, ChainNode, node_count - 1)
+    else:
+        NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, WideNode, node_count)
+    graph_manager._set_dependencies_on_new_nodes()
+    set_up_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    graph_manager.calculate()
+    calculation_seconds = time.perf_counter() - start_time
+    return graph_manager, set_up_seconds, calculation_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Graph construction benchmark")
+    parser.add_argument("--nodes", type=int, default=1000000, help="The number of nodes in the graph")
+    parser.add_argument("--shape", choices=("tree", "chain", "wide"), default="tree")
+    parser.add_argument("--edge-store", action="store_true", help="Hold the links in an EdgeStore")
+    args = parser.parse_args()
+
+    # Collections of the many new objects would otherwise dominate the timings...
+    gc.disable()
+    graph_manager, set_up_seconds, calculation_seconds = build_graph(args.shape, args.nodes, args.edge_store)
+    node_count = graph_manager.get_node_count()
+    total_seconds = set_up_seconds + calculation_seconds
+    print("shape=%s nodes=%d edge-store=%s" % (args.shape, node_count, args.edge_store))
+    print("set up:      %8.2fs %12.0f nodes/sec" % (set_up_seconds, node_count / set_up_seconds))
+    print("calculation: %8.2fs %12.0f nodes/sec" % (calculation_seconds, node_count / calculation_seconds))
+    print("total:       %8.2fs %12.0f nodes/sec" % (total_seconds, node_count / total_seconds))
+
+
+if __name__ == "__main__":
+    main()
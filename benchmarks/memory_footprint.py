@@ -0,0 +1,105 @@
+"""
+Measures the memory used by graphs, with tracemalloc: the bytes per node and
+bytes per edge for plain GraphNodes and for the test_nodes types, and the bytes
+per Quality object. It also prints GraphManager.memory_report()'s estimate of
+the bytes per node, for comparison.
+
+Usage:
+    python benchmarks/memory_footprint.py [--sizes 10000,100000,1000000] [--edge-store]
+
+Graphs:
+- graph-node:     A tree of GraphNodes. Each node depends on (up to) four others,
+                  so there is one edge per node.
+- currency-pair:  CurrencyPairHolidayNodes for one currency-pair over a range of
+                  dates. Each one depends on the two CurrencyHolidaysNodes, with
+                  keyed links, so there are two edges per node.
+
+Nodes are measured once they have been created and added to the graph. Edges
+are measured as the extra memory used when the nodes' dependencies are set up.
+Sizes of 10,000,000 need a host with tens of gigabytes of memory.
+"""
+import argparse
+import datetime
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from graph import *
+from test_nodes import *
+from graph_construction import TreeNode
+
+
+def measure_graph(graph_name, node_count, use_edge_store):
+    """
+    Builds a graph, and returns (bytes per node, bytes per edge, estimated bytes
+    per node).
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    if use_edge_store:
+        graph_manager.edge_store = EdgeStore()
+
+    # We create the nodes...
+    tracemalloc.start()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    if graph_name == "graph-node":
+        for index in range(node_count):
+            NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, TreeNode, index, node_count)
+    else:
+        first_date = datetime.date(2000, 1, 1)
+        for index in range(node_count):
+            date = first_date + datetime.timedelta(days=index)
+            NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, CurrencyPairHolidayNode, "EUR/USD", date)
+    nodes_bytes = tracemalloc.get_traced_memory()[0] - start_bytes
+
+    # We link them up...
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    graph_manager._set_dependencies_on_new_nodes()
+    edges_bytes = tracemalloc.get_traced_memory()[0] - start_bytes
+    tracemalloc.stop()
+
+    # The parents of the currency-pair nodes are added when the links are made,
+    # so they are counted with the edges...
+    report = graph_manager.memory_report()
+    edge_count = sum(x.edge_count for x in report)
+    estimated_bytes = sum(x.estimated_bytes for x in report if x.node_type != "CurrencyHolidaysNode")
+    return nodes_bytes / node_count, edges_bytes / max(edge_count, 1), estimated_bytes / node_count
+
+
+def measure_quality(count):
+    """
+    Returns the bytes per Quality object.
+    """
+    tracemalloc.start()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    qualities = [Quality() for _ in range(count)]
+    quality_bytes = tracemalloc.get_traced_memory()[0] - start_bytes - sys.getsizeof(qualities)
+    tracemalloc.stop()
+    return quality_bytes / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Graph memory footprint benchmark")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated numbers of nodes")
+    parser.add_argument("--edge-store", action="store_true", help="Hold the links in an EdgeStore")
+    args = parser.parse_args()
+    sizes = [int(x) for x in args.sizes.split(",")]
+
+    # Collections would otherwise run during the measurements...
+    gc.disable()
+    print("edge-store=%s" % args.edge_store)
+    print("%-14s %10s %14s %14s %14s" % ("graph", "nodes", "bytes/node", "bytes/edge", "estimate/node"))
+    for graph_name in ("graph-node", "currency-pair"):
+        for size in sizes:
+            bytes_per_node, bytes_per_edge, estimated_bytes_per_node = measure_graph(graph_name, size, args.edge_store)
+            print("%-14s %10d %14.0f %14.0f %14.0f" % (
+                graph_name, size, bytes_per_node, bytes_per_edge, estimated_bytes_per_node))
+            gc.collect()
+    for size in sizes:
+        print("%-14s %10d %14.0f" % ("quality", size, measure_quality(size)))
+
+
+if __name__ == "__main__":
+    main()
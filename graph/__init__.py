@@ -1,6 +1,20 @@
+from .change_tracer import ChangeTracer
+from .cost_analysis import CostAnalysis
+from .delta import Delta
+from .edge_store import EdgeStore, NodeLinks
+from .execution_plan import ExecutionPlan
+from .forked_graph_manager import ForkedGraphManager
 from .graph_exception import GraphException
+from .graph_metrics import GraphMetrics
 from .graph_manager import GraphManager
 from .graph_node import GraphNode
+from .input_journal import InputJournal, JournalRecorder
 from .node_factory import NodeFactory
+from .node_handle import NodeHandle
 from .node_info import NodeInfo
-from .quality import Quality
\ No newline at end of file
+from .node_spiller import NodeSpiller
+from .quality import Quality
+from .replay_engine import ReplayEngine
+from .scenario_runner import ScenarioRunner
+from .slow_cycle_profiler import SlowCycleProfiler
+from .topological_order import TopologicalOrder
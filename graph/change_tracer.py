@@ -0,0 +1,195 @@
+import collections
+import time
+from .graph_node import GraphNode
+
+
+class ChangeTracer(object):
+    """
+    Records how changes propagate through the graph, so that you can find out
+    why a node calculated.
+
+    To use it, set the graph-manager's tracer property:
+        graph_manager.tracer = ChangeTracer()
+
+    The tracer records three kinds of event, with timestamps:
+    - CHANGED:     A node was marked as needing calculation (a 'root' change).
+    - INVALIDATED: A node was invalidated by one of its parents.
+    - CALCULATED:  A node calculated, and either did or did not calculate its children.
+
+    Events are held in a ring buffer of fixed capacity, so the tracer can be
+    left running in long-lived processes. The oldest events are discarded first.
+    """
+
+    # 'enum' for the type of event...
+    class EventType(object):
+        CHANGED = 1
+        INVALIDATED = 2
+        CALCULATED = 3
+
+    # One traced event. parent_id is only set for INVALIDATED events, and
+    # children_calculated is only set for CALCULATED events...
+    Event = collections.namedtuple(
+        "Event",
+        ["cycle_number", "timestamp", "event_type", "node_id", "parent_id", "children_calculated"])
+
+    def __init__(self, capacity=100000):
+        """
+        The 'constructor'.
+        """
+        # The ring buffer of events...
+        self._events = collections.deque(maxlen=capacity)
+
+        # The number of the calculation cycle being traced...
+        self._cycle_number = 0
+
+    def clear(self):
+        """
+        Clears all traced events.
+        """
+        self._events.clear()
+
+    def cycle_started(self, cycle_number):
+        """
+        Called by the graph-manager when a calculation cycle starts.
+        """
+        self._cycle_number = cycle_number
+
+    def node_changed(self, node):
+        """
+        Called by the graph-manager for each node which has changed at the
+        start of a calculation cycle.
+        """
+        self._events.append(ChangeTracer.Event(
+            self._cycle_number, time.perf_counter(), ChangeTracer.EventType.CHANGED,
+            node.node_id, None, None))
+
+    def node_invalidated(self, node, parent):
+        """
+        Called when a node is invalidated by one of its parents.
+        """
+        self._events.append(ChangeTracer.Event(
+            self._cycle_number, time.perf_counter(), ChangeTracer.EventType.INVALIDATED,
+            node.node_id, parent.node_id, None))
+
+    def node_calculated(self, node, calculate_children):
+        """
+        Called when a node has calculated. calculate_children is the value
+        returned by the node's calculate() method.
+        """
+        children_calculated = (calculate_children == GraphNode.CalculateChildrenType.CALCULATE_CHILDREN)
+        self._events.append(ChangeTracer.Event(
+            self._cycle_number, time.perf_counter(), ChangeTracer.EventType.CALCULATED,
+            node.node_id, None, children_calculated))
+
+    def get_cycle_numbers(self):
+        """
+        Returns a list of the calculation cycle numbers for which events are held.
+        """
+        cycle_numbers = []
+        for event in self._events:
+            if not cycle_numbers or cycle_numbers[-1] != event.cycle_number:
+                cycle_numbers.append(event.cycle_number)
+        return cycle_numbers
+
+    def get_events(self, cycle_number=None):
+        """
+        Returns a list of events for the cycle passed in, or for the most recent
+        traced cycle if cycle_number is None.
+        """
+        if not self._events:
+            return []
+        if cycle_number is None:
+            cycle_number = self._events[-1].cycle_number
+        return [x for x in self._events if x.cycle_number == cycle_number]
+
+    def explain(self, node_id, cycle_number=None, max_paths=10):
+        """
+        Explains why the node passed in calculated in a calculation cycle (by
+        default, the most recent traced cycle).
+
+        Returns a list of causal chains. Each chain is a list of node IDs, starting
+        with a root node which changed, followed by the nodes through which the
+        change propagated, and ending with the node passed in. A parent is only
+        part of a chain if it calculated its children, ie if its output changed.
+        At most max_paths chains are returned.
+        """
+        events = self.get_events(cycle_number)
+
+        # We find which nodes changed, and which parents invalidated each node...
+        root_node_ids = set()
+        changed_node_ids = set()
+        invalidating_parent_ids = {}
+        for event in events:
+            if event.event_type == ChangeTracer.EventType.CHANGED:
+                root_node_ids.add(event.node_id)
+            elif event.event_type == ChangeTracer.EventType.INVALIDATED:
+                invalidating_parent_ids.setdefault(event.node_id, set()).add(event.parent_id)
+            elif event.children_calculated:
+                changed_node_ids.add(event.node_id)
+
+        # We walk back from the node to the roots, through the parents whose
+        # changes caused their children to calculate...
+        return self._find_causal_paths(node_id, root_node_ids, changed_node_ids, invalidating_parent_ids, max_paths)
+
+    def get_unchanged_calculations(self, cycle_number=None):
+        """
+        Returns a dictionary of node ID -> number of calculations for nodes which
+        calculated in a cycle (by default, the most recent traced cycle) but whose
+        output did not change. These are candidates for spurious propagation: the
+        change which triggered them did not need to reach them.
+        """
+        results = {}
+        for event in self.get_events(cycle_number):
+            if event.event_type == ChangeTracer.EventType.CALCULATED and not event.children_calculated:
+                results[event.node_id] = results.get(event.node_id, 0) + 1
+        return results
+
+    @staticmethod
+    def _find_causal_paths(node_id, root_node_ids, changed_node_ids, invalidating_parent_ids, max_paths):
+        """
+        Returns up to max_paths causal chains from the root nodes to the node passed in.
+
+        We first find the nodes which lead back to a root, so that the search only
+        follows parents which complete a chain. (Otherwise graphs with many diamonds
+        could need an exponential number of steps.) The search uses a stack rather
+        than recursion, so that it is not limited by the recursion limit.
+        """
+        # We find the nodes which lead back to a root, working forward from the
+        # roots through the children which each changed node invalidated...
+        invalidated_child_ids = {}
+        for child_id, parent_ids in invalidating_parent_ids.items():
+            for parent_id in parent_ids:
+                if parent_id in changed_node_ids:
+                    invalidated_child_ids.setdefault(parent_id, []).append(child_id)
+        leading_node_ids = set(root_node_ids)
+        node_ids_to_visit = list(root_node_ids)
+        while node_ids_to_visit:
+            for child_id in invalidated_child_ids.get(node_ids_to_visit.pop(), ()):
+                if child_id not in leading_node_ids:
+                    leading_node_ids.add(child_id)
+                    node_ids_to_visit.append(child_id)
+
+        paths = []
+        if node_id not in leading_node_ids:
+            return paths
+        if node_id in root_node_ids:
+            paths.append([node_id])
+
+        # We walk back from the node. The path is reversed, and the stack holds an
+        # iterator over the parents of each node in it...
+        path = [node_id]
+        path_node_ids = {node_id}
+        stack = [iter(sorted(invalidating_parent_ids.get(node_id, ())))]
+        while stack and len(paths) < max_paths:
+            parent_id = next(stack[-1], None)
+            if parent_id is None:
+                stack.pop()
+                path_node_ids.discard(path.pop())
+                continue
+            if parent_id in changed_node_ids and parent_id in leading_node_ids and parent_id not in path_node_ids:
+                path.append(parent_id)
+                path_node_ids.add(parent_id)
+                if parent_id in root_node_ids:
+                    paths.append(list(reversed(path)))
+                stack.append(iter(sorted(invalidating_parent_ids.get(parent_id, ()))))
+        return paths
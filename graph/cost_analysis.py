@@ -0,0 +1,137 @@
+from .node_factory import NodeFactory
+
+
+class CostAnalysis(object):
+    """
+    Combines the measured calculation cost of each node with the shape of
+    the graph, to show where the time in a calculation cycle goes.
+
+    You get one of these from GraphManager.get_cost_analysis(). The costs
+    are the most recently measured calculation times (in seconds) of each
+    node, which are only recorded if the graph-manager's
+    measure_calculation_times property is True. Nodes which have not been
+    measured have a cost of zero.
+
+    The analysis provides:
+    - work:           The total cost of calculating every node.
+    - span:           The cost of the most expensive chain of dependencies.
+    - critical_path:  The node IDs of that chain, from its root to its leaf.
+                      This bounds the latency of a cycle which calculates all
+                      these nodes, however many nodes were calculated in parallel.
+    - parallelism:    work / span. The maximum speed-up available from
+                      calculating independent nodes in parallel.
+    - costs_by_type:  node-type -> total cost of the nodes of that type.
+    - subtree_costs_by_type:
+                      node-type -> total cost of the nodes of that type and all
+                      their ancestors, ie the cost of calculating that type from
+                      scratch. Shared ancestors are only counted once per type.
+    """
+    def __init__(self, nodes, costs):
+        """
+        The 'constructor'. Analyses the collection of nodes passed in, using the
+        dictionary of node -> cost.
+        """
+        self.work = 0.0
+        self.span = 0.0
+        self.critical_path = []
+        self.parallelism = 0.0
+        self.costs_by_type = {}
+        self.subtree_costs_by_type = {}
+
+        nodes = list(nodes)
+        self._analyse_critical_path(nodes, costs)
+        self._analyse_costs_by_type(nodes, costs)
+
+    def get_most_expensive_subtrees(self, count=10):
+        """
+        Returns a list of (node-type, subtree-cost) for the node types with the
+        most expensive subtrees, most expensive first.
+        """
+        results = sorted(self.subtree_costs_by_type.items(), key=lambda x: x[1], reverse=True)
+        return results[:count]
+
+    def _analyse_critical_path(self, nodes, costs):
+        """
+        Finds the total work, the span and the critical path.
+        """
+        # We process the nodes in topological order (parents before children),
+        # finding the most expensive chain of ancestors which finishes at each
+        # node, and the parent at the end of that chain...
+        finish_costs = {}
+        critical_parents = {}
+        for node in self._get_topological_order(nodes):
+            cost = costs.get(node, 0.0)
+            self.work += cost
+
+            critical_parent = None
+            start_cost = 0.0
+            for parent in node._parent_nodes:
+                parent_finish_cost = finish_costs.get(parent, 0.0)
+                if critical_parent is None or parent_finish_cost > start_cost:
+                    critical_parent = parent
+                    start_cost = parent_finish_cost
+            finish_costs[node] = start_cost + cost
+            critical_parents[node] = critical_parent
+
+        if not finish_costs:
+            return
+
+        # The critical path ends at the node with the most expensive chain...
+        node = max(finish_costs, key=lambda x: finish_costs[x])
+        self.span = finish_costs[node]
+        while node is not None:
+            self.critical_path.append(node.node_id)
+            node = critical_parents[node]
+        self.critical_path.reverse()
+
+        if self.span > 0.0:
+            self.parallelism = self.work / self.span
+
+    def _analyse_costs_by_type(self, nodes, costs):
+        """
+        Finds the cost of each node type, and of the subtrees which calculate them.
+        """
+        nodes_by_type = {}
+        for node in nodes:
+            node_type = NodeFactory.get_node_type_name(type(node))
+            nodes_by_type.setdefault(node_type, []).append(node)
+            self.costs_by_type[node_type] = self.costs_by_type.get(node_type, 0.0) + costs.get(node, 0.0)
+
+        for node_type, type_nodes in nodes_by_type.items():
+            # We find the nodes of this type and all their ancestors...
+            subtree_nodes = set()
+            nodes_to_visit = list(type_nodes)
+            while nodes_to_visit:
+                node = nodes_to_visit.pop()
+                if node in subtree_nodes:
+                    continue
+                subtree_nodes.add(node)
+                nodes_to_visit.extend(node._parent_nodes)
+            self.subtree_costs_by_type[node_type] = sum(costs.get(x, 0.0) for x in subtree_nodes)
+
+    @staticmethod
+    def _get_topological_order(nodes):
+        """
+        Returns the nodes passed in, ordered so that each node comes after
+        all its parents.
+        """
+        node_set = set(nodes)
+        parent_counts = {}
+        ready_nodes = []
+        for node in nodes:
+            parent_count = sum(1 for x in node._parent_nodes if x in node_set)
+            parent_counts[node] = parent_count
+            if parent_count == 0:
+                ready_nodes.append(node)
+
+        results = []
+        while ready_nodes:
+            node = ready_nodes.pop()
+            results.append(node)
+            for child in node._child_nodes:
+                if child not in parent_counts:
+                    continue
+                parent_counts[child] -= 1
+                if parent_counts[child] == 0:
+                    ready_nodes.append(child)
+        return results
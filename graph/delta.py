@@ -0,0 +1,34 @@
+class Delta(object):
+    """
+    Describes how the output of a node changed when it calculated, as the
+    items added to it and removed from it.
+
+    A node can publish one of these from calculate() by calling set_delta().
+    Its children can then read it with get_parent_delta(), and update their
+    own outputs from the change, rather than from the parent's whole output.
+    For example, a node holding a set of holidays might publish the holidays
+    added and removed, so that a child which checks one date can skip its
+    calculation if the date is not in the delta.
+    """
+    def __init__(self, added=(), removed=()):
+        """
+        The 'constructor'. added and removed can be any collections.
+        """
+        self.added = added
+        self.removed = removed
+
+    def is_empty(self):
+        """
+        Returns True if no items were added or removed.
+        """
+        return not self.added and not self.removed
+
+    def affects(self, item):
+        """
+        Returns True if the item passed in was added or removed.
+        """
+        return item in self.added or item in self.removed
+
+
+# The delta for a parent which has not changed...
+Delta.EMPTY = Delta()
@@ -0,0 +1,404 @@
+import array
+import collections.abc
+
+# numpy is optional. If it is available, we use it to find descendants of nodes...
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class EdgeStore(object):
+    """
+    Holds the links between the nodes of a graph in flat arrays, instead of
+    in a set of parents and a set of children on each node.
+
+    Python sets cost a couple of hundred bytes each even when they are small,
+    which adds up on graphs with millions of links. In the edge store each
+    node has an integer index, and the parents and children of each node are
+    held as a row of indices in one large array (the 'compressed sparse row'
+    layout). Rows are allocated with some slack, so links can be added without
+    moving other rows. When a row fills up, it is moved to the end of the array
+    with double the space, and the array is compacted once more than half of
+    it is unused.
+
+    To use it, set the graph-manager's edge_store property before adding nodes:
+        graph_manager.edge_store = EdgeStore()
+
+    The nodes' _parent_nodes and _child_nodes are then NodeLinks views onto
+    the store, which support the read-only parts of the set API used by nodes
+    (iteration, len, 'in', copy and difference). Links are added and removed
+    through the usual GraphNode methods.
+
+    Checking whether two nodes are linked is linear in the number of links of
+    the less connected of the two, and removing a link is linear in the number
+    of links of both. This is fast for the small numbers of parents and children
+    that most nodes have.
+    """
+    def __init__(self):
+        """
+        The 'constructor'.
+        """
+        # The nodes, by index. Indexes of removed nodes are None until reused...
+        self._nodes = []
+        self._free_indices = []
+
+        # The parent and child links, as rows of node indices...
+        self.parents = AdjacencyArrays()
+        self.children = AdjacencyArrays()
+        self.parents.opposite = self.children
+        self.children.opposite = self.parents
+
+    def add_node(self, node):
+        """
+        Adds a node to the store, and sets up its _parent_nodes and _child_nodes
+        views. The node must not have any links yet.
+        """
+        if self._free_indices:
+            index = self._free_indices.pop()
+            self._nodes[index] = node
+        else:
+            index = len(self._nodes)
+            self._nodes.append(node)
+            self.parents.add_row()
+            self.children.add_row()
+        node._edge_index = index
+        node._parent_nodes = NodeLinks(self, self.parents, index)
+        node._child_nodes = NodeLinks(self, self.children, index)
+
+    def remove_node(self, node):
+        """
+        Removes a node (which must have been unlinked) from the store. The
+        node gets empty sets of parents and children, so that it no longer
+        refers to the store.
+        """
+        index = node._edge_index
+        self.parents.clear_row(index)
+        self.children.clear_row(index)
+        self._nodes[index] = None
+        self._free_indices.append(index)
+        node._edge_index = None
+        node._parent_nodes = set()
+        node._child_nodes = set()
+
+    def clear(self):
+        """
+        Removes all nodes and links from the store.
+        """
+        for node in self._nodes:
+            if node is not None:
+                node._edge_index = None
+                node._parent_nodes = set()
+                node._child_nodes = set()
+        self._nodes = []
+        self._free_indices = []
+        self.parents = AdjacencyArrays()
+        self.children = AdjacencyArrays()
+        self.parents.opposite = self.children
+        self.children.opposite = self.parents
+
+    def get_index(self, node):
+        """
+        Returns the index of the node passed in, or None if it is not in the store.
+        """
+        index = getattr(node, "_edge_index", None)
+        if index is None or index >= len(self._nodes) or self._nodes[index] is not node:
+            return None
+        return index
+
+    def get_node(self, index):
+        """
+        Returns the node with the index passed in.
+        """
+        return self._nodes[index]
+
+    def get_node_capacity(self):
+        """
+        Returns the number of node indices in use, including those of removed
+        nodes which are waiting to be reused. Node indices are less than this.
+        """
+        return len(self._nodes)
+
+    def add_link(self, parent, child):
+        """
+        Links the parent and child passed in.
+        """
+        self.parents.add(child._edge_index, parent._edge_index)
+        self.children.add(parent._edge_index, child._edge_index)
+
+    def remove_link(self, parent, child):
+        """
+        Removes the link between the parent and child passed in.
+        """
+        self.parents.remove(child._edge_index, parent._edge_index)
+        self.children.remove(parent._edge_index, child._edge_index)
+
+    def remove_parents(self, node):
+        """
+        Removes all links from the node passed in to its parents.
+        """
+        index = node._edge_index
+        for parent_index in self.parents.get_row(index):
+            self.children.remove(parent_index, index)
+        self.parents.clear_row(index)
+
+    def remove_children(self, node):
+        """
+        Removes all links from the node passed in to its children.
+        """
+        index = node._edge_index
+        for child_index in self.children.get_row(index):
+            self.parents.remove(child_index, index)
+        self.children.clear_row(index)
+
+    def get_descendants(self, nodes):
+        """
+        Returns a list of the nodes passed in and all their descendants.
+        """
+        indices = [x._edge_index for x in nodes]
+        if numpy is not None:
+            descendant_indices = self._get_descendant_indices_numpy(indices)
+        else:
+            descendant_indices = self._get_descendant_indices(indices)
+        return [self._nodes[x] for x in descendant_indices]
+
+    def _get_descendant_indices(self, indices):
+        """
+        Returns the indices of the nodes passed in and all their descendants.
+        """
+        children = self.children
+        offsets = children.offsets
+        counts = children.counts
+        child_indices = children.indices
+        is_descendant = bytearray(len(self._nodes))
+        results = []
+        indices_to_visit = list(indices)
+        while indices_to_visit:
+            index = indices_to_visit.pop()
+            if is_descendant[index]:
+                continue
+            is_descendant[index] = 1
+            results.append(index)
+            offset = offsets[index]
+            indices_to_visit.extend(child_indices[offset:offset + counts[index]])
+        return results
+
+    def _get_descendant_indices_numpy(self, indices):
+        """
+        Returns the indices of the nodes passed in and all their descendants,
+        using numpy to process each generation of descendants in one go.
+        """
+        children = self.children
+        offsets = numpy.frombuffer(children.offsets, dtype=numpy.int64)
+        counts = numpy.frombuffer(children.counts, dtype=numpy.int32)
+        child_indices = numpy.frombuffer(children.indices, dtype=numpy.int32)
+        is_descendant = numpy.zeros(len(self._nodes), dtype=bool)
+        frontier = numpy.unique(numpy.array(indices, dtype=numpy.int64))
+        is_descendant[frontier] = True
+        while frontier.size > 0:
+            # We find the positions of the children of the frontier nodes, ie
+            # the ranges offsets[i]:offsets[i] + counts[i] for each node i...
+            frontier_counts = counts[frontier].astype(numpy.int64)
+            total_count = int(frontier_counts.sum())
+            if total_count == 0:
+                break
+            range_starts = numpy.cumsum(frontier_counts) - frontier_counts
+            positions = numpy.repeat(offsets[frontier] - range_starts, frontier_counts) + numpy.arange(total_count)
+
+            # The children we have not seen before are the next frontier...
+            frontier = numpy.unique(child_indices[positions])
+            frontier = frontier[~is_descendant[frontier]]
+            is_descendant[frontier] = True
+        return numpy.flatnonzero(is_descendant).tolist()
+
+    def get_memory_size(self):
+        """
+        Returns the approximate number of bytes used by the arrays in the store.
+        """
+        return self.parents.get_memory_size() + self.children.get_memory_size()
+
+
+class AdjacencyArrays(object):
+    """
+    One direction of the links in an EdgeStore. Row i holds the indices of
+    the nodes linked to node i, in indices[offsets[i]:offsets[i] + counts[i]],
+    with space for capacities[i] indices.
+    """
+
+    # The capacity of a row when its first index is added...
+    INITIAL_ROW_CAPACITY = 2
+
+    def __init__(self):
+        """
+        The 'constructor'.
+        """
+        self.offsets = array.array("q")
+        self.counts = array.array("i")
+        self.capacities = array.array("i")
+        self.indices = array.array("i")
+
+        # The number of items in indices which are not in any row, as
+        # their rows have been moved...
+        self._unused_count = 0
+
+        # The arrays holding the links in the other direction...
+        self.opposite = None
+
+    def add_row(self):
+        """
+        Adds an empty row.
+        """
+        self.offsets.append(len(self.indices))
+        self.counts.append(0)
+        self.capacities.append(0)
+
+    def get_row(self, row):
+        """
+        Returns a copy of the indices in the row passed in.
+        """
+        offset = self.offsets[row]
+        return self.indices[offset:offset + self.counts[row]]
+
+    def contains(self, row, index):
+        """
+        Returns True if the row passed in holds the index passed in.
+
+        Links are held in both directions, so we search whichever of the two
+        rows is shorter. (A node with many parents usually has parents with
+        few children, and vice versa.)
+        """
+        adjacency = self
+        if self.opposite is not None and self.opposite.counts[index] < self.counts[row]:
+            adjacency = self.opposite
+            row, index = index, row
+        offset = adjacency.offsets[row]
+        try:
+            adjacency.indices.index(index, offset, offset + adjacency.counts[row])
+            return True
+        except ValueError:
+            return False
+
+    def add(self, row, index):
+        """
+        Adds an index to a row.
+        """
+        count = self.counts[row]
+        if count == self.capacities[row]:
+            self._grow_row(row)
+        self.indices[self.offsets[row] + count] = index
+        self.counts[row] = count + 1
+
+    def remove(self, row, index):
+        """
+        Removes an index from a row, by moving the last index in the row into its place.
+        """
+        offset = self.offsets[row]
+        last_position = offset + self.counts[row] - 1
+        position = self.indices.index(index, offset, last_position + 1)
+        self.indices[position] = self.indices[last_position]
+        self.counts[row] -= 1
+
+    def clear_row(self, row):
+        """
+        Removes all indices from a row. The row keeps its space.
+        """
+        self.counts[row] = 0
+
+    def get_memory_size(self):
+        """
+        Returns the approximate number of bytes used by the arrays.
+        """
+        return sum(x.buffer_info()[1] * x.itemsize
+                   for x in (self.offsets, self.counts, self.capacities, self.indices))
+
+    def _grow_row(self, row):
+        """
+        Moves a full row to the end of the indices, with double the space.
+        """
+        capacity = self.capacities[row]
+        if self._unused_count > len(self.indices) // 2:
+            self._compact()
+
+        offset = self.offsets[row]
+        new_capacity = max(capacity * 2, AdjacencyArrays.INITIAL_ROW_CAPACITY)
+        self.offsets[row] = len(self.indices)
+        self.indices.extend(self.indices[offset:offset + capacity])
+        self.indices.extend(array.array("i", bytes(4 * (new_capacity - capacity))))
+        self.capacities[row] = new_capacity
+        self._unused_count += capacity
+
+    def _compact(self):
+        """
+        Copies the rows into a new array of indices, leaving out the space
+        left behind when rows were moved.
+        """
+        indices = array.array("i")
+        for row in range(len(self.offsets)):
+            offset = self.offsets[row]
+            self.offsets[row] = len(indices)
+            indices.extend(self.indices[offset:offset + self.capacities[row]])
+        self.indices = indices
+        self._unused_count = 0
+
+
+class NodeLinks(collections.abc.Set):
+    """
+    A view onto the parents or children of one node in an EdgeStore, which
+    behaves like a (read-only) set of nodes. It compares equal to a set of
+    the same nodes, and the set operators return sets.
+    """
+    __slots__ = ("_edge_store", "_adjacency", "_row")
+
+    def __init__(self, edge_store, adjacency, row):
+        """
+        The 'constructor'.
+        """
+        self._edge_store = edge_store
+        self._adjacency = adjacency
+        self._row = row
+
+    def __len__(self):
+        return self._adjacency.counts[self._row]
+
+    def __iter__(self):
+        # We iterate over a copy of the row, so that links can be changed
+        # while we are iterating...
+        nodes = self._edge_store._nodes
+        return iter([nodes[x] for x in self._adjacency.get_row(self._row)])
+
+    def __contains__(self, node):
+        index = self._edge_store.get_index(node)
+        if index is None:
+            return False
+        return self._adjacency.contains(self._row, index)
+
+    @classmethod
+    def _from_iterable(cls, nodes):
+        """
+        Returns the results of the set operators as sets.
+        """
+        return set(nodes)
+
+    def copy(self):
+        """
+        Returns the nodes as a set.
+        """
+        return set(self)
+
+    def union(self, *others):
+        """
+        Returns a set of the nodes which are in this or any of the others passed in.
+        """
+        return set(self).union(*others)
+
+    def intersection(self, *others):
+        """
+        Returns a set of the nodes which are also in all the others passed in.
+        """
+        return set(self).intersection(*others)
+
+    def difference(self, *others):
+        """
+        Returns a set of the nodes which are not in the others passed in.
+        """
+        return set(self).difference(*others)
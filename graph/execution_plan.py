@@ -0,0 +1,124 @@
+import array
+import heapq
+
+
+class ExecutionPlan(object):
+    """
+    A snapshot of the shape of the graph, flattened into arrays so that
+    calculation cycles can run through it without the per-node set copies
+    and recursive invalidation of the normal calculation.
+
+    You get one of these from GraphManager.compile(). It holds:
+    - nodes:          The nodes, in the order in which they are calculated.
+                      Each node comes after all its parents, and nodes with a
+                      higher (effective) priority come as early as they can.
+    - positions:      node -> its index in the nodes list.
+    - child_offsets:  The children of the node at position i are at
+    - child_indices:  child_indices[child_offsets[i]:child_offsets[i+1]].
+                      (This is the 'compressed sparse row' layout.)
+    - priorities:     The effective priority of the node at each position.
+
+    The plan is only valid while the shape of the graph stays the same. The
+    graph-manager discards it when links or nodes are added or removed.
+    """
+    def __init__(self, nodes, effective_priorities):
+        """
+        The 'constructor'. Creates a plan for the collection of nodes passed
+        in, using the dictionary of node -> effective priority.
+        """
+        self.nodes = self._get_calculation_order(list(nodes), effective_priorities)
+        self.positions = {node: position for position, node in enumerate(self.nodes)}
+        self.priorities = [effective_priorities.get(node, 0) for node in self.nodes]
+
+        # We store the children of each node, as positions in the plan...
+        positions = self.positions
+        self.child_offsets = array.array("l", [0])
+        self.child_indices = array.array("l")
+        for node in self.nodes:
+            self.child_indices.extend(sorted(positions[x] for x in node._child_nodes if x in positions))
+            self.child_offsets.append(len(self.child_indices))
+
+    def get_node_count(self):
+        """
+        Returns the number of nodes in the plan.
+        """
+        return len(self.nodes)
+
+    def get_dirty_positions(self, changed_nodes, keyed_child_positions=None):
+        """
+        Returns the sorted positions of the changed nodes passed in and all their
+        descendants, ie the nodes which need to be visited in a calculation cycle.
+
+        Changed nodes whose changes are keyed (see GraphNode.set_changed_keys)
+        only lead to the children linked with those keys, unless they are also
+        descendants of other changed nodes. If a dictionary is passed in as
+        keyed_child_positions, it is filled in with position -> the sorted
+        positions of the children to visit, for these nodes.
+        """
+        positions = self.positions
+        child_offsets = self.child_offsets
+        child_indices = self.child_indices
+
+        # Each position is clean (0), dirty (1) or dirty with only its keyed
+        # children to visit (2)...
+        is_dirty = bytearray(len(self.nodes))
+        dirty_positions = []
+        if keyed_child_positions is None:
+            keyed_child_positions = {}
+        positions_to_visit = []
+        for node in changed_nodes:
+            child_nodes = node.get_changed_child_nodes()
+            if child_nodes is None:
+                positions_to_visit.append(positions[node])
+                continue
+            position = positions[node]
+            is_dirty[position] = 2
+            dirty_positions.append(position)
+            keyed_child_positions[position] = sorted(positions[x] for x in child_nodes if x in positions)
+            positions_to_visit.extend(keyed_child_positions[position])
+
+        while positions_to_visit:
+            position = positions_to_visit.pop()
+            state = is_dirty[position]
+            if state == 1:
+                continue
+            if state == 0:
+                dirty_positions.append(position)
+            else:
+                # A node with keyed changes is a descendant of another changed
+                # node, so all its children need to be visited...
+                del keyed_child_positions[position]
+            is_dirty[position] = 1
+            positions_to_visit.extend(child_indices[child_offsets[position]:child_offsets[position + 1]])
+        dirty_positions.sort()
+        return dirty_positions
+
+    @staticmethod
+    def _get_calculation_order(nodes, effective_priorities):
+        """
+        Returns the nodes passed in, ordered so that each node comes after all
+        its parents. Of the nodes whose parents have all been placed, those with
+        the highest priority are placed first, which gives the same order as
+        the scheduler uses.
+        """
+        node_set = set(nodes)
+        parent_counts = {}
+        ready_nodes = []
+        sequence_number = 0
+        for node in nodes:
+            parent_count = sum(1 for x in node._parent_nodes if x in node_set)
+            parent_counts[node] = parent_count
+            if parent_count == 0:
+                heapq.heappush(ready_nodes, (-effective_priorities.get(node, 0), sequence_number, node))
+                sequence_number += 1
+
+        results = []
+        while ready_nodes:
+            _, _, node = heapq.heappop(ready_nodes)
+            results.append(node)
+            for child in node._child_nodes:
+                parent_counts[child] -= 1
+                if parent_counts[child] == 0:
+                    heapq.heappush(ready_nodes, (-effective_priorities.get(child, 0), sequence_number, child))
+                    sequence_number += 1
+        return results
@@ -0,0 +1,218 @@
+import copy
+from .graph_exception import GraphException
+from .graph_manager import GraphManager
+from .graph_node import GraphNode
+from .quality import Quality
+
+
+def _calculate_children():
+    """
+    Replaces calculate() on overridden nodes, whose values are set by the scenario.
+    """
+    return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def _do_nothing():
+    """
+    Replaces methods of cloned nodes which should not run in a scenario.
+    """
+    pass
+
+
+class ForkedGraphManager(GraphManager):
+    """
+    A 'what-if' scenario graph, created by GraphManager.fork().
+
+    The scenario starts off sharing all the nodes of its base graph. When you
+    override a node, the scenario gets its own copy (clone) of it, and of all
+    the nodes downstream of it. Only these clones are recalculated in the
+    scenario, so each scenario costs memory and time in proportion to the part
+    of the graph it affects, rather than to the size of the graph.
+
+    For example:
+        scenario = graph_manager.fork()
+        scenario.override(eur_holidays_node, holidays=eur_holidays_node.holidays | {christmas_eve})
+        scenario.calculate()
+        price = scenario.get_node(price_node.node_id).price
+
+    Clones are shallow copies of the base nodes. References from the clone to
+    other nodes are updated to refer to the scenario's clones, including nodes
+    held directly in lists, tuples, sets and dictionaries. Those containers,
+    and Quality objects, are copied, so that clones can update them without
+    changing the base graph. Nodes which update other state in place should
+    replace it when they calculate, rather than changing it.
+
+    Overridden nodes keep the attribute values given to override(), and do not
+    recalculate. Clones are not disposed when the scenario is, as any resources
+    they hold belong to the base node. (For the same reason, cloned nodes do not
+    observe data sources their base node observes.)
+
+    The base graph must not be changed or recalculated while scenarios forked
+    from it are in use.
+    """
+    def __init__(self, base_graph_manager):
+        """
+        The 'constructor'.
+        """
+        super().__init__()
+
+        # The graph this scenario was forked from...
+        self.base_graph_manager = base_graph_manager
+        self.environment = base_graph_manager.environment
+        self.use_has_calculated_flags = base_graph_manager.use_has_calculated_flags
+
+    def fork(self):
+        """
+        Scenarios cannot be forked.
+        """
+        raise GraphException("A forked graph cannot be forked")
+
+    def has_node(self, node_id):
+        """
+        Returns True if a node is in the scenario or its base graph for the ID passed in.
+        """
+        return self.find_node(node_id) is not None
+
+    def find_node(self, node_id):
+        """
+        Returns the scenario's node for the ID passed in, which is the base graph's
+        node if the scenario has not cloned it, or None if there is no such node.
+        """
+        node = self._nodes.get(node_id)
+        if node is None:
+            node = self.base_graph_manager.find_node(node_id)
+        return node
+
+    def get_node(self, node_id):
+        """
+        Returns the scenario's node for the ID passed in (see find_node).
+        Throws an exception if the node does not exist.
+        """
+        node = self.find_node(node_id)
+        if node is None:
+            raise GraphException("No such graph-node " + node_id)
+        return node
+
+    def override(self, node, **attributes):
+        """
+        Overrides a node in the scenario, setting the attributes passed in on
+        the scenario's copy of it. The node, and the nodes downstream of it, are
+        recalculated in the next calculation of the scenario.
+
+        The node can be the base graph's node or the scenario's clone of it.
+        Returns the clone.
+        """
+        if self._cycle_in_progress:
+            raise GraphException("Nodes cannot be overridden during a calculation cycle")
+
+        # We clone the node and its descendants, unless they are already
+        # cloned. (If a node is cloned, so are its descendants.)
+        base_node = self.base_graph_manager.get_node(node.node_id)
+        new_clones = []
+        base_nodes_to_visit = [base_node]
+        visited_base_nodes = set()
+        while base_nodes_to_visit:
+            base_node = base_nodes_to_visit.pop()
+            if base_node in visited_base_nodes or base_node.node_id in self._nodes:
+                continue
+            visited_base_nodes.add(base_node)
+            new_clones.append(self._clone_node(base_node))
+            base_nodes_to_visit.extend(base_node._child_nodes)
+
+        # We link up the new clones. Clones made by earlier overrides, whose
+        # parents have now been cloned, need to be linked to the new clones...
+        nodes_to_link = list(new_clones)
+        for base_node in visited_base_nodes:
+            for child_node in base_node._child_nodes:
+                forked_child_node = self._nodes.get(child_node.node_id)
+                if forked_child_node is not None and child_node not in visited_base_nodes:
+                    nodes_to_link.append(forked_child_node)
+        for forked_node in nodes_to_link:
+            self._link_clone(forked_node)
+
+        # We set the overridden values, and stop the node recalculating them...
+        clone = self._nodes[node.node_id]
+        for name, value in attributes.items():
+            setattr(clone, name, value)
+        clone.pre_calculate = _do_nothing
+        clone.calculate_quality = _do_nothing
+        clone.calculate = _calculate_children
+        self._non_collectable_nodes.add(clone)
+        self.needs_calculation(clone)
+        return clone
+
+    def _clone_node(self, base_node):
+        """
+        Adds a copy of the base node passed in to the scenario. It is linked
+        to other nodes by _link_clone().
+        """
+        # The clone needs the base node's state, so we reload it if it has been
+        # spilled to disk...
+        if base_node._is_spilled:
+            base_node.graph_manager.node_spiller.reload(base_node)
+        clone = copy.copy(base_node)
+        clone.graph_manager = self
+        clone._edge_index = None
+        clone._parent_nodes = set(base_node._parent_nodes)
+        clone._child_nodes = set()
+        clone._child_nodes_for_this_calculation_cycle = set()
+        clone._updated_parent_nodes = set()
+        clone._children_by_key = None
+        clone._keyed_child_nodes = None
+        clone._unkeyed_child_nodes = None
+        clone._changed_keys = None
+        clone._is_partially_invalidated = False
+        clone._parent_cache = None
+        clone._invalid_count = 0
+        clone._needs_calculation = False
+        clone.has_calculated = False
+        clone.dispose = _do_nothing
+
+        self._nodes[clone.node_id] = clone
+        self.update_gc_info_for_node(clone)
+        if self.metrics is not None:
+            self.metrics.node_added(clone)
+        return clone
+
+    def _link_clone(self, clone):
+        """
+        Updates the references from a clone to other nodes, so that they refer
+        to the scenario's clones, and adds the clone as a child of its parents
+        in the scenario.
+        """
+        child_nodes = clone._child_nodes
+        for name, value in list(clone.__dict__.items()):
+            clone.__dict__[name] = self._get_forked_value(value)
+        clone._child_nodes = child_nodes
+
+        for parent_node in clone._parent_nodes:
+            if parent_node.graph_manager is self:
+                parent_node._child_nodes.add(clone)
+        self._link_version += 1
+
+    def _get_forked_value(self, value):
+        """
+        Returns the value of a clone's attribute for the scenario.
+        """
+        if isinstance(value, GraphNode):
+            return self._get_forked_node(value)
+        if isinstance(value, Quality):
+            quality = Quality()
+            quality.set_from(value)
+            return quality
+
+        value_type = type(value)
+        if value_type in (list, tuple, set, frozenset):
+            return value_type(self._get_forked_node(x) for x in value)
+        if value_type is dict:
+            return {self._get_forked_node(key): self._get_forked_node(item) for key, item in value.items()}
+        return value
+
+    def _get_forked_node(self, value):
+        """
+        Returns the scenario's clone of the value passed in, if it is a node
+        which has been cloned. Otherwise returns the value.
+        """
+        if isinstance(value, GraphNode):
+            return self._nodes.get(value.node_id, value)
+        return value
@@ -1,6 +1,15 @@
+import collections
+import heapq
+import itertools
+import sys
+import time
+from .cost_analysis import CostAnalysis
+from .execution_plan import ExecutionPlan
 from .graph_exception import GraphException
 from .node_info import NodeInfo
 from .graph_node import GraphNode
+from .node_factory import NodeFactory
+from .quality import Quality
 
 
 class GraphManager(object):
@@ -10,6 +19,15 @@ class GraphManager(object):
 
     See: http:#richard-shepherd.github.io/calculation_graph/GraphManager.html
     """
+    # A non-collectable node with no live NodeHandles (see get_leak_report)...
+    LeakedRoot = collections.namedtuple("LeakedRoot", ("node_id", "gc_ref_count", "subgraph_size"))
+
+    # The estimated memory used by the nodes of one type (see memory_report)...
+    NodeTypeMemory = collections.namedtuple("NodeTypeMemory", ("node_type", "node_count", "edge_count", "estimated_bytes"))
+
+    # The types of attribute values which are counted as part of a node's memory...
+    _NODE_OWNED_TYPES = (set, frozenset, dict, list, tuple, str, bytes, Quality)
+
     def __init__(self):
         """
         The 'constructor'.
@@ -21,6 +39,18 @@ class GraphManager(object):
         # not be GC'd even if there are no links to them...
         self._non_collectable_nodes = set()
 
+        # A dictionary of non-collectable node -> the number of live NodeHandles
+        # referring to it, and the nodes whose handles have been dropped (by
+        # any thread) but which have not yet been released...
+        self._node_handle_counts = {}
+        self._released_node_handles = collections.deque()
+
+        # A dictionary of node -> list of callbacks subscribed to it, and the
+        # subscribed nodes whose output has changed in the current calculation
+        # cycle (an ordered 'set', of node -> None)...
+        self._subscriptions = {}
+        self._updated_subscribed_nodes = collections.OrderedDict()
+
         # The collection of nodes that have changed since the last calculation cycle...
         self._changed_nodes = set()
 
@@ -28,26 +58,147 @@ class GraphManager(object):
         # be cleared at the end of the calculation cycle...
         self._nodes_with_updated_parents = set()
 
-        # The collection of IDs of nodes that have been added since the last
-        # calculation cycle...
-        self._new_node_ids = set()
+        # The nodes that have been added since their dependencies were last set
+        # up. This is a worklist: nodes created while setting up dependencies are
+        # appended to it, and processed in the same pass...
+        self._new_nodes = []
+
+        # Nodes which have published a Delta in the current calculation cycle.
+        # Their deltas are cleared at the end of the cycle...
+        self._nodes_with_deltas = []
 
         # A dictionary of (new parent node) -> (set of child nodes).
         # New parents are parents that have been added to nodes during this calculation cycle.
+        # If one of these nodes is calculated after it is added as a parent, in the same
+        # calculation cycle, then we recalculate the relevant children later in the cycle...
         self._new_parents_this_calculation_cycle = {}
 
-        # A dictionary of (new parent node) -> (set of child nodes).
-        # If one of the above nodes is calculated after it is added as a parent,
-        # in the same calculation cycle, then we need to notify the relevant
-        # children in the next calculation cycle...
-        self._nodes_with_updated_late_parents = {}
-
         # True if links have changed, and GC may be required
         self._gc_required = False
 
+        # The number of calculation cycles for which a collectable node which is no
+        # longer referenced is kept in the graph before it is disposed. If the node
+        # is needed again during this time (for example, by a node which flips between
+        # two sets of parents) it is revived with its state intact, instead of being
+        # rebuilt from scratch. While they are kept, unreferenced nodes (and their
+        # parents) stay linked into the graph and are recalculated as usual...
+        self.gc_grace_cycles = 0
+
+        # The maximum number of unreferenced nodes kept in the graph (see above).
+        # If there are more than this, the least recently used are disposed even
+        # if their grace period has not expired. None means no limit...
+        self.gc_pool_size = None
+
+        # The unreferenced nodes currently being kept, in the order in which they
+        # became unreferenced. This is a dictionary of node -> the calculation cycle
+        # number in which it became unreferenced...
+        self._unreferenced_nodes = collections.OrderedDict()
+
+        # The number of completed calculation cycles...
+        self._cycle_number = 0
+
+        # The heap of nodes which are ready to calculate in the current calculation
+        # cycle. Items are (-effective-priority, sequence-number, node), so that the
+        # highest priority nodes are calculated first, and nodes of the same priority
+        # are calculated in the order in which they became ready...
+        self._ready_nodes = []
+        self._ready_sequence = itertools.count()
+
+        # The set of nodes which have a non-default priority...
+        self._priority_nodes = set()
+
+        # A dictionary of node -> effective priority. A node's effective priority
+        # is the highest priority of the node itself and any of its descendants,
+        # as a high-priority node can only calculate once its parents have. Nodes
+        # not in the dictionary have the default priority...
+        self._effective_priorities = {}
+
+        # True if the effective priorities need recalculating, as the shape of
+        # the graph or the node priorities have changed...
+        self._priorities_dirty = False
+
+        # If set, this is called with a priority as soon as all the nodes at or
+        # above that priority have been calculated, if lower-priority nodes are
+        # still waiting to calculate. This lets clients publish the results of
+        # latency-critical nodes before slower, lower-priority work has finished...
+        self.priority_published_callback = None
+
         # True if we are in the calculate cycle...
         self._is_calculating = False
 
+        # True if a calculation cycle has been started but not yet completed, as
+        # its time-budget ran out. The next call to calculate() resumes it...
+        self._cycle_in_progress = False
+
+        # The number of nodes that have been invalidated in the current calculation
+        # cycle, but which have not yet been calculated...
+        self._invalid_node_count = 0
+
+        # If at least this many nodes have changed, we invalidate them and their
+        # descendants in one pass over the graph (see _invalidate_in_bulk), rather
+        # than recursively. None means that we always invalidate recursively...
+        self.bulk_invalidation_threshold = 100
+
+        # The ExecutionPlan created by compile(), or None if the graph has not
+        # been compiled or has changed shape since it was...
+        self._plan = None
+
+        # A counter which goes up whenever links between nodes change. The
+        # ancestors and descendants found by queries (see get_ancestors) are
+        # cached, as a dictionary of (is-ancestors, node) -> list of nodes,
+        # until it changes. The cache is emptied when it holds query_cache_size
+        # results...
+        self._link_version = 0
+        self._query_cache = {}
+        self._query_cache_version = 0
+        self.query_cache_size = 1000
+
+        # The plan being run in the current calculation pass (which may have
+        # been discarded since the pass started), the positions of the nodes
+        # it needs to visit, and the index in that list of the next node...
+        self._plan_being_run = None
+        self._plan_positions = []
+        self._plan_index = 0
+
+        # A dictionary of position -> the positions of the children to visit, for
+        # the nodes in the plan being run which only changed for some keys...
+        self._plan_keyed_child_positions = {}
+
+        # An optional ChangeTracer, which records how changes propagate
+        # through the graph...
+        self.tracer = None
+
+        # If set to true, we measure how long each node takes to calculate.
+        # The measurements are used by get_cost_analysis()...
+        self.measure_calculation_times = False
+
+        # A dictionary of node -> the time (in seconds) the node took for its
+        # most recent calculation, if measure_calculation_times is set...
+        self._calculation_times = {}
+
+        # An optional SlowCycleProfiler, which writes reports about calculations
+        # which take longer than a threshold. (See the slow_cycle_profiler property.)
+        self._slow_cycle_profiler = None
+
+        # An optional EdgeStore, which holds the links between nodes in compact
+        # arrays instead of in sets on each node. This must be set before nodes
+        # are added...
+        self.edge_store = None
+
+        # An optional TopologicalOrder, which keeps the nodes in order as links
+        # are added, and rejects links which would create cycles. This must be
+        # set before nodes are added...
+        self.topological_order = None
+
+        # An optional NodeSpiller, which moves the state of nodes which have not
+        # been used for a while to disk...
+        self.node_spiller = None
+
+        # Optional GraphMetrics, which collects metrics about the health of the
+        # graph. This should be set before nodes are added, so that the node
+        # counts are correct...
+        self.metrics = None
+
         # If set to true, then we clear the has_calculated flags from all
         # nodes before the calculation cycle.
         #
@@ -67,6 +218,25 @@ class GraphManager(object):
         The 'destructor'.
         """
         self.dispose_nodes()
+        self.slow_cycle_profiler = None
+
+    @property
+    def slow_cycle_profiler(self):
+        """
+        The SlowCycleProfiler, if there is one.
+        """
+        return self._slow_cycle_profiler
+
+    @slow_cycle_profiler.setter
+    def slow_cycle_profiler(self, profiler):
+        """
+        Sets the SlowCycleProfiler. The previous profiler (if any) is closed,
+        so that it stops any tracing it started.
+        """
+        previous_profiler = self._slow_cycle_profiler
+        self._slow_cycle_profiler = profiler
+        if previous_profiler is not None and previous_profiler is not profiler:
+            previous_profiler.close()
 
     def dispose_nodes(self):
         """
@@ -74,21 +244,57 @@ class GraphManager(object):
         """
         for node_id, node in self._nodes.items():
             node.cleanup()
+            if self.metrics is not None:
+                self.metrics.node_removed(node)
 
         self._nodes.clear()
+        if self.edge_store is not None:
+            self.edge_store.clear()
+        if self.topological_order is not None:
+            self.topological_order.clear()
+        if self.node_spiller is not None:
+            self.node_spiller.clear()
         self._non_collectable_nodes.clear()
+        self._node_handle_counts.clear()
+        self._released_node_handles.clear()
+        self._subscriptions.clear()
+        self._updated_subscribed_nodes.clear()
         self._changed_nodes.clear()
+        self._unreferenced_nodes.clear()
+        self._calculation_times.clear()
+        del self._nodes_with_deltas[:]
+        for _, _, node in self._ready_nodes:
+            node._is_scheduled = False
+        del self._ready_nodes[:]
+        self._invalid_node_count = 0
+        self._cycle_in_progress = False
+        self._plan = None
+        self._link_version += 1
+        self._end_plan_run()
 
     def add_node(self, node):
         """
         Adds a node to the graph.
         """
-        if self.has_node(node.node_id):
-            raise GraphException("GraphNode " + node.node_id + " already exists")
+        # This is called for every node created, so we avoid the extra lookups
+        # of has_node() and needs_calculation()...
+        nodes = self._nodes
+        node_id = node.node_id
+        if nodes.get(node_id) is not None:
+            raise GraphException("GraphNode " + node_id + " already exists")
         else:
-            self._nodes[node.node_id] = node
-            self.needs_calculation(node)
-            self._new_node_ids.add(node.node_id)
+            nodes[node_id] = node
+            if self.edge_store is not None:
+                self.edge_store.add_node(node)
+            node._needs_calculation = True
+            self._changed_nodes.add(node)
+            self._new_nodes.append(node)
+            self._plan = None
+            if node.priority != 0:
+                self._priority_nodes.add(node)
+                self._priorities_dirty = True
+            if self.metrics is not None:
+                self.metrics.node_added(node)
 
     def release_node(self, node):
         """
@@ -111,6 +317,215 @@ class GraphManager(object):
             node.set_gc_type(GraphNode.GCType.COLLECTABLE)
             self._gc_required = True
 
+    def node_handle_created(self, node):
+        """
+        Called when a NodeHandle is created for the node passed in.
+        """
+        self._node_handle_counts[node] = self._node_handle_counts.get(node, 0) + 1
+
+    def node_handle_released(self, node):
+        """
+        Called when the NodeHandle for the node passed in is released or
+        garbage-collected. This can be called from any thread, so the node is
+        released at the end of the next calculation cycle.
+        """
+        self._released_node_handles.append(node)
+
+    def _release_node_handles(self):
+        """
+        Releases the nodes whose handles have been dropped.
+        """
+        released_node_handles = self._released_node_handles
+        while released_node_handles:
+            node = released_node_handles.popleft()
+            if self._nodes.get(node.node_id) is not node:
+                # The node has been removed from the graph, eg by dispose()...
+                continue
+            handle_count = self._node_handle_counts[node] - 1
+            if handle_count == 0:
+                del self._node_handle_counts[node]
+            else:
+                self._node_handle_counts[node] = handle_count
+            self.release_node(node)
+
+    def get_leak_report(self):
+        """
+        Returns a list of GraphManager.LeakedRoot for the non-collectable nodes
+        which have no live NodeHandles, largest subgraph first. These are nodes
+        which clients have not released, or which are held without handles.
+        The subgraph size is the number of nodes (including the root) which are
+        kept in the graph by the root.
+        """
+        self._release_node_handles()
+        leaked_roots = []
+        for node in self._non_collectable_nodes:
+            if node in self._node_handle_counts or self._nodes.get(node.node_id) is not node:
+                continue
+            leaked_roots.append(GraphManager.LeakedRoot(
+                node.node_id, node.get_gc_ref_count(), self._get_ancestor_count(node) + 1))
+        leaked_roots.sort(key=lambda x: (-x.subgraph_size, x.node_id))
+        return leaked_roots
+
+    def memory_report(self):
+        """
+        Returns a list of GraphManager.NodeTypeMemory, estimating the memory
+        used by the nodes of each type in the graph, largest first. The edge
+        count is the number of links to the nodes from their parents.
+
+        The estimate for each node covers the node object, its attributes, and
+        the containers, strings and Quality objects held directly in them (such
+        as its sets of parents and children), but not the items held in those
+        containers. Objects shared between nodes, such as the environment and
+        other nodes, are not counted, and nor are the arrays of an EdgeStore
+        (see EdgeStore.get_memory_size). The estimates are for tracking how
+        memory grows with the graph. benchmarks/memory_footprint.py measures
+        the actual memory used, with tracemalloc.
+        """
+        node_counts = collections.Counter()
+        edge_counts = collections.Counter()
+        byte_counts = collections.Counter()
+        type_names = {}
+        for node in self._nodes.values():
+            node_type = type(node)
+            type_name = type_names.get(node_type)
+            if type_name is None:
+                type_name = type_names[node_type] = NodeFactory.get_node_type_name(node_type)
+            node_counts[type_name] += 1
+            edge_counts[type_name] += len(node._parent_nodes)
+            byte_counts[type_name] += self._get_node_size(node)
+        report = [GraphManager.NodeTypeMemory(x, node_counts[x], edge_counts[x], byte_counts[x]) for x in node_counts]
+        report.sort(key=lambda x: (-x.estimated_bytes, x.node_type))
+        return report
+
+    @staticmethod
+    def _get_node_size(node):
+        """
+        Returns the estimated size in bytes of the node passed in (see memory_report).
+        """
+        size = sys.getsizeof(node)
+        attributes = getattr(node, "__dict__", None)
+        if attributes is None:
+            return size
+        size += sys.getsizeof(attributes)
+        owned_types = GraphManager._NODE_OWNED_TYPES
+        for value in attributes.values():
+            if isinstance(value, owned_types):
+                size += sys.getsizeof(value)
+                if type(value) is Quality:
+                    size += sys.getsizeof(value.__dict__) + sys.getsizeof(value._descriptions)
+        return size
+
+    @staticmethod
+    def _get_ancestor_count(node):
+        """
+        Returns the number of ancestors of the node passed in.
+        """
+        ancestors = set()
+        nodes_to_visit = list(node._parent_nodes)
+        while nodes_to_visit:
+            parent_node = nodes_to_visit.pop()
+            if parent_node not in ancestors:
+                ancestors.add(parent_node)
+                nodes_to_visit.extend(parent_node._parent_nodes)
+        return len(ancestors)
+
+    def get_ancestors(self, node, node_type=None, limit=None):
+        """
+        Returns a list of the ancestors of the node passed in (the nodes it
+        depends on, directly or indirectly), nearest first.
+
+        If node_type is supplied, only ancestors of that type (or derived types)
+        are returned. If limit is supplied, at most that many are returned, and
+        the search stops once they have been found.
+
+        The queries only read the graph, so they can be made between calculation
+        cycles without affecting them. Complete results are cached until links
+        in the graph change, so repeated queries are cheap.
+        """
+        return self._find_related_nodes(node, True, node_type, limit)
+
+    def get_descendants(self, node, node_type=None, limit=None):
+        """
+        Returns a list of the descendants of the node passed in (the nodes which
+        depend on it, directly or indirectly), nearest first. node_type and limit
+        are as for get_ancestors().
+
+        (In a forked graph, nodes in the base graph do not know about their clones'
+        children, so the descendants of base nodes only include base nodes.)
+        """
+        return self._find_related_nodes(node, False, node_type, limit)
+
+    def get_paths(self, from_node, to_node, limit=None):
+        """
+        Returns a list of the paths through which to_node depends on from_node,
+        each as a list of nodes from from_node to to_node. If limit is supplied,
+        at most that many paths are returned.
+        """
+        if from_node is to_node:
+            return [[from_node]]
+
+        # We search down from the from_node, only through ancestors of the to_node...
+        ancestors = set(self._find_related_nodes(to_node, True, None, None))
+        if from_node not in ancestors:
+            return []
+        paths = []
+        path = [from_node]
+        child_iterators = [iter(from_node._child_nodes)]
+        while child_iterators:
+            child_node = next(child_iterators[-1], None)
+            if child_node is None:
+                child_iterators.pop()
+                path.pop()
+            elif child_node is to_node:
+                paths.append(path + [to_node])
+                if limit is not None and len(paths) >= limit:
+                    break
+            elif child_node in ancestors:
+                path.append(child_node)
+                child_iterators.append(iter(child_node._child_nodes))
+        return paths
+
+    def _find_related_nodes(self, node, is_ancestors, node_type, limit):
+        """
+        Returns the ancestors or descendants of the node passed in, as described
+        in get_ancestors().
+        """
+        if self._query_cache_version != self._link_version:
+            self._query_cache.clear()
+            self._query_cache_version = self._link_version
+
+        # If we have found all the related nodes before, we use them...
+        cache_key = (is_ancestors, node)
+        related_nodes = self._query_cache.get(cache_key)
+        if related_nodes is not None:
+            if node_type is not None:
+                return list(itertools.islice((x for x in related_nodes if isinstance(x, node_type)), limit))
+            return related_nodes[:limit]
+
+        # We search the graph breadth-first. A search which stops at the limit
+        # is not cached...
+        related_nodes = []
+        results = []
+        visited_nodes = {node}
+        nodes_to_visit = collections.deque([node])
+        while nodes_to_visit:
+            next_node = nodes_to_visit.popleft()
+            for related_node in (next_node._parent_nodes if is_ancestors else next_node._child_nodes):
+                if related_node in visited_nodes:
+                    continue
+                visited_nodes.add(related_node)
+                related_nodes.append(related_node)
+                nodes_to_visit.append(related_node)
+                if node_type is None or isinstance(related_node, node_type):
+                    results.append(related_node)
+                    if limit is not None and len(results) >= limit:
+                        return results
+
+        if len(self._query_cache) >= self.query_cache_size:
+            self._query_cache.clear()
+        self._query_cache[cache_key] = related_nodes
+        return results
+
     def get_node_count(self):
         """
         Returns the number of nodes in the graph.
@@ -141,30 +556,182 @@ class GraphManager(object):
         """
         Returns the node for the ID passed in, or None if it is not in the graph.
         """
-        if self.has_node(node_id):
-            return self._nodes[node_id]
-        else:
-            return None
+        return self._nodes.get(node_id)
 
-    def needs_calculation(self, node):
+    def needs_calculation(self, node, changed_keys=None):
         """
         Marks the node passed in for (re)calculation.
+
+        If changed_keys is supplied, only the parts of the node's output for
+        those keys have changed (see GraphNode.set_changed_keys).
         """
+        if changed_keys is None:
+            if node._changed_keys is not None:
+                node._changed_keys = None
+        elif node not in self._changed_nodes:
+            node._changed_keys = set(changed_keys)
+        elif node._changed_keys is not None:
+            node._changed_keys.update(changed_keys)
         node._needs_calculation = True
         self._changed_nodes.add(node)
 
-    def calculate(self):
+    def needs_calculation_by_id(self, node_id):
+        """
+        Marks the node with the ID passed in for (re)calculation, if it is in
+        the graph. (This is how journaled and replayed events refer to nodes.)
+        """
+        node = self.find_node(node_id)
+        if node is not None:
+            self.needs_calculation(node)
+
+    def calculate(self, budget_seconds=None):
         """
         Calculates the graph.
+
+        If budget_seconds is supplied, the calculation stops once the budget has
+        been spent, leaving the graph in a consistent state between two node
+        calculations. The next call to calculate() resumes the interrupted cycle
+        before any new changes are processed.
+
+        Returns the number of nodes still waiting to be calculated in the
+        interrupted cycle, or zero if the cycle has completed.
+        """
+        deadline = None
+        if budget_seconds is not None:
+            deadline = time.perf_counter() + budget_seconds
+
+        profiler = self.slow_cycle_profiler
+        metrics = self.metrics
+        if profiler is None and metrics is None:
+            return self._calculate(deadline)
+
+        # We are profiling slow calculations, or collecting metrics...
+        cycle_number = self._cycle_number
+        if profiler is not None:
+            profiler.calculation_started()
+        if metrics is not None:
+            metrics.calculation_started()
+        try:
+            return self._calculate(deadline)
+        finally:
+            if metrics is not None:
+                metrics.calculation_ended(not self._cycle_in_progress)
+            if profiler is not None:
+                profiler.calculation_ended(cycle_number)
+
+    def _calculate(self, deadline):
+        """
+        Calculates the graph until the deadline (see calculate() above).
+        """
+        # Sets the calculating flag true for the lifetime of this function...
+        self._is_calculating = True
+
+        try:
+            # We start a new cycle, unless we are resuming one...
+            if not self._cycle_in_progress:
+                self._start_calculation_cycle()
+
+            while True:
+                # We run through the compiled plan, if there is one. Otherwise we
+                # calculate the scheduled nodes in priority order. (Calculating
+                # them schedules their children when they become ready.)
+                if not self._calculate_planned_nodes(deadline) or not self._calculate_ready_nodes(deadline):
+                    # The time-budget has been spent, so we will resume the
+                    # cycle the next time we are called...
+                    self._is_calculating = False
+                    return self._invalid_node_count
+
+                # If the graph changed shape during the calculation, new nodes may have
+                # been created. We set them up and calculate them (and any nodes they
+                # affect) in this cycle, so that each cycle leaves the graph consistent...
+                if not self._new_nodes:
+                    break
+                self._start_calculation_pass()
+        except BaseException:
+            # A node raised an exception. We abandon the cycle, so that the nodes
+            # which did not calculate are calculated by the next one...
+            self._abandon_calculation_cycle()
+            raise
+
+        self._end_calculation_cycle()
+        self._is_calculating = False
+
+        # We tell subscribers about the nodes which changed in the cycle. (We do
+        # this once the cycle has ended, so that callbacks can change the graph.)
+        if self._updated_subscribed_nodes:
+            self._notify_subscribers()
+        return 0
+
+    def subscribe(self, node, callback):
+        """
+        Subscribes to changes to the output of the node passed in, ie to cycles
+        in which it calculates and returns CALCULATE_CHILDREN.
+
+        At the end of each calculation cycle, each callback is called once with
+        a list of the nodes it subscribes to which have changed in the cycle.
+        Callbacks are not called if none of their nodes have changed. A callback
+        can subscribe to many nodes, and a node can have many subscribers.
+
+        Subscribing does not keep a node in the graph. Subscriptions to a node
+        are removed if it is garbage-collected.
+        """
+        callbacks = self._subscriptions.setdefault(node, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+    def unsubscribe(self, node, callback):
         """
+        Removes a subscription added by subscribe().
+        """
+        callbacks = self._subscriptions.get(node)
+        if callbacks is None or callback not in callbacks:
+            return
+        callbacks.remove(callback)
+        if not callbacks:
+            del self._subscriptions[node]
+            self._updated_subscribed_nodes.pop(node, None)
+
+    def _notify_subscribers(self):
+        """
+        Calls each subscriber with the list of its nodes which have changed in
+        the calculation cycle which has just ended.
+        """
+        updated_nodes_by_callback = collections.OrderedDict()
+        for node in self._updated_subscribed_nodes:
+            for callback in self._subscriptions.get(node, ()):
+                updated_nodes_by_callback.setdefault(callback, []).append(node)
+        self._updated_subscribed_nodes.clear()
+
+        for callback, nodes in updated_nodes_by_callback.items():
+            callback(nodes)
+
+    def get_pending_node_count(self):
+        """
+        Returns the number of nodes still waiting to be calculated in a
+        calculation cycle which was interrupted as its time-budget ran out.
+        """
+        return self._invalid_node_count
+
+    def _start_calculation_cycle(self):
+        """
+        Starts a new calculation cycle.
+        """
+        self._cycle_in_progress = True
+        if self.tracer is not None:
+            self.tracer.cycle_started(self._cycle_number)
+
         # We clear the has_calculated flag on all nodes...
         if self.use_has_calculated_flags is True:
             for node_id, node in self._nodes.items():
                 node.has_calculated = False
 
-        # Sets the calculating flag true for the lifetime of this function...
-        self._is_calculating = True
+        self._start_calculation_pass()
 
+    def _start_calculation_pass(self):
+        """
+        Sets up any new nodes, and schedules the nodes which have changed since
+        the last calculation pass for calculation.
+        """
         # We call setDependencies() on any new nodes...
         self._set_dependencies_on_new_nodes()
 
@@ -178,25 +745,488 @@ class GraphManager(object):
             # Clear recalculate list...
             self._changed_nodes.clear()
 
+            # We make sure that the priorities used to schedule nodes are up to date...
+            if self._priorities_dirty:
+                self._update_effective_priorities()
+
+            if self.tracer is not None:
+                for node in changed_nodes:
+                    self.tracer.node_changed(node)
+            if self.metrics is not None:
+                self.metrics.nodes_changed(len(changed_nodes))
+
+            # If the graph has been compiled, we find the nodes to visit from
+            # the plan, instead of invalidating them...
+            if self._plan is not None:
+                self._start_plan_run(changed_nodes)
+                self._clear_changed_keys(changed_nodes)
+                return
+
             # Invalidate...
+            if self.bulk_invalidation_threshold is not None \
+                    and len(changed_nodes) >= self.bulk_invalidation_threshold:
+                self._invalidate_in_bulk(changed_nodes)
+            else:
+                for node in changed_nodes:
+                    node.invalidate(None)
+            self._clear_changed_keys(changed_nodes)
+
+            # Validate. This schedules the changed nodes whose parents are all valid...
+            for node in changed_nodes:
+                node.validate()
+
+    @staticmethod
+    def _clear_changed_keys(changed_nodes):
+        """
+        Clears the keys passed to set_changed_keys() from the changed nodes,
+        once they have been invalidated.
+        """
+        for node in changed_nodes:
+            if node._changed_keys is not None:
+                node._changed_keys = None
+
+    def _invalidate_in_bulk(self, changed_nodes):
+        """
+        Invalidates the changed nodes passed in, and all their descendants
+        (allowing for changes which are keyed, see GraphNode.set_changed_keys).
+
+        This has the same effect as calling invalidate() on each changed node,
+        but works through the graph with a worklist instead of recursing one
+        link at a time. This is quicker when a large part of the graph has
+        changed, and is not limited by the recursion limit on deep graphs.
+
+        If there is an edge store, we find all the descendants from its arrays
+        first, and then set each of them up.
+        """
+        tracer = self.tracer
+        if self.edge_store is not None:
+            # Changed nodes whose changes are keyed only invalidate the children
+            # linked with those keys, unless they are descendants of other changed
+            # nodes. So we find the descendants of the other changed nodes and of
+            # those children...
+            start_nodes = []
+            keyed_child_nodes = {}
             for node in changed_nodes:
-                node.invalidate(None)
+                child_nodes = node.get_changed_child_nodes()
+                if child_nodes is None:
+                    start_nodes.append(node)
+                else:
+                    keyed_child_nodes[node] = child_nodes
+                    start_nodes.extend(child_nodes)
+            invalid_nodes = self.edge_store.get_descendants(start_nodes)
+            if keyed_child_nodes:
+                descendants = set(invalid_nodes)
+                for node, child_nodes in keyed_child_nodes.items():
+                    if node not in descendants:
+                        node._is_partially_invalidated = True
+                        node._child_nodes_for_this_calculation_cycle = child_nodes
+                        invalid_nodes.append(node)
 
-            # Validate...
             for node in changed_nodes:
-                node.validate()
+                node._invalid_count += 1
+            for node in invalid_nodes:
+                if node._is_partially_invalidated:
+                    child_nodes = node._child_nodes_for_this_calculation_cycle
+                else:
+                    child_nodes = node._child_nodes.copy()
+                    node._child_nodes_for_this_calculation_cycle = child_nodes
+                for child_node in child_nodes:
+                    child_node._invalid_count += 1
+                    child_node._updated_parent_nodes.add(node)
+                    if tracer is not None:
+                        tracer.node_invalidated(child_node, node)
+        else:
+            # Each node is invalidated once by each of its parents, and the changed
+            # nodes are invalidated once more themselves. As in invalidate(), a node
+            # invalidates its children when it is first invalidated. Changed nodes
+            # whose changes are keyed invalidate the children linked with those keys,
+            # and invalidate the rest of their children if one of their parents
+            # invalidates them...
+            invalid_nodes = []
+            for node in changed_nodes:
+                node._invalid_count += 1
+                if node._invalid_count == 1:
+                    invalid_nodes.append(node)
+            nodes_to_complete = []
+            index = 0
+            while True:
+                if nodes_to_complete:
+                    node = nodes_to_complete.pop()
+                    child_nodes = node._child_nodes.difference(node._child_nodes_for_this_calculation_cycle)
+                    node._child_nodes_for_this_calculation_cycle.update(child_nodes)
+                elif index < len(invalid_nodes):
+                    node = invalid_nodes[index]
+                    index += 1
+                    child_nodes = node.get_changed_child_nodes() if node._invalid_count == 1 else None
+                    if child_nodes is None:
+                        child_nodes = node._child_nodes.copy()
+                    else:
+                        node._is_partially_invalidated = True
+                    node._child_nodes_for_this_calculation_cycle = child_nodes
+                else:
+                    break
+
+                for child_node in child_nodes:
+                    child_node._invalid_count += 1
+                    child_node._updated_parent_nodes.add(node)
+                    if tracer is not None:
+                        tracer.node_invalidated(child_node, node)
+                    if child_node._invalid_count == 1:
+                        invalid_nodes.append(child_node)
+                    elif child_node._is_partially_invalidated:
+                        child_node._is_partially_invalidated = False
+                        nodes_to_complete.append(child_node)
+
+        self._nodes_with_updated_parents.update(x for x in invalid_nodes if x._updated_parent_nodes)
+        self._invalid_node_count += len(invalid_nodes)
+
+    def _abandon_calculation_cycle(self):
+        """
+        Called when a calculation cycle fails with an exception. We clear the
+        state of the cycle, and mark the nodes which still need calculating
+        (including the one which failed) as changed, so that the next call to
+        calculate() starts a new cycle which calculates them and their descendants.
 
-        # We clear out the collections of updated-parents from any nodes holding them...
+        Nodes which calculated before the failure keep their new values. Their
+        children still hold them as updated parents.
+        """
+        for _, _, node in self._ready_nodes:
+            node._is_scheduled = False
+        del self._ready_nodes[:]
+        self._end_plan_run()
+        self._invalid_node_count = 0
+        self._new_parents_this_calculation_cycle.clear()
+        self._cycle_in_progress = False
+        self._is_calculating = False
+
+        for node in self._nodes.values():
+            if node._invalid_count != 0:
+                node._invalid_count = 0
+            if node._is_partially_invalidated:
+                node._is_partially_invalidated = False
+            if node._needs_calculation is True:
+                self._changed_nodes.add(node)
+
+    def _end_calculation_cycle(self):
+        """
+        Clears up at the end of a completed calculation cycle.
+        """
+        self._cycle_in_progress = False
+        self._invalid_node_count = 0
+
+        # We clear out the collections of updated-parents from any nodes holding them,
+        # and the deltas published in the cycle...
         self.clear_updated_parents()
+        self._clear_deltas()
 
         # We clear the collection of new-parents...
         self._new_parents_this_calculation_cycle.clear()
-        self._mark_nodes_with_updated_late_parents()
 
-        # We garbage collect any unused nodes...
+        # We garbage collect any unused nodes, including those whose handles
+        # have been dropped...
+        self._cycle_number += 1
+        self._release_node_handles()
         self._perform_gc()
 
-        self._is_calculating = False
+        # We spill the state of nodes which have not been used for a while...
+        if self.node_spiller is not None:
+            self.node_spiller.spill_idle_nodes(self._cycle_number)
+
+    def set_node_priority(self, node, priority):
+        """
+        Sets the scheduling priority of the node passed in, overriding the
+        priority for its node type. This is typically used for non-collectable
+        'root' nodes which clients need as soon as possible after a change.
+
+        The priority is inherited by the node's ancestors when they are scheduled.
+        Priorities must not be negative. The default priority is zero.
+        """
+        if priority < 0:
+            raise GraphException("GraphNode " + node.node_id + " cannot have a negative priority")
+
+        node.priority = priority
+        self._plan = None
+        if priority != 0:
+            self._priority_nodes.add(node)
+        elif node in self._priority_nodes:
+            self._priority_nodes.remove(node)
+        self._priorities_dirty = True
+
+    def get_effective_priority(self, node):
+        """
+        Returns the priority with which the node passed in is scheduled. This
+        is the highest priority of the node and any of its descendants.
+        """
+        if self._priorities_dirty:
+            self._update_effective_priorities()
+        return self._effective_priorities.get(node, 0)
+
+    def node_ready(self, node):
+        """
+        Called by a node when all of its parents are valid in the current
+        calculation cycle. We schedule it for calculation, unless it is
+        already waiting to be calculated.
+        """
+        if node._is_scheduled:
+            return
+        node._is_scheduled = True
+        priority = self._effective_priorities.get(node, 0) if self._effective_priorities else 0
+        heapq.heappush(self._ready_nodes, (-priority, next(self._ready_sequence), node))
+
+    def _calculate_ready_nodes(self, deadline=None):
+        """
+        Calculates nodes which are ready to be calculated, highest priority first,
+        until there are no more.
+
+        If a deadline (in time.perf_counter() seconds) is passed in, we stop when
+        it has passed. Returns True if all the ready nodes were calculated, or False
+        if we stopped because of the deadline.
+        """
+        ready_nodes = self._ready_nodes
+        profiler = self.slow_cycle_profiler
+        measure_calculation_times = self.measure_calculation_times or profiler is not None
+        while ready_nodes:
+            negative_priority, _, node = heapq.heappop(ready_nodes)
+            node._is_scheduled = False
+            if node._invalid_count != 0:
+                # The node has been invalidated again since it was scheduled, by
+                # a late parent of one of its ancestors. It is scheduled again
+                # when its parents have been calculated...
+                continue
+            self._invalid_node_count -= 1
+            if measure_calculation_times and node._needs_calculation:
+                start_time = time.perf_counter()
+                node.calculate_and_validate_children()
+                calculation_time = time.perf_counter() - start_time
+                if self.measure_calculation_times:
+                    self._calculation_times[node] = calculation_time
+                if profiler is not None:
+                    profiler.node_calculated(node, calculation_time)
+            else:
+                node.calculate_and_validate_children()
+
+            # If the next ready node has a lower priority, then all nodes with
+            # the priority we have just processed have now been calculated. (Their
+            # ancestors have at least the same priority, so they must have been
+            # calculated already.) We can publish them before the lower-priority
+            # nodes are calculated...
+            if self.priority_published_callback is not None \
+                    and ready_nodes \
+                    and ready_nodes[0][0] > negative_priority:
+                self.priority_published_callback(-negative_priority)
+
+            # We check whether we have run out of time. We always calculate at least
+            # one node, so that each call makes progress...
+            if deadline is not None and ready_nodes and time.perf_counter() >= deadline:
+                return False
+
+        return True
+
+    def compile(self):
+        """
+        Compiles the current shape of the graph into an ExecutionPlan, and
+        returns it.
+
+        Until the shape of the graph changes (when links or nodes are added
+        or removed, or node priorities are changed) calculation cycles run
+        through the plan. This avoids most of the book-keeping of the normal
+        calculation, so is worthwhile for graphs which calculate frequently
+        but rarely change shape. If the shape changes, the plan is discarded
+        and the graph calculates as usual. You can call compile() again once
+        the graph is stable.
+        """
+        if self._cycle_in_progress:
+            raise GraphException("The graph cannot be compiled during a calculation cycle")
+
+        # We set up any new nodes, so that the plan includes their links...
+        self._set_dependencies_on_new_nodes()
+        if self._priorities_dirty:
+            self._update_effective_priorities()
+
+        self._plan = ExecutionPlan(self._nodes.values(), self._effective_priorities)
+        return self._plan
+
+    def fork(self):
+        """
+        Returns a ForkedGraphManager: a 'what-if' scenario graph which shares
+        the nodes of this graph until they are overridden in the scenario.
+        See ForkedGraphManager for details.
+        """
+        from .forked_graph_manager import ForkedGraphManager
+
+        if self._cycle_in_progress:
+            raise GraphException("The graph cannot be forked during a calculation cycle")
+        return ForkedGraphManager(self)
+
+    def is_compiled(self):
+        """
+        Returns True if calculation cycles will run through a compiled plan,
+        ie if compile() has been called and the graph has not changed shape since.
+        """
+        return self._plan is not None
+
+    def _start_plan_run(self, changed_nodes):
+        """
+        Starts running the compiled plan for the changed nodes passed in.
+        """
+        self._plan_being_run = self._plan
+        self._plan_positions = self._plan.get_dirty_positions(changed_nodes, self._plan_keyed_child_positions)
+        self._plan_index = 0
+        self._invalid_node_count += len(self._plan_positions)
+
+    def _end_plan_run(self):
+        """
+        Clears the state of the plan being run.
+        """
+        self._plan_being_run = None
+        self._plan_positions = []
+        self._plan_index = 0
+        self._plan_keyed_child_positions = {}
+
+    def _calculate_planned_nodes(self, deadline=None):
+        """
+        Calculates the nodes in the plan being run, in the order of the plan.
+
+        We visit each node which has changed, or which has an ancestor that has
+        changed, and pass on to its children whether it has changed. Nodes are
+        only calculated if one of their parents has changed, as in the normal
+        calculation.
+
+        If the graph changes shape while the plan is being run, we hand the
+        remaining nodes over to the scheduler (see _schedule_remaining_planned_nodes).
+
+        Returns False if we stopped because the deadline has passed, and True
+        otherwise.
+        """
+        plan = self._plan_being_run
+        if plan is None:
+            return True
+
+        nodes = plan.nodes
+        priorities = plan.priorities
+        child_offsets = plan.child_offsets
+        child_indices = plan.child_indices
+        positions = self._plan_positions
+        position_count = len(positions)
+        keyed_child_positions = self._plan_keyed_child_positions
+        tracer = self.tracer
+        profiler = self.slow_cycle_profiler
+        measure_calculation_times = self.measure_calculation_times or profiler is not None
+        CALCULATE_CHILDREN = GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+        while self._plan_index < position_count:
+            # If the graph has changed shape, the plan is no longer valid...
+            if self._plan is not plan:
+                self._schedule_remaining_planned_nodes()
+                return True
+
+            position = positions[self._plan_index]
+            self._plan_index += 1
+            self._invalid_node_count -= 1
+            node = nodes[position]
+            if measure_calculation_times and node._needs_calculation:
+                start_time = time.perf_counter()
+                calculate_children = node.calculate_if_needed()
+                calculation_time = time.perf_counter() - start_time
+                if self.measure_calculation_times:
+                    self._calculation_times[node] = calculation_time
+                if profiler is not None:
+                    profiler.node_calculated(node, calculation_time)
+            else:
+                calculate_children = node.calculate_if_needed()
+
+            # We tell the children that this node has been visited, and
+            # whether they need to calculate...
+            if keyed_child_positions and position in keyed_child_positions:
+                child_positions = keyed_child_positions[position]
+            else:
+                child_positions = child_indices[child_offsets[position]:child_offsets[position + 1]]
+            for child_position in child_positions:
+                child_node = nodes[child_position]
+                child_node.add_updated_parent(node)
+                if tracer is not None:
+                    tracer.node_invalidated(child_node, node)
+                if calculate_children == CALCULATE_CHILDREN:
+                    child_node._needs_calculation = True
+
+            if self._plan_index == position_count:
+                break
+
+            # We publish the priority we have just processed, if the remaining
+            # nodes have a lower priority (see _calculate_ready_nodes)...
+            priority = priorities[position]
+            if self.priority_published_callback is not None \
+                    and priorities[positions[self._plan_index]] < priority:
+                self.priority_published_callback(priority)
+
+            # We check whether we have run out of time...
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+
+        self._end_plan_run()
+        return True
+
+    def _schedule_remaining_planned_nodes(self):
+        """
+        Called when the graph changes shape while a plan is being run. We set
+        up the nodes which have not yet been visited as if they had been
+        invalidated in the normal way, and schedule those which are ready.
+
+        As in the normal calculation, each node uses the children it had when
+        the cycle started.
+        """
+        plan = self._plan_being_run
+        nodes = plan.nodes
+        child_offsets = plan.child_offsets
+        child_indices = plan.child_indices
+        keyed_child_positions = self._plan_keyed_child_positions
+        remaining_nodes = [nodes[x] for x in self._plan_positions[self._plan_index:]]
+        self._end_plan_run()
+
+        # The children of an unvisited node are all unvisited, as they come
+        # later in the plan...
+        for node in remaining_nodes:
+            node._invalid_count += 1
+        for node in remaining_nodes:
+            position = plan.positions[node]
+            if position in keyed_child_positions:
+                child_positions = keyed_child_positions[position]
+                node._is_partially_invalidated = True
+            else:
+                child_positions = child_indices[child_offsets[position]:child_offsets[position + 1]]
+            node._child_nodes_for_this_calculation_cycle = set(nodes[x] for x in child_positions)
+            for child_node in node._child_nodes_for_this_calculation_cycle:
+                child_node._invalid_count += 1
+                child_node.add_updated_parent(node)
+                if self.tracer is not None:
+                    self.tracer.node_invalidated(child_node, node)
+
+        # We validate the nodes, which schedules those whose parents have all
+        # been calculated...
+        for node in remaining_nodes:
+            node.validate()
+
+    def _update_effective_priorities(self):
+        """
+        Recalculates the priority with which each node is scheduled. Ancestors
+        of a node inherit its priority, if it is higher than their own.
+        """
+        self._priorities_dirty = False
+        self._effective_priorities.clear()
+
+        # We process the nodes in descending order of priority. This means that
+        # we only walk up through the ancestors of each node until we find nodes
+        # which already have an equal or higher effective priority...
+        priority_nodes = sorted(self._priority_nodes, key=lambda x: x.priority, reverse=True)
+        effective_priorities = self._effective_priorities
+        for priority_node in priority_nodes:
+            priority = priority_node.priority
+            nodes = [priority_node]
+            while nodes:
+                node = nodes.pop()
+                if effective_priorities.get(node, 0) >= priority:
+                    continue
+                effective_priorities[node] = priority
+                nodes.extend(node._parent_nodes)
 
     def update_gc_info_for_node(self, node):
         """
@@ -213,6 +1243,13 @@ class GraphManager(object):
         """
         Cleans up unreferenced nodes.
         """
+        # If we are keeping unreferenced nodes, we need to GC when the grace
+        # period for the oldest of them expires...
+        if self._unreferenced_nodes and not self._gc_required:
+            oldest_cycle_number = next(iter(self._unreferenced_nodes.values()))
+            if self._cycle_number - oldest_cycle_number >= self.gc_grace_cycles:
+                self._gc_required = True
+
         if not self._gc_required:
             return
         self._gc_required = False
@@ -227,33 +1264,71 @@ class GraphManager(object):
         #
         # When we have processed all the non-collectable nodes, any nodes remaining
         # in the all-nodes collection are ones which are not the ancestor of any
-        # non-collectable node. They are then all removed from the graph and deleted.
+        # non-collectable node. They are unreferenced.
 
         # We find the set of all nodes in the graph...
-        all_nodes = set(self._nodes.values())
+        unreferenced_nodes = set(self._nodes.values())
 
         # We remove all ancestors of non-collectable nodes from the set of all-nodes...
-        for node in self._non_collectable_nodes:
-            self._remove_parent_nodes_from_set(node, all_nodes)
+        self._remove_parent_nodes_from_set(self._non_collectable_nodes, unreferenced_nodes)
+
+        # Nodes we were keeping which are referenced again have been revived...
+        for node in [x for x in self._unreferenced_nodes if x not in unreferenced_nodes]:
+            del self._unreferenced_nodes[node]
+
+        # We note when newly unreferenced nodes became unreferenced...
+        for node in unreferenced_nodes:
+            if node not in self._unreferenced_nodes:
+                self._unreferenced_nodes[node] = self._cycle_number
+
+        # We find the nodes whose grace period has expired, and the least recently
+        # used nodes if we are keeping too many...
+        excess_node_count = 0
+        if self.gc_pool_size is not None:
+            excess_node_count = len(self._unreferenced_nodes) - self.gc_pool_size
+        nodes_to_dispose = set()
+        for node, cycle_number in self._unreferenced_nodes.items():
+            if excess_node_count <= 0 and self._cycle_number - cycle_number < self.gc_grace_cycles:
+                break
+            nodes_to_dispose.add(node)
+            excess_node_count -= 1
+
+        # The parents of nodes we are still keeping must be kept as well. We give
+        # them the same grace period as the oldest node we are keeping, so that
+        # we do not GC again until that has expired...
+        nodes_to_keep = [x for x in self._unreferenced_nodes if x not in nodes_to_dispose]
+        if nodes_to_keep:
+            oldest_cycle_number = self._unreferenced_nodes[nodes_to_keep[0]]
+            expired_nodes = nodes_to_dispose.copy()
+            self._remove_parent_nodes_from_set(nodes_to_keep, nodes_to_dispose)
+            for node in expired_nodes.difference(nodes_to_dispose):
+                self._unreferenced_nodes[node] = oldest_cycle_number
 
         # Any nodes remaining can be deleted...
-        for node in all_nodes:
+        for node in nodes_to_dispose:
             self._dispose_and_remove_node(node)
 
-    def _remove_parent_nodes_from_set(self, node, nodes):
+        if self.metrics is not None:
+            self.metrics.gc_performed(len(nodes_to_dispose))
+
+    def _remove_parent_nodes_from_set(self, start_nodes, nodes):
         """
-        Removes the node passed in and all its parent nodes from the node-set
-        passed in. This will recursively remove all ancestor nodes of the node
+        Removes the start-nodes passed in and all their parent nodes from the
+        node-set passed in. This will remove all ancestor nodes of the start-nodes
         from the set.
         """
-        # We remove the node itself...
-        if node in nodes:
-            nodes.remove(node)
-
-        # We loop through the parents of the node, removing them...
-        parents = node._parent_nodes
-        for parent in parents:
-            self._remove_parent_nodes_from_set(parent, nodes)
+        # We walk up the graph using a stack rather than by recursion, as
+        # graphs can be deeper than the recursion limit. We do not walk into
+        # the base graph of a forked graph...
+        visited_nodes = set()
+        nodes_to_visit = list(start_nodes)
+        while nodes_to_visit:
+            node = nodes_to_visit.pop()
+            if node in visited_nodes or node.graph_manager is not self:
+                continue
+            visited_nodes.add(node)
+            nodes.discard(node)
+            nodes_to_visit.extend(node._parent_nodes)
 
     def _dispose_and_remove_node(self, node):
         """
@@ -271,34 +1346,66 @@ class GraphManager(object):
         if node in self._nodes_with_updated_parents:
             self._nodes_with_updated_parents.remove(node)
 
+        if node in self._unreferenced_nodes:
+            del self._unreferenced_nodes[node]
+
+        if node in self._calculation_times:
+            del self._calculation_times[node]
+
+        if node in self._subscriptions:
+            del self._subscriptions[node]
+            self._updated_subscribed_nodes.pop(node, None)
+
+        if self.metrics is not None:
+            self.metrics.node_removed(node)
+
+        if node in self._priority_nodes:
+            self._priority_nodes.remove(node)
+            self._priorities_dirty = True
+
+        self._plan = None
+        self._link_version += 1
         node.cleanup()
+        if self.edge_store is not None and node._edge_index is not None:
+            self.edge_store.remove_node(node)
+        if self.topological_order is not None:
+            self.topological_order.remove_node(node)
+        if self.node_spiller is not None:
+            self.node_spiller.node_removed(node)
 
     def _set_dependencies_on_new_nodes(self):
         """
         Calls setDependencies() on any nodes that have been added since the
         last calculation cycle.
+
+        Setting up the dependencies of a node may create new (parent) nodes.
+        These are appended to the list of new nodes as we go, so we set up each
+        generation of new nodes in the same loop, however deep the graph.
         """
-        if not self._new_node_ids:
+        new_nodes = self._new_nodes
+        if not new_nodes:
             # There are no new nodes...
             return
 
-        # We copy the collection of new node IDs, as the act of setting up
-        # the dependencies may cause new nodes to be added in a re-entrant way...
-        node_ids = self._new_node_ids.copy()
-        self._new_node_ids.clear()
-
-        for node_id in node_ids:
-            # We check that the node is in the graph. It is possible
-            # that is was added and removed before this function got
-            # called...
-            if node_id in self._nodes:
-                node = self._nodes[node_id]
-                node.set_dependencies()
-
-        # Setting the dependencies may have caused new nodes to be created. If so,
-        # they will needs setting up. We call this function recursively to set
-        # them up...
-        self._set_dependencies_on_new_nodes()
+        nodes = self._nodes
+        metrics = self.metrics
+        index = 0
+        try:
+            while index < len(new_nodes):
+                node = new_nodes[index]
+                index += 1
+
+                # We check that the node is in the graph. It is possible
+                # that is was added and removed before this function got
+                # called...
+                if nodes.get(node.node_id) is node:
+                    node.set_dependencies()
+                    if metrics is not None:
+                        metrics.dependencies_set()
+        finally:
+            # We remove the nodes we have set up, leaving any we did not
+            # get to if set_dependencies() raised an exception...
+            del new_nodes[:index]
 
     def dump(self):
         """
@@ -326,6 +1433,22 @@ class GraphManager(object):
 
         return results
 
+    def get_calculation_time(self, node):
+        """
+        Returns the time (in seconds) the node passed in took for its most recent
+        calculation, or None if it has not been measured. Calculation times are
+        only measured if measure_calculation_times is True.
+        """
+        return self._calculation_times.get(node)
+
+    def get_cost_analysis(self):
+        """
+        Returns a CostAnalysis of the graph, showing the critical path through the
+        graph, the available parallelism and the most expensive node types, based
+        on the measured calculation time of each node.
+        """
+        return CostAnalysis(self._nodes.values(), self._calculation_times)
+
     def parents_updated(self, node, new_parents):
         """
         Called by nodes after their dependencies have changes. We are passed the
@@ -347,35 +1470,40 @@ class GraphManager(object):
                 self._new_parents_this_calculation_cycle[parent] = set()
             self._new_parents_this_calculation_cycle[parent].add(node)
 
-    def node_calculated(self, node):
+    def node_calculated(self, node, calculate_children):
         """
         Called when a node is calculated.
         """
+        if self.node_spiller is not None and node.spillable_attributes:
+            self.node_spiller.node_used(node, self._cycle_number)
+
+        # If the node's output has changed, we notify its subscribers at the
+        # end of the cycle...
+        if self._subscriptions and calculate_children == GraphNode.CalculateChildrenType.CALCULATE_CHILDREN \
+                and node in self._subscriptions:
+            self._updated_subscribed_nodes[node] = None
+
         # We check if the node is a 'late-parent'.
         if node not in self._new_parents_this_calculation_cycle:
             # This node has not been added as a parent to any other
             # nodes (yet) in this calculation cycle...
             return
 
-        # The node has been added as a parent to other nodes, but it has been
-        # calculated after them. So it is a 'late-parent'. We find the
-        # collection of child nodes that should have been triggered already
-        # and note that they need to be calculated in the next cycle...
-        child_nodes = self._new_parents_this_calculation_cycle[node]
-        self._nodes_with_updated_late_parents[node] = child_nodes
-
-    def _mark_nodes_with_updated_late_parents(self):
-        """
-        Deferred action from above: any nodes for which there is a "late parent"
-        (see header comments) are marked for calculation and notified that the
-        relevant parent has changed.
-        """
-        for parent, children in self._nodes_with_updated_late_parents:
-            # Mark the child nodes as needing calculation, and as triggered by the parent...
-            for child in children:
-                self.needs_calculation(child)
-                child.add_updated_parent(parent)
-        self._nodes_with_updated_late_parents.clear()
+        # The node has been added as a parent to other nodes in this calculation
+        # cycle. If it was invalidated before the link was added, it will not
+        # validate those children, so they will have been calculated before it.
+        # So it is a 'late-parent'. We mark those children as triggered by it, and
+        # invalidate and validate them again. This schedules them (and the nodes
+        # which depend on them) to be recalculated after this node...
+        captured_child_nodes = node._child_nodes_for_this_calculation_cycle
+        for child in self._new_parents_this_calculation_cycle[node]:
+            if child in captured_child_nodes or node not in child._parent_nodes:
+                continue
+            child._needs_calculation = True
+            child.invalidate(node)
+            child.validate()
+            if self.metrics is not None:
+                self.metrics.late_parent_found()
 
     def node_has_updated_parents(self, node):
         """
@@ -384,6 +1512,21 @@ class GraphManager(object):
         """
         self._nodes_with_updated_parents.add(node)
 
+    def node_has_delta(self, node):
+        """
+        Called when a node publishes a Delta. These need to be cleared out at
+        the end of the calculation cycle.
+        """
+        self._nodes_with_deltas.append(node)
+
+    def _clear_deltas(self):
+        """
+        Clears the deltas published in the calculation cycle.
+        """
+        for node in self._nodes_with_deltas:
+            node._delta = None
+        del self._nodes_with_deltas[:]
+
     def clear_updated_parents(self):
         """
         Clears the collection of updated-parents from all nodes which hold one.
@@ -398,11 +1541,25 @@ class GraphManager(object):
         """
         return len(self._nodes)
 
+    def link_added(self, parent, child):
+        """
+        Called by a node to tell the graph that it has added a
+        parent link...
+        """
+        self._plan = None
+        self._link_version += 1
+        if self._priority_nodes:
+            self._priorities_dirty = True
+
     def link_removed(self):
         """
         Called by a node to tell the graph that it has removed
         (unlinked) a parent link...
         """
         self._gc_required = True
+        self._plan = None
+        self._link_version += 1
+        if self._priority_nodes:
+            self._priorities_dirty = True
 
 
@@ -0,0 +1,254 @@
+import http.server
+import os
+import threading
+import time
+from .node_factory import NodeFactory
+
+
+class GraphMetrics(object):
+    """
+    Collects metrics about the health of a graph, and exports them in the
+    Prometheus text format, either to a file or from a small HTTP server.
+
+    To use it, set the graph-manager's metrics property before adding nodes:
+        graph_manager.metrics = GraphMetrics()
+        graph_manager.metrics.start_http_server(8000)
+
+    The metrics are:
+    - graph_nodes:                      Number of nodes, by node type.
+    - graph_cycles_total:               Completed calculation cycles.
+    - graph_changed_nodes:              Nodes which changed in the last cycle.
+    - graph_changed_nodes_total:        Nodes which changed, over all cycles.
+    - graph_cycle_seconds:              Histogram of the time taken by each cycle.
+    - graph_gc_runs_total:              Garbage collections.
+    - graph_gc_collected_nodes_total:   Nodes disposed by garbage collection.
+    - graph_set_dependencies_total:     Calls to set_dependencies() on new nodes.
+    - graph_reset_dependencies_total:   Calls to reset_dependencies().
+    - graph_late_parents_total:         Children recalculated because of late parents.
+
+    The metrics are updated by the calculation thread, and can be read from
+    another thread (such as the HTTP server's). Reads see each value as it was
+    at some recent point, which is all that monitoring needs.
+    """
+
+    # The default upper bounds (in seconds) of the cycle-time histogram buckets...
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        The 'constructor'.
+        """
+        # Node counts, keyed by node type...
+        self.node_counts = {}
+
+        # Counters...
+        self.cycle_count = 0
+        self.changed_node_count = 0
+        self.total_changed_node_count = 0
+        self.gc_run_count = 0
+        self.gc_collected_node_count = 0
+        self.set_dependencies_count = 0
+        self.reset_dependencies_count = 0
+        self.late_parent_count = 0
+
+        # The cycle-time histogram. The bucket counts are not cumulative here. They
+        # are accumulated when the metrics are exported...
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.cycle_seconds_sum = 0.0
+
+        # The number of nodes which have changed in the current cycle, and the time
+        # spent in calculate() for it. (A cycle with a time-budget can span several
+        # calls to calculate.)
+        self._cycle_changed_node_count = 0
+        self._cycle_seconds = 0.0
+        self._start_time = 0.0
+
+        self._http_server = None
+
+    def node_added(self, node):
+        """
+        Called by the graph-manager when a node is added to the graph.
+        """
+        node_type = NodeFactory.get_node_type_name(type(node))
+        self.node_counts[node_type] = self.node_counts.get(node_type, 0) + 1
+
+    def node_removed(self, node):
+        """
+        Called by the graph-manager when a node is removed from the graph.
+        """
+        node_type = NodeFactory.get_node_type_name(type(node))
+        self.node_counts[node_type] = self.node_counts.get(node_type, 0) - 1
+
+    def calculation_started(self):
+        """
+        Called by the graph-manager when calculate() is called.
+        """
+        self._start_time = time.perf_counter()
+
+    def calculation_ended(self, cycle_complete):
+        """
+        Called by the graph-manager when calculate() has finished. cycle_complete
+        is False if the cycle ran out of time, and will be resumed.
+        """
+        self._cycle_seconds += time.perf_counter() - self._start_time
+        if not cycle_complete:
+            return
+
+        self.cycle_count += 1
+        self.changed_node_count = self._cycle_changed_node_count
+        self.total_changed_node_count += self._cycle_changed_node_count
+        self._observe_cycle_seconds(self._cycle_seconds)
+        self._cycle_changed_node_count = 0
+        self._cycle_seconds = 0.0
+
+    def nodes_changed(self, changed_node_count):
+        """
+        Called by the graph-manager with the number of changed nodes it is
+        about to calculate.
+        """
+        self._cycle_changed_node_count += changed_node_count
+
+    def gc_performed(self, collected_node_count):
+        """
+        Called by the graph-manager when it has garbage-collected the graph.
+        """
+        self.gc_run_count += 1
+        self.gc_collected_node_count += collected_node_count
+
+    def dependencies_set(self):
+        """
+        Called by the graph-manager when it sets the dependencies of a new node.
+        """
+        self.set_dependencies_count += 1
+
+    def dependencies_reset(self):
+        """
+        Called when a node resets its dependencies.
+        """
+        self.reset_dependencies_count += 1
+
+    def late_parent_found(self):
+        """
+        Called by the graph-manager when it recalculates a child because of
+        a late parent.
+        """
+        self.late_parent_count += 1
+
+    def get_prometheus_text(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        lines.append("# HELP graph_nodes Number of nodes in the graph, by node type.")
+        lines.append("# TYPE graph_nodes gauge")
+        for node_type, node_count in sorted(list(self.node_counts.items())):
+            lines.append('graph_nodes{node_type="%s"} %d' % (self._escape_label(node_type), node_count))
+
+        self._add_metric(lines, "graph_cycles_total", "counter",
+                         "Completed calculation cycles.", self.cycle_count)
+        self._add_metric(lines, "graph_changed_nodes", "gauge",
+                         "Nodes which changed in the last calculation cycle.", self.changed_node_count)
+        self._add_metric(lines, "graph_changed_nodes_total", "counter",
+                         "Nodes which changed, over all calculation cycles.", self.total_changed_node_count)
+
+        lines.append("# HELP graph_cycle_seconds Time taken by each calculation cycle.")
+        lines.append("# TYPE graph_cycle_seconds histogram")
+        cumulative_count = 0
+        for bucket, bucket_count in zip(self.buckets, self.bucket_counts):
+            cumulative_count += bucket_count
+            lines.append('graph_cycle_seconds_bucket{le="%s"} %d' % (repr(float(bucket)), cumulative_count))
+        cumulative_count += self.bucket_counts[-1]
+        lines.append('graph_cycle_seconds_bucket{le="+Inf"} %d' % cumulative_count)
+        lines.append("graph_cycle_seconds_sum %s" % repr(self.cycle_seconds_sum))
+        lines.append("graph_cycle_seconds_count %d" % cumulative_count)
+
+        self._add_metric(lines, "graph_gc_runs_total", "counter",
+                         "Garbage collections of the graph.", self.gc_run_count)
+        self._add_metric(lines, "graph_gc_collected_nodes_total", "counter",
+                         "Nodes disposed by garbage collection.", self.gc_collected_node_count)
+        self._add_metric(lines, "graph_set_dependencies_total", "counter",
+                         "Calls to set_dependencies() on new nodes.", self.set_dependencies_count)
+        self._add_metric(lines, "graph_reset_dependencies_total", "counter",
+                         "Calls to reset_dependencies().", self.reset_dependencies_count)
+        self._add_metric(lines, "graph_late_parents_total", "counter",
+                         "Children recalculated because a new parent calculated after them.",
+                         self.late_parent_count)
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus_file(self, path):
+        """
+        Writes the metrics to the file passed in, for example for the node-exporter's
+        textfile collector. The file is replaced atomically, so readers never see a
+        partly written file.
+        """
+        temp_path = path + "." + str(os.getpid()) + ".tmp"
+        with open(temp_path, "w") as metrics_file:
+            metrics_file.write(self.get_prometheus_text())
+        os.replace(temp_path, path)
+
+    def start_http_server(self, port, address="127.0.0.1"):
+        """
+        Serves the metrics over HTTP from a background thread. Any path returns
+        the metrics. Returns the port being served, which is useful if you pass
+        in port 0 to use any free port.
+        """
+        if self._http_server is not None:
+            return self._http_server.server_address[1]
+
+        metrics = self
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.get_prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._http_server = http.server.ThreadingHTTPServer((address, port), MetricsHandler)
+        thread = threading.Thread(target=self._http_server.serve_forever, name="GraphMetrics")
+        thread.daemon = True
+        thread.start()
+        return self._http_server.server_address[1]
+
+    def stop_http_server(self):
+        """
+        Stops the HTTP server, if it is running.
+        """
+        if self._http_server is None:
+            return
+        self._http_server.shutdown()
+        self._http_server.server_close()
+        self._http_server = None
+
+    def _observe_cycle_seconds(self, seconds):
+        """
+        Adds a cycle time to the histogram.
+        """
+        self.cycle_seconds_sum += seconds
+        for index, bucket in enumerate(self.buckets):
+            if seconds <= bucket:
+                self.bucket_counts[index] += 1
+                return
+        self.bucket_counts[-1] += 1
+
+    @staticmethod
+    def _add_metric(lines, name, metric_type, description, value):
+        """
+        Adds the lines for a metric with a single value.
+        """
+        lines.append("# HELP " + name + " " + description)
+        lines.append("# TYPE " + name + " " + metric_type)
+        lines.append(name + " " + str(value))
+
+    @staticmethod
+    def _escape_label(value):
+        """
+        Escapes a label value for the Prometheus text format.
+        """
+        return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
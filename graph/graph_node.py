@@ -1,3 +1,4 @@
+from .delta import Delta
 from .graph_exception import GraphException
 from .quality import Quality
 from .node_factory import NodeFactory
@@ -21,6 +22,63 @@ class GraphNode(object):
         CALCULATE_CHILDREN = 1
         DO_NOT_CALCULATE_CHILDREN = 2
 
+    # The scheduling priority of nodes of this type. When several nodes are ready
+    # to calculate, the graph-manager calculates those with the highest priority
+    # (and the nodes they depend on) first. Override this in derived classes for
+    # latency-critical node types, or use GraphManager.set_node_priority() to set
+    # the priority of an individual node...
+    priority = 0
+
+    # The node's index in the graph-manager's EdgeStore, if it has one...
+    _edge_index = None
+
+    # The Delta published by the node's most recent calculation in the current
+    # calculation cycle, if it published one (see set_delta)...
+    _delta = None
+
+    # True if the node has calculated since its parents last changed, so that
+    # it can update its output from the deltas of its parents...
+    _has_calculated_from_parents = False
+
+    # Keyed links to child nodes (see add_parent). If any children are linked
+    # with keys, these hold a dictionary of key -> set of children linked with
+    # that key, a dictionary of child -> the keys it is linked with, and the set
+    # of children linked without keys. Otherwise they are None...
+    _children_by_key = None
+    _keyed_child_nodes = None
+    _unkeyed_child_nodes = None
+
+    # The keys passed to set_changed_keys() since the last calculation pass, or
+    # None if any of the node's output may have changed...
+    _changed_keys = None
+
+    # True if the node has been invalidated for changes to some keys, so only
+    # the children linked with those keys have been invalidated...
+    _is_partially_invalidated = False
+
+    # True while the node is waiting in the graph-manager's queue of nodes which
+    # are ready to calculate...
+    _is_scheduled = False
+
+    # The names of the attributes holding the node's state, which the graph-
+    # manager's NodeSpiller may move to disk when the node has not been used
+    # for a while. Override this in derived classes to opt in...
+    spillable_attributes = ()
+
+    # True if the node's spillable attributes have been moved to disk...
+    _is_spilled = False
+
+    # True once the node has been removed from the graph and cleaned up...
+    _is_disposed = False
+
+    # The parents found by add_parent_node() in the node's last reset_dependencies(),
+    # as a dictionary of (node_type, args) -> parent. While the next reset runs,
+    # they are held in _previous_parent_cache, so that set_dependencies() can reuse
+    # them without building their IDs and looking them up again. (Only nodes whose
+    # dependencies are reset have a cache.)...
+    _parent_cache = None
+    _previous_parent_cache = None
+
     def __init__(self, node_id, graph_manager, environment, *args, **kwargs):
         """
         The constructor.
@@ -39,6 +97,8 @@ class GraphNode(object):
         self.quality = Quality()
 
         # The set of parent nodes...
+        # (If the graph-manager has an EdgeStore, this and the set of child
+        # nodes are replaced by views onto the store when the node is added.)
         self._parent_nodes = set()
 
         # The set of child nodes...
@@ -102,12 +162,25 @@ class GraphNode(object):
         """
         return ""
 
+    def __getattr__(self, name):
+        """
+        Called when an attribute is not found on the node. If it is one of the
+        node's spillable attributes and the node has been spilled, we reload
+        the node's state from disk.
+        """
+        if self._is_spilled and name in self.spillable_attributes:
+            self.graph_manager.node_spiller.reload(self)
+            return getattr(self, name)
+        raise AttributeError("'" + type(self).__name__ + "' object has no attribute '" + name + "'")
+
     def cleanup(self):
         """
         Cleans up the node and calls dispose() on derived classes.
         """
         self.remove_parents()
         self.remove_children()
+        self._parent_cache = None
+        self._is_disposed = True
         self.dispose()
 
     def dispose(self):
@@ -157,14 +230,112 @@ class GraphNode(object):
         """
         return ""
 
-    def add_parent(self, node):
+    def add_parent(self, node, keys=None):
         """
         Adds a parent node for this node and updates the child node collection
         of the parent
+
+        If keys are supplied, this node only depends on the parts of the parent's
+        output identified by the keys (for example, some dates in a collection
+        of holidays). When the parent is marked as changed with set_changed_keys(),
+        only the children linked with those keys are recalculated. If the node is
+        linked to the same parent more than once, it depends on all the keys it
+        was linked with, or on all of the parent's output if it was linked
+        without keys.
+
+        (In a forked graph, nodes can have parents in the base graph. These
+        parents are not changed, so they do not know about their children in
+        the forked graph.)
         """
         if node not in self._parent_nodes:
-            self._parent_nodes.add(node)
-            node._child_nodes.add(self)
+            # We check that the link would not create a cycle before making it...
+            if self.graph_manager.topological_order is not None:
+                self.graph_manager.topological_order.add_link(node, self)
+
+            edge_store = self.graph_manager.edge_store
+            if edge_store is None:
+                self._parent_nodes.add(node)
+                if node.graph_manager is self.graph_manager:
+                    node._child_nodes.add(self)
+            else:
+                edge_store.add_link(node, self)
+            self._has_calculated_from_parents = False
+            if node.graph_manager is self.graph_manager and (keys is not None or node._children_by_key is not None):
+                node._set_child_keys(self, keys)
+
+            # We tell the graph-manager that the shape of the graph has changed...
+            self.graph_manager.link_added(node, self)
+        elif node._children_by_key is not None and node.graph_manager is self.graph_manager:
+            # We are already linked to the parent. We depend on the keys we
+            # were linked with before as well as the new ones...
+            previous_keys = node._keyed_child_nodes.get(self)
+            if previous_keys is not None:
+                node._set_child_keys(self, previous_keys.union(keys) if keys is not None else None)
+
+    def _set_child_keys(self, child, keys):
+        """
+        Records the keys a child node is linked to this node with, or that it
+        is linked without keys if keys is None.
+        """
+        if self._children_by_key is None:
+            # This is the first keyed child. The existing children are unkeyed...
+            self._children_by_key = {}
+            self._keyed_child_nodes = {}
+            self._unkeyed_child_nodes = set(self._child_nodes)
+
+        self._remove_child_keys(child)
+        if keys is None:
+            self._unkeyed_child_nodes.add(child)
+        else:
+            keys = frozenset(keys)
+            self._keyed_child_nodes[child] = keys
+            for key in keys:
+                children = self._children_by_key.get(key)
+                if children is None:
+                    children = self._children_by_key[key] = set()
+                children.add(child)
+
+    def _remove_child_keys(self, child):
+        """
+        Removes the record of the keys a child node is linked to this node with.
+        """
+        self._unkeyed_child_nodes.discard(child)
+        keys = self._keyed_child_nodes.pop(child, None)
+        if keys is not None:
+            for key in keys:
+                children = self._children_by_key[key]
+                children.discard(child)
+                if not children:
+                    del self._children_by_key[key]
+
+    def set_changed_keys(self, keys):
+        """
+        Marks the node as needing calculation in the next calculation cycle, as
+        the parts of its output identified by the keys passed in have changed.
+        Only the children linked to this node with one of the keys, or without
+        keys, are invalidated (see add_parent).
+
+        The keys from several calls before a calculation are combined. If the node
+        is also marked as needing calculation without keys, or is invalidated by
+        one of its parents, all its children are invalidated.
+        """
+        self.graph_manager.needs_calculation(self, keys)
+
+    def get_changed_child_nodes(self):
+        """
+        Returns the set of child nodes affected by the keys passed to
+        set_changed_keys() since the last calculation pass, or None if all
+        the children may be affected.
+        """
+        if self._changed_keys is None or self._children_by_key is None:
+            return None
+        child_nodes = set(self._unkeyed_child_nodes)
+        children_by_key = self._children_by_key
+        for key in self._changed_keys:
+            children = children_by_key.get(key)
+            if children is not None:
+                child_nodes.update(children)
+        return child_nodes
 
     def remove_parent(self, node):
         """
@@ -175,8 +346,16 @@ class GraphNode(object):
             return  # The node passed in is not one of our parent nodes.
 
         # We remove the parent, and remove us as a child from the parent...
-        self._parent_nodes.remove(node)
-        node._child_nodes.remove(self)
+        edge_store = self.graph_manager.edge_store
+        if edge_store is None:
+            self._parent_nodes.remove(node)
+            if node.graph_manager is self.graph_manager:
+                node._child_nodes.remove(self)
+        else:
+            edge_store.remove_link(node, self)
+        self._has_calculated_from_parents = False
+        if node._children_by_key is not None and node.graph_manager is self.graph_manager:
+            node._remove_child_keys(self)
 
         # We mark the graph as needing garbage collection, as removing
         # the parent link may leave unreferenced nodes...
@@ -187,9 +366,19 @@ class GraphNode(object):
         Removes all parent nodes for this node, also updates the child collections
         of the parents.
         """
-        while len(self._parent_nodes) > 0:
-            node = self._parent_nodes.pop()
-            node._child_nodes.remove(self)
+        for node in self._parent_nodes:
+            if node._children_by_key is not None and node.graph_manager is self.graph_manager:
+                node._remove_child_keys(self)
+
+        edge_store = self.graph_manager.edge_store
+        if edge_store is not None and self._edge_index is not None:
+            edge_store.remove_parents(self)
+        else:
+            while len(self._parent_nodes) > 0:
+                node = self._parent_nodes.pop()
+                if node.graph_manager is self.graph_manager:
+                    node._child_nodes.remove(self)
+        self._has_calculated_from_parents = False
 
         # We mark the graph as needing garbage collection, as removing
         # the parents may leave unreferenced nodes...
@@ -200,9 +389,17 @@ class GraphNode(object):
         Removes all child nodes for this node, also updates the parent collections
         of the children.
         """
-        while len(self._child_nodes) > 0:
-            node = self._child_nodes.pop()
-            node._parent_nodes.remove(self)
+        self._children_by_key = None
+        self._keyed_child_nodes = None
+        self._unkeyed_child_nodes = None
+
+        edge_store = self.graph_manager.edge_store
+        if edge_store is not None and self._edge_index is not None:
+            edge_store.remove_children(self)
+        else:
+            while len(self._child_nodes) > 0:
+                node = self._child_nodes.pop()
+                node._parent_nodes.remove(self)
 
     def has_children(self):
         """
@@ -223,25 +420,55 @@ class GraphNode(object):
         # calculation, the parent will be NULL, so we don't include it.)
         if parent is not None:
             self.add_updated_parent(parent)
-
+            if self.graph_manager.tracer is not None:
+                self.graph_manager.tracer.node_invalidated(self, parent)
+
+        # If the node is waiting to calculate, it has already invalidated its
+        # children, so it is not invalidated again. (This happens when a late
+        # parent invalidates nodes which were waiting to calculate.) If it has
+        # been invalidated by a new parent, it is not calculated until that parent
+        # has been calculated (see GraphManager._calculate_ready_nodes)...
         self._invalid_count += 1
-        if self._invalid_count == 1:
-            # We have just gone invalid.
+        if self._invalid_count == 1 and not self._is_scheduled:
+            # We have just gone invalid. We tell the graph-manager, so that it
+            # knows how many nodes are waiting to be calculated...
+            self.graph_manager._invalid_node_count += 1
 
             # Capture child set, as this may change as a result of calculation, and
-            # make recursive call for each node in captured child set
-            self._child_nodes_for_this_calculation_cycle = self._child_nodes.copy()
-            for node in self._child_nodes_for_this_calculation_cycle:
+            # make recursive call for each node in captured child set. If this is a
+            # changed node whose changes are keyed, we only invalidate the children
+            # linked with those keys...
+            child_nodes = self.get_changed_child_nodes() if parent is None else None
+            if child_nodes is None:
+                child_nodes = self._child_nodes.copy()
+            else:
+                self._is_partially_invalidated = True
+            self._child_nodes_for_this_calculation_cycle = child_nodes
+            for node in child_nodes:
                 node.invalidate(self)
+        elif parent is not None and self._is_partially_invalidated:
+            # We were only invalidated for some keys, but a parent has now
+            # invalidated us, so any of our children may be affected...
+            self.invalidate_remaining_children()
+
+    def invalidate_remaining_children(self):
+        """
+        Invalidates the children which were not invalidated when the node was
+        invalidated for changes to some keys.
+        """
+        self._is_partially_invalidated = False
+        child_nodes = self._child_nodes.difference(self._child_nodes_for_this_calculation_cycle)
+        self._child_nodes_for_this_calculation_cycle.update(child_nodes)
+        for node in child_nodes:
+            node.invalidate(self)
 
     def validate(self):
         """
         Called when one of the parent nodes has been calculated. We decrease the
         invalidation count and if it has gone to zero, then all parents have been
-        calculated and we can calculate this node.
-
-        We then notify child nodes that they need to be calculated (by calling
-        validate on them).
+        calculated and we tell the graph-manager that this node is ready to be
+        calculated. (The graph-manager schedules ready nodes in priority order,
+        and calls calculate_and_validate_children() on them.)
         """
         if self._invalid_count <= 0:
             # Something has gone badly wrong in invalidate/validate...
@@ -249,39 +476,82 @@ class GraphNode(object):
 
         self._invalid_count -= 1
         if self._invalid_count == 0:
-            # All our parents are now valid, so we calculate our
-            # output value if necessary...
-            calculate_children = GraphNode.CalculateChildrenType.DO_NOT_CALCULATE_CHILDREN
-            if self._needs_calculation is True:
-                # We call pre-calculate. (This allows the node to do custom
-                # resetting of dependencies.)
-                self.pre_calculate()
-
-                # We merge data-quality...
-                self.calculate_quality()
-
-                # We do the calculation itself...
-                calculate_children = self.calculate()
-                self._needs_calculation = False
-                self.has_calculated = True
-
-                # We tell the graph-manager that the node has been calculated...
-                self.graph_manager.node_calculated(self)
-
-            # We calculate our child nodes...
-            for child_node in self._child_nodes_for_this_calculation_cycle:
-                # If this node's value has changed, force the _needs_calculation
-                # flag in the child node...
-                if calculate_children == GraphNode.CalculateChildrenType.CALCULATE_CHILDREN:
-                    child_node._needs_calculation = True
-
-                # We tell the child node that this parent has calculated...
-                child_node.validate()
+            # All our parents are now valid...
+            self.graph_manager.node_ready(self)
+
+    def calculate_and_validate_children(self):
+        """
+        Called by the graph-manager when the node is scheduled for calculation,
+        ie when all its parents are valid.
+
+        We calculate our output value if necessary, and then notify child nodes
+        that they need to be calculated (by calling validate on them).
+        """
+        if self._is_partially_invalidated:
+            self._is_partially_invalidated = False
+        calculate_children = self.calculate_if_needed()
+
+        # We calculate our child nodes...
+        for child_node in self._child_nodes_for_this_calculation_cycle:
+            # If this node's value has changed, force the _needs_calculation
+            # flag in the child node...
+            if calculate_children == GraphNode.CalculateChildrenType.CALCULATE_CHILDREN:
+                child_node._needs_calculation = True
+
+            # We tell the child node that this parent has calculated...
+            child_node.validate()
+
+    def calculate_if_needed(self):
+        """
+        Calculates the node if it has been marked as needing calculation.
+
+        Returns whether child nodes should be calculated. (If the node did not
+        need calculating, its output has not changed.)
+        """
+        if self._needs_calculation is not True:
+            return GraphNode.CalculateChildrenType.DO_NOT_CALCULATE_CHILDREN
+
+        # If the node's state has been spilled to disk, we reload it before the
+        # node changes any of it...
+        if self._is_spilled:
+            self.graph_manager.node_spiller.reload(self)
+
+        # We call pre-calculate. (This allows the node to do custom
+        # resetting of dependencies.)
+        self.pre_calculate()
+
+        # We merge data-quality...
+        self.calculate_quality()
+
+        # We do the calculation itself. Any delta from an earlier calculation in
+        # this cycle is replaced, and a delta is only kept if the node changed...
+        if self._delta is not None:
+            self._delta = None
+        calculate_children = self.calculate()
+        if self._delta is not None and calculate_children != GraphNode.CalculateChildrenType.CALCULATE_CHILDREN:
+            self._delta = None
+        self._has_calculated_from_parents = True
+        self._needs_calculation = False
+        self.has_calculated = True
+        if self.graph_manager.tracer is not None:
+            self.graph_manager.tracer.node_calculated(self, calculate_children)
+
+        # The updated parents have now been handled. We clear them so that if
+        # the node is calculated again later in the cycle (for example, because
+        # of a late parent) it only sees the parents which triggered that...
+        self._updated_parent_nodes.clear()
+
+        # We tell the graph-manager that the node has been calculated...
+        self.graph_manager.node_calculated(self, calculate_children)
+        return calculate_children
 
     def reset_dependencies(self):
         """
         Asks node to recreate its dependencies on other nodes and data objects.
         """
+        if self.graph_manager.metrics is not None:
+            self.graph_manager.metrics.dependencies_reset()
+
         # We clear the collection of nodes that cause an auto-reset.
         # (It will be repopulated when the new dependencies are set up.)
         self._auto_rebuild_nodes.clear()
@@ -291,9 +561,16 @@ class GraphNode(object):
         # before and after setting them up...
         parents_before_reset = self._parent_nodes.copy()
 
-        # We remove any existing parents, and add the new ones...
+        # We remove any existing parents, and add the new ones. The cache is
+        # rebuilt with the parents found this time, so that it only holds
+        # parents which are still in use...
         self.remove_parents()
-        self.set_dependencies()
+        self._previous_parent_cache = self._parent_cache if self._parent_cache is not None else {}
+        self._parent_cache = None
+        try:
+            self.set_dependencies()
+        finally:
+            self._previous_parent_cache = None
 
         # We find the collection of nodes that are now parents, but which
         # weren't before, and we tell the graph-manager about them. (This
@@ -302,6 +579,34 @@ class GraphNode(object):
         new_parents = self._parent_nodes.difference(parents_before_reset)
         self.graph_manager.parents_updated(self, new_parents)
 
+    def set_delta(self, added=(), removed=()):
+        """
+        Can be called from calculate() to describe how the node's output has
+        changed, as the items added and removed (see Delta). The delta is
+        available to child nodes until the end of the calculation cycle.
+        """
+        self._delta = Delta(added, removed)
+        self.graph_manager.node_has_delta(self)
+
+    def get_parent_delta(self, parent):
+        """
+        Returns the Delta describing how the parent passed in has changed since
+        this node last calculated, for use in calculate(). This is:
+        - Delta.EMPTY if the parent has not changed.
+        - The parent's delta, if it published one (see set_delta).
+        - None if the parent changed without publishing a delta, or if this node
+          has not calculated from its current parents before. The node should
+          then calculate from the parent's whole output.
+
+        The deltas only describe changes to parents. Nodes which calculate for
+        other reasons (for example, from their own data) must allow for this.
+        """
+        if not self._has_calculated_from_parents:
+            return None
+        if parent not in self._updated_parent_nodes:
+            return Delta.EMPTY
+        return parent._delta
+
     def parent_updated(self, parent):
         """
         Returns true if the node passed in caused the calculation of the calling
@@ -363,15 +668,35 @@ class GraphNode(object):
 
         kwargs can include:
           auto_rebuild = True / False (defaults to False if not supplied)
-        """
-        # We find the node...
-        node = NodeFactory.get_node(
-            self.graph_manager,
-            GraphNode.GCType.COLLECTABLE,
-            node_type,
-            *args,
-            **kwargs)
-        self.add_parent(node)
+          keys = The keys to link to the parent with (see add_parent)
+        """
+        keys = kwargs.pop("keys", None)
+
+        # If we are resetting our dependencies, we reuse the node found for the
+        # same type and parameters the last time they were reset, if it is still
+        # in the graph. Otherwise we find it...
+        cache_key = None
+        node = None
+        previous_parent_cache = self._previous_parent_cache
+        if previous_parent_cache is not None:
+            cache_key = (node_type, args)
+            try:
+                node = previous_parent_cache.get(cache_key)
+            except TypeError:
+                # The parameters cannot be hashed, so the parent cannot be cached...
+                cache_key = None
+        if node is None or node._is_disposed or node.graph_manager is not self.graph_manager:
+            node = NodeFactory.get_node(
+                self.graph_manager,
+                GraphNode.GCType.COLLECTABLE,
+                node_type,
+                *args,
+                **kwargs)
+        if cache_key is not None:
+            if self._parent_cache is None:
+                self._parent_cache = {}
+            self._parent_cache[cache_key] = node
+        self.add_parent(node, keys)
 
         # If the optional auto_rebuild flag is set, we will automatically reset
         # dependencies if this node has updated in a calculation cycle...
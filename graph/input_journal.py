@@ -0,0 +1,331 @@
+import os
+import pickle
+import queue
+import struct
+import threading
+import time
+from .graph_exception import GraphException
+from .replay_engine import ReplayEngine
+
+
+class InputJournal(object):
+    """
+    An append-only journal of the inputs to a graph, from which the state of
+    the graph can be recovered after a crash, without re-querying every source.
+
+    Inputs are recorded as ReplayEngine.InputEvents: calls to methods of named
+    'targets', such as a holiday database. The easiest way to record them is to
+    make the calls through a recorder:
+        journal = InputJournal("/var/graph/inputs.journal")
+        holiday_db = journal.get_recorder("holiday_db", environment.holiday_db)
+        holiday_db.add_holiday("USD", date(2015, 7, 4))
+
+    Nodes explicitly marked as needing calculation can be recorded with
+    record_needs_calculation(node).
+
+    Events are written by a background thread, so recording an event does not
+    wait for any I/O. The thread writes all the events waiting for it with one
+    write (and one fsync, if sync is True), so the cost of committing events to
+    disk is shared between them (a 'group commit').
+
+    From time to time you can write a snapshot of the state of the targets with
+    write_snapshot(state). The snapshot records how far through the journal it
+    was taken, so on recovery only the events after it (the 'tail') are replayed:
+        events_replayed = InputJournal.recover(
+            "/var/graph/inputs.journal", graph_manager, targets, restore_state)
+
+    Events are recorded after the call to the target has succeeded. If the process
+    dies, events recorded in the last moments before it may not have been written.
+    """
+
+    # The name of the target used for needs_calculation events...
+    GRAPH_TARGET = "graph"
+
+    # The header of each record in the journal: its length...
+    _RECORD_HEADER = struct.Struct("<I")
+
+    # The header of a snapshot: the offset in the journal of the events after it...
+    _SNAPSHOT_HEADER = struct.Struct("<Q")
+
+    def __init__(self, path, sync=True, max_batch_size=10000):
+        """
+        The 'constructor'. Opens the journal at the path passed in, appending to
+        it if it already exists. A partly-written record at the end of an existing
+        journal (from a crash) is removed, so that new records follow the last
+        complete one.
+        """
+        self.path = path
+        self.sync = sync
+        self.max_batch_size = max_batch_size
+
+        # The number of events recorded, including those already in the journal...
+        _, event_count, offset = InputJournal.read_snapshot(path)
+        record_count, end_offset = InputJournal._scan_records(path, offset)
+        self._event_count = event_count + record_count
+
+        # The queue of items for the writer thread. These are the bytes of an event
+        # record, a tuple holding the bytes of a snapshot, a threading.Event marker
+        # set by flush() or None to stop the thread...
+        self._queue = queue.Queue()
+        self._error = None
+        self._file = open(path, "ab")
+        if self._file.seek(0, os.SEEK_END) > end_offset:
+            self._file.truncate(end_offset)
+            self._file.seek(end_offset)
+        self._thread = threading.Thread(target=self._write_items, name="InputJournal")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def record(self, target, method, args, kwargs=None):
+        """
+        Records a call of target.method(*args, **kwargs), where target is the name of
+        the target. The arguments are pickled immediately, so they can be changed
+        after the call.
+        """
+        event = (time.time(), target, method, tuple(args), dict(kwargs) if kwargs else None)
+        data = pickle.dumps(event, pickle.HIGHEST_PROTOCOL)
+        self._event_count += 1
+        self._queue.put(InputJournal._RECORD_HEADER.pack(len(data)) + data)
+
+    def record_needs_calculation(self, node):
+        """
+        Records that the node passed in has been marked as needing calculation.
+        """
+        self.record(InputJournal.GRAPH_TARGET, "needs_calculation_by_id", (node.node_id,))
+
+    def get_recorder(self, target_name, target):
+        """
+        Returns an object which forwards method calls to the target passed in,
+        and records them in the journal under the target name.
+        """
+        return JournalRecorder(self, target_name, target)
+
+    def write_snapshot(self, state):
+        """
+        Writes a snapshot of the state of the targets, which must be picklable.
+        The state is pickled immediately, and written by the background thread
+        once all the events recorded before it have been written.
+        """
+        data = pickle.dumps((self._event_count, state), pickle.HIGHEST_PROTOCOL)
+        self._queue.put((data,))
+
+    def flush(self):
+        """
+        Waits until all the events recorded so far have been written.
+        """
+        marker = threading.Event()
+        self._queue.put(marker)
+        marker.wait()
+        self._check_error()
+
+    def close(self):
+        """
+        Writes any outstanding events, and closes the journal.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+        self._check_error()
+
+    def get_event_count(self):
+        """
+        Returns the number of events recorded in the journal.
+        """
+        return self._event_count
+
+    @staticmethod
+    def get_snapshot_path(path):
+        """
+        Returns the path of the snapshot for the journal at the path passed in.
+        """
+        return path + ".snapshot"
+
+    @staticmethod
+    def read_snapshot(path):
+        """
+        Returns (state, event-count, offset) from the snapshot for the journal at
+        the path passed in, where event-count is the number of events recorded
+        before the snapshot, and offset is the position of the next event in the
+        journal file. Returns (None, 0, 0) if there is no snapshot.
+        """
+        snapshot_path = InputJournal.get_snapshot_path(path)
+        if not os.path.exists(snapshot_path):
+            return None, 0, 0
+        with open(snapshot_path, "rb") as snapshot_file:
+            offset = InputJournal._SNAPSHOT_HEADER.unpack(snapshot_file.read(InputJournal._SNAPSHOT_HEADER.size))[0]
+            event_count, state = pickle.load(snapshot_file)
+        return state, event_count, offset
+
+    @staticmethod
+    def read_events(path, offset=0):
+        """
+        Returns a list of the events (ReplayEngine.InputEvents) in the journal at
+        the path passed in, from the offset (in bytes) passed in. A partly-written
+        event at the end of the journal (from a crash) is ignored.
+        """
+        if not os.path.exists(path):
+            return []
+        events = []
+        header_size = InputJournal._RECORD_HEADER.size
+        with open(path, "rb") as journal_file:
+            journal_file.seek(offset)
+            data = journal_file.read()
+        position = 0
+        while position + header_size <= len(data):
+            length = InputJournal._RECORD_HEADER.unpack_from(data, position)[0]
+            position += header_size
+            if position + length > len(data):
+                break
+            events.append(ReplayEngine.InputEvent(*pickle.loads(data[position:position + length])))
+            position += length
+        return events
+
+    @staticmethod
+    def recover(path, graph_manager, targets, restore_state=None):
+        """
+        Recovers the state of a graph from the journal at the path passed in.
+
+        If there is a snapshot, restore_state(state) is called with the state it
+        holds. The events recorded after the snapshot are then applied to the
+        targets (a dictionary of name -> target, as passed to the ReplayEngine),
+        and the graph is calculated. Returns the number of events replayed.
+        """
+        state, event_count, offset = InputJournal.read_snapshot(path)
+        if state is not None and restore_state is not None:
+            restore_state(state)
+        events = InputJournal.read_events(path, offset)
+
+        targets = dict(targets)
+        targets.setdefault(InputJournal.GRAPH_TARGET, graph_manager)
+        engine = ReplayEngine(graph_manager, targets)
+        engine.cycle_boundary = ReplayEngine.CycleBoundary.PER_N_EVENTS
+        engine.events_per_cycle = max(len(events), 1)
+        engine.replay(events)
+        graph_manager.calculate()
+        return len(events)
+
+    @staticmethod
+    def _scan_records(path, offset):
+        """
+        Returns (record-count, end-offset) for the complete records in the journal
+        at the path passed in, from the offset passed in, where end-offset is the
+        offset just after the last complete record. Only the headers are read.
+        """
+        if not os.path.exists(path):
+            return 0, 0
+        header_size = InputJournal._RECORD_HEADER.size
+        record_count = 0
+        with open(path, "rb") as journal_file:
+            file_size = journal_file.seek(0, os.SEEK_END)
+            position = min(offset, file_size)
+            while position + header_size <= file_size:
+                journal_file.seek(position)
+                length = InputJournal._RECORD_HEADER.unpack(journal_file.read(header_size))[0]
+                if position + header_size + length > file_size:
+                    break
+                position += header_size + length
+                record_count += 1
+        return record_count, position
+
+    def _write_items(self):
+        """
+        The writer thread. We write all the items waiting in the queue in one go.
+        """
+        while True:
+            items = [self._queue.get()]
+            while len(items) < self.max_batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                is_stopping = self._write_batch(items)
+            except Exception as ex:
+                self._error = ex
+                is_stopping = None in items
+
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if is_stopping:
+                return
+
+    def _write_batch(self, items):
+        """
+        Writes a batch of items from the queue. Returns True if the thread should stop.
+        """
+        records = []
+        for item in items:
+            if isinstance(item, bytes):
+                records.append(item)
+            elif isinstance(item, tuple):
+                # We write the events before the snapshot, then the snapshot...
+                self._commit(records)
+                records = []
+                self._write_snapshot(item[0])
+        self._commit(records)
+        return None in items
+
+    def _commit(self, records):
+        """
+        Writes records to the journal, and waits for them to reach the disk if sync is True.
+        """
+        if not records:
+            return
+        self._file.write(b"".join(records))
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    def _write_snapshot(self, data):
+        """
+        Writes a snapshot, holding the position in the journal of the events after it.
+        The snapshot is replaced atomically, so it is never partly written.
+        """
+        snapshot_path = InputJournal.get_snapshot_path(self.path)
+        temp_path = snapshot_path + ".tmp"
+        with open(temp_path, "wb") as snapshot_file:
+            snapshot_file.write(InputJournal._SNAPSHOT_HEADER.pack(self._file.tell()))
+            snapshot_file.write(data)
+            snapshot_file.flush()
+            if self.sync:
+                os.fsync(snapshot_file.fileno())
+        os.replace(temp_path, snapshot_path)
+
+    def _check_error(self):
+        """
+        Raises any error from the writer thread.
+        """
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise GraphException("Error writing input journal: " + str(error))
+
+
+class JournalRecorder(object):
+    """
+    Forwards method calls to a target, and records them in an InputJournal.
+    Other attributes of the target are returned as they are.
+    """
+    def __init__(self, journal, target_name, target):
+        """
+        The 'constructor'.
+        """
+        self._journal = journal
+        self._target_name = target_name
+        self._target = target
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+
+        def record_call(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            self._journal.record(self._target_name, name, args, kwargs)
+            return result
+        return record_call
@@ -12,9 +12,7 @@ class NodeFactory(object):
 
         # We find the ID of the node. This is made up of the node's type (as a string)
         # plus it's identity parameters...
-        node_type_name = node_type.get_type()
-        if not node_type_name:
-            node_type_name = node_type.__name__
+        node_type_name = NodeFactory.get_node_type_name(node_type)
         node_id = node_type_name + "." + node_type.make_node_id(*args)
 
         # We check if the node is already in the graph and create it
@@ -36,3 +34,26 @@ class NodeFactory(object):
 
         return node
 
+    @staticmethod
+    def get_node_handle(graph_manager, node_type, *args, **kwargs):
+        """
+        Returns a NodeHandle for a non-collectable node of the type passed in,
+        creating the node if it is not already in the graph. The node is released
+        when the handle is released or garbage-collected.
+        """
+        from .graph_node import GraphNode
+        from .node_handle import NodeHandle
+
+        node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, node_type, *args, **kwargs)
+        return NodeHandle(graph_manager, node)
+
+    @staticmethod
+    def get_node_type_name(node_type):
+        """
+        Returns the name of the node type (class) passed in. This is the name
+        returned by its get_type() method, or the class name if that is empty.
+        """
+        node_type_name = node_type.get_type()
+        if not node_type_name:
+            node_type_name = node_type.__name__
+        return node_type_name
@@ -0,0 +1,52 @@
+import weakref
+
+
+class NodeHandle(object):
+    """
+    A client's reference to a non-collectable node, which releases the node
+    when the client has finished with it.
+
+    You get one of these from NodeFactory.get_node_handle(). The node stays in
+    the graph while the handle is alive. It is released (as if you had called
+    GraphManager.release_node) when the handle is garbage-collected, when you
+    call release(), or at the end of a with block:
+        with NodeFactory.get_node_handle(graph_manager, PriceNode, "EUR/USD") as price_node:
+            graph_manager.calculate()
+            ...
+
+    Handles can be dropped from any thread. The graph-manager releases dropped
+    nodes at the end of its next calculation cycle, so a handle may keep its node
+    for one more cycle after it has gone.
+
+    GraphManager.get_leak_report() lists non-collectable nodes which have no live
+    handles, which helps to find clients which forget to release nodes.
+    """
+    def __init__(self, graph_manager, node):
+        """
+        The 'constructor'. The node must already have a GC ref-count for this handle.
+        """
+        self.node = node
+        graph_manager.node_handle_created(node)
+
+        # The finalizer must not refer to the handle, or it would keep it alive...
+        self._finalizer = weakref.finalize(self, graph_manager.node_handle_released, node)
+        self._finalizer.atexit = False
+
+    def release(self):
+        """
+        Releases the node. It is safe to call this more than once.
+        """
+        self._finalizer()
+
+    def is_released(self):
+        """
+        Returns True if the node has been released.
+        """
+        return not self._finalizer.alive
+
+    def __enter__(self):
+        return self.node
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
@@ -0,0 +1,149 @@
+import collections
+import pickle
+import sqlite3
+
+
+class NodeSpiller(object):
+    """
+    Moves the state of nodes which have not been used for a while out of
+    memory, into an SQLite database on local disk, and reloads it when the
+    nodes are next used. The structure of the graph stays in memory.
+
+    To use it, set the graph-manager's node_spiller:
+        graph_manager.node_spiller = NodeSpiller("/tmp/graph-spill.db", idle_cycles=100)
+
+    Only nodes which opt in are spilled. A node type opts in by listing the
+    attributes which hold its (large) state:
+        class CurveNode(GraphNode):
+            spillable_attributes = ("points", "interpolator")
+
+    At the end of each calculation cycle, nodes which have not calculated or
+    been reloaded for idle_cycles cycles have these attributes pickled to the
+    database and removed from the node. When one of them is next read, or the
+    node next calculates, they are all reloaded. Reads of attributes which are
+    in memory are not tracked (so that they cost nothing extra), so a node
+    which is read but never calculates is spilled and reloaded at most once
+    every idle_cycles cycles.
+
+    Attributes which cannot be pickled are not spilled. Each graph needs its
+    own NodeSpiller, and the database should not be shared between processes.
+    """
+    def __init__(self, path, idle_cycles=10):
+        """
+        The 'constructor'. The database is created at the path passed in,
+        replacing any data spilled there before.
+        """
+        self.idle_cycles = idle_cycles
+
+        # The spilled state is a cache of data in this process, so we do not
+        # need the database to survive a crash...
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA synchronous = OFF")
+        self._connection.execute("PRAGMA journal_mode = MEMORY")
+        with self._connection:
+            self._connection.execute("DROP TABLE IF EXISTS spilled_nodes")
+            self._connection.execute("CREATE TABLE spilled_nodes (node_id TEXT PRIMARY KEY, state BLOB)")
+
+        # The spillable nodes in memory, in the order in which they were last used,
+        # as a dictionary of node -> the calculation cycle in which it was used...
+        self._last_used_cycles = collections.OrderedDict()
+
+        # The nodes which have been spilled...
+        self._spilled_nodes = set()
+
+        # The most recent calculation cycle number...
+        self._cycle_number = 0
+
+    def close(self):
+        """
+        Closes the database. Spilled nodes cannot be reloaded after this.
+        """
+        self._connection.close()
+
+    def node_used(self, node, cycle_number):
+        """
+        Called when a spillable node is calculated in the calculation cycle passed in.
+        """
+        last_used_cycles = self._last_used_cycles
+        if node in last_used_cycles:
+            last_used_cycles.move_to_end(node)
+        last_used_cycles[node] = cycle_number
+
+    def node_removed(self, node):
+        """
+        Called when a node is removed from the graph.
+        """
+        self._last_used_cycles.pop(node, None)
+        if node in self._spilled_nodes:
+            self._spilled_nodes.remove(node)
+            with self._connection:
+                self._connection.execute("DELETE FROM spilled_nodes WHERE node_id = ?", (node.node_id,))
+
+    def spill_idle_nodes(self, cycle_number):
+        """
+        Called at the end of a calculation cycle, with the number of the next
+        cycle. Spills the nodes which have not been used for idle_cycles cycles,
+        and returns how many there were.
+        """
+        self._cycle_number = cycle_number
+        last_used_cycles = self._last_used_cycles
+        last_cycle_to_spill = cycle_number - 1 - self.idle_cycles
+        nodes = []
+        rows = []
+        while last_used_cycles:
+            node, last_used_cycle = next(iter(last_used_cycles.items()))
+            if last_used_cycle > last_cycle_to_spill:
+                break
+            del last_used_cycles[node]
+            node_dict = node.__dict__
+            state = {x: node_dict[x] for x in node.spillable_attributes if x in node_dict}
+            try:
+                rows.append((node.node_id, pickle.dumps(state, pickle.HIGHEST_PROTOCOL)))
+            except Exception:
+                # The state cannot be pickled, so the node stays in memory...
+                continue
+            nodes.append(node)
+
+        if rows:
+            with self._connection:
+                self._connection.executemany("INSERT OR REPLACE INTO spilled_nodes VALUES (?, ?)", rows)
+            for node in nodes:
+                node_dict = node.__dict__
+                for name in node.spillable_attributes:
+                    node_dict.pop(name, None)
+                node._is_spilled = True
+            self._spilled_nodes.update(nodes)
+        return len(nodes)
+
+    def reload(self, node):
+        """
+        Reloads the state of a spilled node. Attributes which have been set on
+        the node since it was spilled are not overwritten.
+        """
+        with self._connection:
+            row = self._connection.execute(
+                "SELECT state FROM spilled_nodes WHERE node_id = ?", (node.node_id,)).fetchone()
+            self._connection.execute("DELETE FROM spilled_nodes WHERE node_id = ?", (node.node_id,))
+        self._spilled_nodes.discard(node)
+        node._is_spilled = False
+
+        node_dict = node.__dict__
+        for name, value in pickle.loads(row[0]).items():
+            if name not in node_dict:
+                node_dict[name] = value
+        self.node_used(node, self._cycle_number)
+
+    def clear(self):
+        """
+        Forgets all the nodes, and deletes their spilled state.
+        """
+        self._last_used_cycles.clear()
+        self._spilled_nodes.clear()
+        with self._connection:
+            self._connection.execute("DELETE FROM spilled_nodes")
+
+    def get_spilled_node_count(self):
+        """
+        Returns the number of nodes which are currently spilled.
+        """
+        return len(self._spilled_nodes)
@@ -0,0 +1,182 @@
+import collections
+import math
+
+
+class ReplayEngine(object):
+    """
+    Replays a recorded stream of input events through a graph, as quickly as
+    possible. This is useful for backtesting, and for reproducing problems seen
+    in production.
+
+    Each event is a ReplayEngine.InputEvent: a call to a method on one of the
+    'targets' (the objects which feed data into the graph, such as a holiday
+    database), with a timestamp. For example:
+        engine = ReplayEngine(graph_manager, {"holiday_db": environment.holiday_db})
+        engine.cycle_boundary = ReplayEngine.CycleBoundary.PER_TIME_SLICE
+        engine.time_slice_seconds = 60.0
+        engine.output_node_ids = [price_node.node_id]
+        engine.get_output = lambda node: node.price
+        outputs = engine.replay([
+            ReplayEngine.InputEvent(1000.0, "holiday_db", "add_holiday", ("USD", date(2015, 7, 4))),
+            ...])
+
+    The graph is calculated at cycle boundaries, which can be:
+    - PER_EVENT:        After each event.
+    - PER_N_EVENTS:     After every events_per_cycle events.
+    - PER_TIME_SLICE:   After the events in each time_slice_seconds of event
+                        timestamps. (Slices start at multiples of the slice length.)
+
+    Calculating after several events lets the graph merge their changes, which
+    is usually much quicker than calculating after each one.
+
+    If output_node_ids is set, replay() returns a list of ReplayEngine.CycleOutput,
+    holding the value of each output node after each cycle. The value is the
+    result of get_output(node), or the node itself if get_output is None. (Nodes
+    are live objects, so you will usually want to capture values.)
+
+    If checkpoint_cycles is set, checkpoint_callback(event_count) is called
+    every checkpoint_cycles cycles, with the number of events replayed so far.
+    This lets you save the state of the targets, so that an interrupted replay
+    can be resumed with replay(events, start_index=event_count).
+
+    If compile_graph is True, the graph is compiled (see GraphManager.compile)
+    before the replay, and recompiled whenever a cycle changes its shape. This
+    is quicker for graphs whose shape rarely changes.
+    """
+
+    # 'enum' for when the graph is calculated...
+    class CycleBoundary(object):
+        PER_EVENT = 1
+        PER_N_EVENTS = 2
+        PER_TIME_SLICE = 3
+
+    # An input event: a call of target.method(*args, **kwargs), at a timestamp (in
+    # seconds). kwargs is None if there are no keyword arguments...
+    InputEvent = collections.namedtuple(
+        "InputEvent", ("timestamp", "target", "method", "args", "kwargs"), defaults=(None,))
+
+    # The outputs after a cycle of a replay. timestamp is the timestamp of the last
+    # event in the cycle, event_count is the number of events replayed so far, and
+    # values is a dictionary of node ID -> value...
+    CycleOutput = collections.namedtuple("CycleOutput", ("timestamp", "event_count", "values"))
+
+    def __init__(self, graph_manager, targets):
+        """
+        The 'constructor'. targets is a dictionary of name -> object, used to find
+        the object each event is applied to.
+        """
+        self.graph_manager = graph_manager
+        self.targets = targets
+
+        # When the graph is calculated...
+        self.cycle_boundary = ReplayEngine.CycleBoundary.PER_EVENT
+        self.events_per_cycle = 1
+        self.time_slice_seconds = 1.0
+
+        # The nodes whose values are captured after each cycle...
+        self.output_node_ids = []
+        self.get_output = None
+
+        # Checkpoints...
+        self.checkpoint_cycles = None
+        self.checkpoint_callback = None
+
+        # Whether we run the graph from a compiled plan...
+        self.compile_graph = False
+
+        # The number of cycles calculated by the most recent replay...
+        self.cycle_count = 0
+
+        # A cache of (id of target object, method name) -> bound method. (The bound
+        # methods keep their targets alive, so the IDs are not reused.) Keying by
+        # the object means that targets can be replaced between replays...
+        self._methods = {}
+
+    def replay(self, events, start_index=0):
+        """
+        Replays the events passed in (from the start_index'th event), and returns
+        a list of the CycleOutput for each cycle if output_node_ids is set.
+        """
+        self.cycle_count = 0
+        outputs = []
+        if self.compile_graph:
+            self.graph_manager.compile()
+
+        # We find the events in each cycle, apply them and calculate...
+        event_count = start_index
+        cycle_event_count = 0
+        cycle_slice = None
+        cycle_timestamp = None
+        for event in self._get_events(events, start_index):
+            if cycle_event_count > 0 and self._is_new_cycle(event, cycle_event_count, cycle_slice):
+                self._calculate(cycle_timestamp, event_count, outputs)
+                cycle_event_count = 0
+
+            if cycle_event_count == 0 and self.cycle_boundary == ReplayEngine.CycleBoundary.PER_TIME_SLICE:
+                cycle_slice = math.floor(event.timestamp / self.time_slice_seconds)
+            self._apply(event)
+            event_count += 1
+            cycle_event_count += 1
+            cycle_timestamp = event.timestamp
+
+        if cycle_event_count > 0:
+            self._calculate(cycle_timestamp, event_count, outputs)
+        return outputs
+
+    @staticmethod
+    def _get_events(events, start_index):
+        """
+        Returns an iterator over the events from the start index.
+        """
+        events = iter(events)
+        for _ in range(start_index):
+            next(events, None)
+        return events
+
+    def _is_new_cycle(self, event, cycle_event_count, cycle_slice):
+        """
+        Returns True if the event passed in starts a new calculation cycle.
+        """
+        if self.cycle_boundary == ReplayEngine.CycleBoundary.PER_EVENT:
+            return True
+        if self.cycle_boundary == ReplayEngine.CycleBoundary.PER_N_EVENTS:
+            return cycle_event_count >= self.events_per_cycle
+        return math.floor(event.timestamp / self.time_slice_seconds) != cycle_slice
+
+    def _apply(self, event):
+        """
+        Applies an event to its target.
+        """
+        target = self.targets[event.target]
+        key = (id(target), event.method)
+        method = self._methods.get(key)
+        if method is None:
+            method = getattr(target, event.method)
+            self._methods[key] = method
+        if event.kwargs:
+            method(*event.args, **event.kwargs)
+        else:
+            method(*event.args)
+
+    def _calculate(self, timestamp, event_count, outputs):
+        """
+        Calculates the graph at the end of a cycle, and captures its outputs.
+        """
+        graph_manager = self.graph_manager
+        if self.compile_graph and not graph_manager.is_compiled():
+            graph_manager.compile()
+        graph_manager.calculate()
+        self.cycle_count += 1
+
+        if self.output_node_ids:
+            values = {}
+            for node_id in self.output_node_ids:
+                node = graph_manager.find_node(node_id)
+                if node is not None and self.get_output is not None:
+                    node = self.get_output(node)
+                values[node_id] = node
+            outputs.append(ReplayEngine.CycleOutput(timestamp, event_count, values))
+
+        if self.checkpoint_cycles is not None and self.cycle_count % self.checkpoint_cycles == 0:
+            self.checkpoint_callback(event_count)
+
@@ -0,0 +1,145 @@
+import multiprocessing
+from .graph_exception import GraphException
+from .graph_node import GraphNode
+
+
+# The runner whose scenarios are being run. The worker processes are forked
+# from the process which calls run(), so they inherit this (and the graph)
+# without it being pickled...
+_active_runner = None
+
+
+def _run_scenario_in_worker(index):
+    """
+    Runs one scenario in a worker process.
+    """
+    return _active_runner._run_scenario(index)
+
+
+class ScenarioRunner(object):
+    """
+    Runs a batch of 'what-if' scenarios against a graph, across a pool of
+    worker processes, and returns the values of output nodes in each scenario.
+
+    A scenario is a function which is passed a graph, and which perturbs it.
+    For example:
+        def eur_christmas_eve_holiday(graph_manager):
+            eur_node = graph_manager.get_node("CurrencyHolidaysNode.EUR")
+            graph_manager.override(eur_node, holidays=eur_node.holidays | {date(2026, 12, 24)})
+
+        runner = ScenarioRunner(graph_manager)
+        results = runner.run([eur_christmas_eve_holiday, ...], [price_node.node_id], lambda node: node.price)
+
+    The graph is calculated after each scenario has been applied, and the results
+    are a list (one item per scenario) of dictionaries of output node ID -> value,
+    where the value is get_output(node) for each output node. get_output must be
+    supplied, and must return a value rather than a node. (A node would be no use
+    to the caller: a forked scenario's nodes are disposed when the scenario ends,
+    and pickling a node from a worker process would copy the worker's whole graph.)
+
+    How the scenarios are isolated from each other depends on the isolation type:
+    - FORKED_GRAPH: Each scenario is passed a fork of the graph (see GraphManager.fork),
+                    and can override nodes in it. Each worker process runs many
+                    scenarios. This is the quickest way to run scenarios.
+    - PROCESS:      Each scenario is passed the graph itself, in a new worker process.
+                    This lets scenarios change data outside the graph, such as a
+                    holiday database in the environment, and calculate the whole
+                    graph as usual. Starting a process per scenario is slower.
+
+    The worker processes are forked from the calling process, so they share the
+    graph (copy-on-write) rather than building it. The scenario functions and
+    output function are not pickled, so they can be lambdas or closures, but the
+    output values are sent back to the calling process, so they must be picklable.
+
+    If processes cannot be forked on this platform, or process_count is 1, the
+    FORKED_GRAPH scenarios are run one after another in the calling process.
+    PROCESS scenarios always need worker processes.
+    """
+
+    # 'enum' for how scenarios are isolated from each other...
+    class IsolationType(object):
+        FORKED_GRAPH = 1
+        PROCESS = 2
+
+    def __init__(self, graph_manager, process_count=None, isolation_type=IsolationType.FORKED_GRAPH):
+        """
+        The 'constructor'. The process count defaults to the number of CPUs.
+        """
+        self.graph_manager = graph_manager
+        self.process_count = process_count if process_count is not None else multiprocessing.cpu_count()
+        self.isolation_type = isolation_type
+
+        # The batch being run...
+        self._scenarios = []
+        self._output_node_ids = []
+        self._get_output = None
+
+    def run(self, scenarios, output_node_ids, get_output):
+        """
+        Runs the scenarios passed in, and returns a list of dictionaries of
+        output node ID -> value, one for each scenario. The value is the result
+        of get_output(node), which must not be a node.
+        """
+        global _active_runner
+        if get_output is None:
+            raise GraphException("ScenarioRunner.run() needs a get_output function to find the value of each output node")
+
+        # We make sure that the base graph is up to date...
+        self.graph_manager.calculate()
+
+        self._scenarios = list(scenarios)
+        self._output_node_ids = list(output_node_ids)
+        self._get_output = get_output
+        try:
+            is_process_isolation = self.isolation_type == ScenarioRunner.IsolationType.PROCESS
+            can_fork = "fork" in multiprocessing.get_all_start_methods()
+            if not can_fork:
+                if is_process_isolation:
+                    raise GraphException("Scenarios isolated by process need processes to be forked")
+                return [self._run_scenario(x) for x in range(len(self._scenarios))]
+            if self.process_count <= 1 and not is_process_isolation:
+                return [self._run_scenario(x) for x in range(len(self._scenarios))]
+
+            # We run the scenarios in worker processes. With process isolation each
+            # process runs one scenario. Otherwise each process runs a few chunks
+            # of scenarios, so that the work is spread evenly...
+            if is_process_isolation:
+                max_tasks_per_child = 1
+                chunk_size = 1
+            else:
+                max_tasks_per_child = None
+                chunk_size = max(1, len(self._scenarios) // (self.process_count * 4))
+            _active_runner = self
+            context = multiprocessing.get_context("fork")
+            with context.Pool(self.process_count, maxtasksperchild=max_tasks_per_child) as pool:
+                return pool.map(_run_scenario_in_worker, range(len(self._scenarios)), chunk_size)
+        finally:
+            _active_runner = None
+            self._scenarios = []
+            self._output_node_ids = []
+            self._get_output = None
+
+    def _run_scenario(self, index):
+        """
+        Applies and calculates the scenario at the index passed in, and returns
+        its outputs.
+        """
+        scenario = self._scenarios[index]
+        if self.isolation_type == ScenarioRunner.IsolationType.PROCESS:
+            graph_manager = self.graph_manager
+        else:
+            graph_manager = self.graph_manager.fork()
+
+        try:
+            scenario(graph_manager)
+            graph_manager.calculate()
+            results = {}
+            for node_id in self._output_node_ids:
+                value = self._get_output(graph_manager.get_node(node_id))
+                if isinstance(value, GraphNode):
+                    raise GraphException("The output of " + node_id + " is a node. get_output must return a value")
+                results[node_id] = value
+            return results
+        finally:
+            if graph_manager is not self.graph_manager:
+                graph_manager.dispose()
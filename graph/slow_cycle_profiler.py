@@ -0,0 +1,174 @@
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from .node_factory import NodeFactory
+
+
+class SlowCycleProfiler(object):
+    """
+    Writes a report to a file for each calculation which takes longer than a
+    threshold, so that rare latency spikes can be investigated after the event.
+
+    To use it, set the graph-manager's slow_cycle_profiler property:
+        graph_manager.slow_cycle_profiler = SlowCycleProfiler(0.5, "/tmp/slow_cycles")
+
+    Each report shows the nodes which took longest to calculate, and the time
+    spent in each node type. You can also capture one of:
+    - ProfilerType.CPROFILE:    A cProfile of the whole calculation.
+    - ProfilerType.TRACEMALLOC: The peak memory used by the calculation, and the
+                                largest allocations still alive at its end.
+
+    Only slow calculations are written out, but the profiling itself has to
+    run for every calculation, as we do not know in advance which ones will be
+    slow. Node-level timing costs one timer call per calculated node. cProfile
+    and tracemalloc add their usual overhead to every calculation, so by default
+    neither is used.
+
+    Each call to GraphManager.calculate() is measured separately. (If a cycle
+    has a time-budget, each call processes part of the cycle.)
+
+    If tracemalloc was not already tracing, the profiler starts it, and stops
+    it again in close(). The graph-manager closes its profiler when it is
+    replaced (for example, by setting slow_cycle_profiler to None) or when the
+    graph-manager is disposed.
+    """
+
+    # 'enum' for the profiler to run...
+    class ProfilerType(object):
+        NONE = 1
+        CPROFILE = 2
+        TRACEMALLOC = 3
+
+    def __init__(self, threshold_seconds, output_directory,
+                 profiler_type=ProfilerType.NONE, max_report_count=100, max_node_count=50):
+        """
+        The 'constructor'.
+        """
+        # Calculations which take longer than this are reported...
+        self.threshold_seconds = threshold_seconds
+
+        # The directory we write reports to...
+        self.output_directory = output_directory
+
+        # The profiler to run...
+        self.profiler_type = profiler_type
+
+        # We stop writing reports after this many, so that a persistently
+        # slow graph does not fill the disk...
+        self.max_report_count = max_report_count
+
+        # The number of nodes (and profile entries) shown in each report...
+        self.max_node_count = max_node_count
+
+        # The paths of the reports we have written...
+        self.report_paths = []
+
+        # A list of (node, seconds) for nodes calculated in the current calculation...
+        self._node_calculation_times = []
+
+        self._start_time = 0.0
+        self._profile = None
+
+        # True if we started tracemalloc, so we should stop it when we are closed...
+        self._is_tracing_started = False
+        if profiler_type == SlowCycleProfiler.ProfilerType.TRACEMALLOC and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._is_tracing_started = True
+
+    def close(self):
+        """
+        Stops tracemalloc, if this profiler started it.
+        """
+        if self._is_tracing_started:
+            self._is_tracing_started = False
+            tracemalloc.stop()
+
+    def calculation_started(self):
+        """
+        Called by the graph-manager when calculate() is called.
+        """
+        del self._node_calculation_times[:]
+        if self.profiler_type == SlowCycleProfiler.ProfilerType.CPROFILE:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self.profiler_type == SlowCycleProfiler.ProfilerType.TRACEMALLOC:
+            tracemalloc.reset_peak()
+        self._start_time = time.perf_counter()
+
+    def node_calculated(self, node, seconds):
+        """
+        Called by the graph-manager when a node has calculated.
+        """
+        self._node_calculation_times.append((node, seconds))
+
+    def calculation_ended(self, cycle_number):
+        """
+        Called by the graph-manager when calculate() has finished. We write a
+        report if the calculation was slow.
+        """
+        seconds = time.perf_counter() - self._start_time
+        if self._profile is not None:
+            self._profile.disable()
+
+        if seconds > self.threshold_seconds and len(self.report_paths) < self.max_report_count:
+            self._write_report(cycle_number, seconds)
+
+        self._profile = None
+        del self._node_calculation_times[:]
+
+    def _write_report(self, cycle_number, seconds):
+        """
+        Writes a report for a slow calculation.
+        """
+        lines = [
+            "Slow calculation in cycle " + str(cycle_number),
+            "Time: " + time.strftime("%Y-%m-%d %H:%M:%S"),
+            "Duration (ms): %.3f" % (seconds * 1000.0),
+            "Nodes calculated: " + str(len(self._node_calculation_times)),
+            ""]
+
+        # The slowest nodes...
+        lines.append("Slowest nodes (ms):")
+        node_calculation_times = sorted(self._node_calculation_times, key=lambda x: x[1], reverse=True)
+        for node, node_seconds in node_calculation_times[:self.max_node_count]:
+            lines.append("  %10.3f  %s" % (node_seconds * 1000.0, node.node_id))
+        lines.append("")
+
+        # The time in each node type...
+        type_times = {}
+        for node, node_seconds in self._node_calculation_times:
+            node_type = NodeFactory.get_node_type_name(type(node))
+            type_count, type_seconds = type_times.get(node_type, (0, 0.0))
+            type_times[node_type] = (type_count + 1, type_seconds + node_seconds)
+        lines.append("Time by node type (ms, count):")
+        for node_type, (type_count, type_seconds) in sorted(type_times.items(), key=lambda x: x[1][1], reverse=True):
+            lines.append("  %10.3f  %8d  %s" % (type_seconds * 1000.0, type_count, node_type))
+        lines.append("")
+
+        # The profiler output...
+        if self._profile is not None:
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=stream)
+            stats.sort_stats("cumulative").print_stats(self.max_node_count)
+            lines.append("cProfile:")
+            lines.append(stream.getvalue())
+        elif self.profiler_type == SlowCycleProfiler.ProfilerType.TRACEMALLOC:
+            current_size, peak_size = tracemalloc.get_traced_memory()
+            lines.append("Traced memory (bytes): current=%d, peak=%d" % (current_size, peak_size))
+            lines.append("Largest allocations:")
+            snapshot = tracemalloc.take_snapshot()
+            for statistic in snapshot.statistics("lineno")[:self.max_node_count]:
+                lines.append("  " + str(statistic))
+            lines.append("")
+
+        if not os.path.isdir(self.output_directory):
+            os.makedirs(self.output_directory)
+        file_name = "slow_cycle_%s_%d_%d_%d.txt" % (
+            time.strftime("%Y%m%d_%H%M%S"), os.getpid(), cycle_number, len(self.report_paths))
+        path = os.path.join(self.output_directory, file_name)
+        with open(path, "w") as report_file:
+            report_file.write("\n".join(lines))
+        self.report_paths.append(path)
@@ -0,0 +1,186 @@
+from .graph_exception import GraphException
+
+
+class TopologicalOrder(object):
+    """
+    Keeps the nodes of a graph in a topological order (each node ranked after
+    all its parents) as links are added, and rejects links which would create
+    a cycle.
+
+    To use it, set the graph-manager's topological_order before nodes are added:
+        graph_manager.topological_order = TopologicalOrder()
+
+    GraphNode.add_parent() then checks each new link before making it. If the
+    link would create a cycle, a GraphException is raised, naming the nodes in
+    the cycle, and the link is not made. Without this, a cycle created by a
+    faulty set_dependencies() would only show up later, as a RecursionError or
+    a hang when the graph is invalidated.
+
+    Nodes are ranked when they are first linked. A new parent is ranked before
+    all the other nodes, and a new child after them. (Parents are usually created
+    by their children's set_dependencies(), so most new links are to new parents.)
+    Links between nodes which are already ranked are handled incrementally, using
+    the algorithm of Pearce and Kelly ("A Dynamic Topological Sort Algorithm for
+    Directed Acyclic Graphs"). If the parent is already ranked before the child,
+    this costs one comparison. Otherwise only the nodes ranked between the two are
+    searched and reordered. Removing links or nodes never breaks the order.
+
+    The ranks can also be used to sort nodes so that parents come before their
+    children (see get_rank and sort).
+    """
+    def __init__(self):
+        """
+        The 'constructor'.
+        """
+        # A dictionary of node -> rank. Ranks are unique, but not contiguous...
+        self._ranks = {}
+
+        # The lowest and highest ranks given to nodes so far...
+        self._lowest_rank = 0
+        self._highest_rank = 0
+
+    def _rank_first(self, node):
+        """
+        Ranks a node before all the other nodes.
+        """
+        self._lowest_rank -= 1
+        self._ranks[node] = self._lowest_rank
+
+    def _rank_last(self, node):
+        """
+        Ranks a node after all the other nodes.
+        """
+        self._highest_rank += 1
+        self._ranks[node] = self._highest_rank
+
+    def remove_node(self, node):
+        """
+        Removes a node.
+        """
+        self._ranks.pop(node, None)
+
+    def clear(self):
+        """
+        Removes all the nodes.
+        """
+        self._ranks.clear()
+        self._lowest_rank = 0
+        self._highest_rank = 0
+
+    def get_rank(self, node):
+        """
+        Returns the rank of the node passed in. A node's rank is higher than the
+        ranks of all its ancestors.
+        """
+        if node not in self._ranks:
+            self._rank_last(node)
+        return self._ranks[node]
+
+    def sort(self, nodes):
+        """
+        Returns a list of the nodes passed in, sorted by rank.
+        """
+        return sorted(nodes, key=self.get_rank)
+
+    def add_link(self, parent, child):
+        """
+        Updates the order for a new link from the parent to the child passed in,
+        before the link is made. Raises a GraphException if the link would
+        create a cycle.
+        """
+        if parent is child:
+            raise GraphException("GraphNode " + parent.node_id + " cannot be its own parent")
+
+        # A node which has not been ranked has no links, so a new parent can be
+        # ranked first and a new child last...
+        ranks = self._ranks
+        lower_bound = ranks.get(child)
+        upper_bound = ranks.get(parent)
+        if upper_bound is None:
+            if lower_bound is None:
+                self._rank_last(child)
+            self._rank_first(parent)
+            return
+        if lower_bound is None:
+            self._rank_last(child)
+            return
+        if upper_bound < lower_bound:
+            # The order is still valid...
+            return
+
+        # We find the nodes in the affected region which the child leads to, and
+        # which lead to the parent. They are moved so that the parent's ancestors
+        # come before the child's descendants...
+        descendants = self._find_descendants(child, parent, upper_bound)
+        ancestors = self._find_ancestors(parent, lower_bound)
+        self._reorder(ancestors, descendants)
+
+    def _find_descendants(self, child, parent, upper_bound):
+        """
+        Returns the child and its descendants ranked below the upper bound.
+        Raises a GraphException if the parent is one of its descendants.
+        """
+        ranks = self._ranks
+        previous_nodes = {child: None}
+        nodes_to_visit = [child]
+        while nodes_to_visit:
+            node = nodes_to_visit.pop()
+            for child_node in node._child_nodes:
+                if child_node is parent:
+                    self._raise_cycle_exception(parent, node, previous_nodes)
+                if child_node in previous_nodes:
+                    continue
+                rank = ranks.get(child_node)
+                if rank is not None and rank < upper_bound:
+                    previous_nodes[child_node] = node
+                    nodes_to_visit.append(child_node)
+        return list(previous_nodes)
+
+    def _find_ancestors(self, parent, lower_bound):
+        """
+        Returns the parent and its ancestors ranked above the lower bound.
+        """
+        ranks = self._ranks
+        ancestors = {parent}
+        nodes_to_visit = [parent]
+        while nodes_to_visit:
+            node = nodes_to_visit.pop()
+            for parent_node in node._parent_nodes:
+                if parent_node in ancestors:
+                    continue
+                rank = ranks.get(parent_node)
+                if rank is not None and rank > lower_bound:
+                    ancestors.add(parent_node)
+                    nodes_to_visit.append(parent_node)
+        return list(ancestors)
+
+    def _reorder(self, ancestors, descendants):
+        """
+        Gives the ranks held by the nodes passed in to the ancestors and then the
+        descendants, keeping the existing order within each group.
+        """
+        ranks = self._ranks
+        ancestors.sort(key=ranks.__getitem__)
+        descendants.sort(key=ranks.__getitem__)
+        nodes = ancestors + descendants
+        new_ranks = sorted(ranks[x] for x in nodes)
+        for node, rank in zip(nodes, new_ranks):
+            ranks[node] = rank
+
+    @staticmethod
+    def _raise_cycle_exception(parent, last_node, previous_nodes):
+        """
+        Raises a GraphException describing the cycle that linking the parent
+        to the child would create. last_node is the parent's parent in the
+        cycle, and previous_nodes holds the path back from it to the child.
+        """
+        path = []
+        node = last_node
+        while node is not None:
+            path.append(node)
+            node = previous_nodes[node]
+        path.reverse()
+        node_ids = [parent.node_id] + [x.node_id for x in path] + [parent.node_id]
+        raise GraphException(
+            "Adding GraphNode " + parent.node_id + " as a parent of " + path[0].node_id +
+            " would create a cycle: " + " -> ".join(node_ids))
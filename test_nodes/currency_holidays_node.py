@@ -28,11 +28,21 @@ class CurrencyHolidaysNode(GraphNode):
         """
         self.holiday_db.remove_observer(self)
 
-    def updated(self, observable):
+    def updated(self, observable, currency=None, holiday=None):
         """
-        Called when the holidays DB has been updated.
+        Called when the holidays DB has been updated, with the currency and the
+        holiday which have changed, if they are known.
         """
-        self.needs_calculation()
+        if currency is not None and currency != self.currency:
+            # The holidays for another currency have changed...
+            return
+
+        # If one holiday has changed, only the children which depend on that
+        # date need to be recalculated...
+        if holiday is not None:
+            self.set_changed_keys([holiday])
+        else:
+            self.needs_calculation()
 
     def calculate(self):
         """
@@ -43,7 +53,11 @@ class CurrencyHolidaysNode(GraphNode):
 
         # We check if the data has changed...
         if (self.holidays != currency_holidays.holidays) or (self.quality != currency_holidays.quality):
-            # The data has changed, so we store it and calculate our children...
+            # The data has changed, so we store it and calculate our children.
+            # We tell our children which holidays have been added and removed...
+            self.set_delta(
+                added=currency_holidays.holidays - self.holidays,
+                removed=self.holidays - currency_holidays.holidays)
             self.holidays = currency_holidays.holidays.copy()
             self.quality.set_from(currency_holidays.quality)
             return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
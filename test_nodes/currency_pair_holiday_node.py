@@ -34,8 +34,8 @@ class CurrencyPairHolidayNode(GraphNode):
         """
         self._currency1_holidays_node = None
         self._currency2_holidays_node = None
-        self._currency1_holidays_node = self.add_parent_node(CurrencyHolidaysNode, self.currency1)
-        self._currency2_holidays_node = self.add_parent_node(CurrencyHolidaysNode, self.currency2)
+        self._currency1_holidays_node = self.add_parent_node(CurrencyHolidaysNode, self.currency1, keys=[self.date])
+        self._currency2_holidays_node = self.add_parent_node(CurrencyHolidaysNode, self.currency2, keys=[self.date])
 
     def calculate(self):
         """
@@ -44,13 +44,21 @@ class CurrencyPairHolidayNode(GraphNode):
         # It is a holiday for the pair we are managing if it is a holiday for
         # either of the currencies in the pair.
 
-        # We find the current status, and update children only if it has
-        # changed from what we held before...
-        new_is_holiday = False
-        if self.date in self._currency1_holidays_node.holidays:
-            new_is_holiday = True
-        if self.date in self._currency2_holidays_node.holidays:
-            new_is_holiday = True
+        # If neither currency's holidays have changed for our date, the status
+        # is unchanged (though the quality may have changed). Otherwise we find
+        # the current status. We update children only if it has changed from
+        # what we held before...
+        delta1 = self.get_parent_delta(self._currency1_holidays_node)
+        delta2 = self.get_parent_delta(self._currency2_holidays_node)
+        if delta1 is not None and delta2 is not None \
+                and not delta1.affects(self.date) and not delta2.affects(self.date):
+            new_is_holiday = self.is_holiday
+        else:
+            new_is_holiday = False
+            if self.date in self._currency1_holidays_node.holidays:
+                new_is_holiday = True
+            if self.date in self._currency2_holidays_node.holidays:
+                new_is_holiday = True
 
         if (self.is_holiday != new_is_holiday) or (self.quality != self._previous_quality):
             # The data has changed...
@@ -39,7 +39,7 @@ class HolidayDatabase(Observable):
         """
         currency_holidays = self.get_currency_holidays(currency)
         currency_holidays.holidays.add(holiday)
-        self.update_observers()
+        self.update_observers(currency, holiday)
 
     def remove_holiday(self, currency, holiday):
         """
@@ -47,7 +47,7 @@ class HolidayDatabase(Observable):
         """
         currency_holidays = self.get_currency_holidays(currency)
         currency_holidays.holidays.remove(holiday)
-        self.update_observers()
+        self.update_observers(currency, holiday)
 
     def set_quality(self, currency, quality, description):
         """
@@ -56,7 +56,7 @@ class HolidayDatabase(Observable):
         currency_holidays = self.get_currency_holidays(currency)
         currency_holidays.quality.clear_to_good()
         currency_holidays.quality.merge(quality, description)
-        self.update_observers()
+        self.update_observers(currency)
 
     def clear(self):
         """
@@ -30,9 +30,10 @@ class Observable(object):
         """
         self.observers.clear()
 
-    def update_observers(self):
+    def update_observers(self, *args):
         """
-        Calls the updated() method in observers.
+        Calls the updated() method in observers, with any details of the
+        update passed in.
         """
         for observer in self.observers:
-            observer.updated(self)
+            observer.updated(self, *args)
@@ -0,0 +1,71 @@
+from graph import *
+from .currency_pair_holiday_node import CurrencyPairHolidayNode
+
+
+class PriceForHolidayNode(GraphNode):
+    """
+    Provides the price for a date which is a holiday.
+    """
+    # The number of nodes of this type which have been constructed...
+    construction_count = 0
+
+    def __init__(self, *args, **kwargs):
+        """
+        The constructor.
+        """
+        super().__init__(*args, **kwargs)
+        PriceForHolidayNode.construction_count += 1
+        self.price = 123.0
+
+
+class PriceForNonHolidayNode(GraphNode):
+    """
+    Provides the price for a date which is not a holiday.
+    """
+    # The number of nodes of this type which have been constructed...
+    construction_count = 0
+
+    def __init__(self, *args, **kwargs):
+        """
+        The constructor.
+        """
+        super().__init__(*args, **kwargs)
+        PriceForNonHolidayNode.construction_count += 1
+        self.price = 456.0
+
+
+class PriceNode(GraphNode):
+    """
+    A 'price' for a currency-pair on a date. It uses a different parent node
+    for the price depending on whether the date is a holiday, so the shape of
+    the graph changes when holidays are added or removed.
+    """
+    def __init__(self, currency_pair, date, *args, **kwargs):
+        """
+        The constructor.
+        """
+        super().__init__(*args, **kwargs)
+        self.currency_pair = currency_pair
+        self.date = date
+        self.holiday_node = None
+        self.price_node = None
+        self.price = 0.0
+
+    def set_dependencies(self):
+        """
+        Adds parent nodes. We rebuild them when the holiday changes.
+        """
+        self.holiday_node = self.add_parent_node(
+            CurrencyPairHolidayNode, self.currency_pair, self.date,
+            auto_rebuild=True)
+        if self.holiday_node.is_holiday is True:
+            self.price_node = self.add_parent_node(PriceForHolidayNode)
+        else:
+            self.price_node = self.add_parent_node(PriceForNonHolidayNode)
+
+    def calculate(self):
+        """
+        Called when the node needs calculating.
+        """
+        self.price = self.price_node.price
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
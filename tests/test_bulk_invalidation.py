@@ -0,0 +1,170 @@
+from graph import *
+import pytest
+import random
+
+
+class SourceNode(GraphNode):
+    """
+    A node whose value can be set from outside the graph.
+    """
+    def __init__(self, index, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.new_value = 0
+        self.value = 0
+
+    def set_value(self, value):
+        self.new_value = value
+        self.needs_calculation()
+
+    def calculate(self):
+        self.value = self.new_value
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class PairNode(GraphNode):
+    """
+    Adds up the values of two neighbouring source nodes.
+    """
+    def __init__(self, index, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = index
+        self.source_nodes = []
+        self.value = 0
+
+    def set_dependencies(self):
+        self.source_nodes = [
+            self.add_parent_node(SourceNode, self.index),
+            self.add_parent_node(SourceNode, self.index + 1)]
+
+    def calculate(self):
+        self.value = sum(x.value for x in self.source_nodes)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class TotalNode(GraphNode):
+    """
+    Adds up the values of all the pair nodes.
+    """
+    def __init__(self, pair_count, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pair_count = pair_count
+        self.pair_nodes = []
+        self.value = 0
+
+    def set_dependencies(self):
+        self.pair_nodes = [self.add_parent_node(PairNode, x) for x in range(self.pair_count)]
+
+    def calculate(self):
+        self.value = sum(x.value for x in self.pair_nodes)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class ChainNode(GraphNode):
+    """
+    Depends on the previous node in a long chain of nodes.
+    """
+    def __init__(self, index, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = index
+        self.parent_node = None
+        self.value = 0
+
+    def set_dependencies(self):
+        if self.index > 0:
+            self.parent_node = self.add_parent_node(ChainNode, self.index - 1)
+
+    def calculate(self):
+        self.value = self.parent_node.value + 1 if self.parent_node is not None else 0
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def _calculate_with_changes(bulk_invalidation_threshold, edge_store=None):
+    """
+    Changes some of the sources of a graph, and returns the total and the
+    number of pair nodes which calculated.
+    """
+    graph_manager = GraphManager()
+    graph_manager.bulk_invalidation_threshold = bulk_invalidation_threshold
+    graph_manager.edge_store = edge_store
+    graph_manager.use_has_calculated_flags = True
+    total_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, TotalNode, 200)
+    graph_manager.calculate()
+
+    source_nodes = [graph_manager.get_node("SourceNode." + str(x)) for x in range(0, 150, 3)]
+    for source_node in source_nodes:
+        source_node.set_value(1)
+    graph_manager.calculate()
+    calculated_count = sum(1 for x in total_node.pair_nodes if x.has_calculated)
+    return total_node.value, calculated_count
+
+
+def test_bulk_invalidation():
+    """
+    Tests that bulk invalidation calculates the same nodes as recursive
+    invalidation.
+    """
+    assert _calculate_with_changes(None) == (99, 99)
+    assert _calculate_with_changes(10) == (99, 99)
+    assert _calculate_with_changes(10, EdgeStore()) == (99, 99)
+
+
+def test_bulk_invalidation_deep_graph():
+    """
+    Tests that bulk invalidation can invalidate graphs which are deeper
+    than the recursion limit.
+    """
+    # We build the chain a section at a time...
+    graph_manager = GraphManager()
+    for index in range(0, 5001, 100):
+        chain_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, ChainNode, index)
+        graph_manager.calculate()
+    assert chain_node.value == 5000
+
+    graph_manager.get_node("ChainNode.0").needs_calculation()
+    graph_manager.bulk_invalidation_threshold = 1
+    graph_manager.calculate()
+    assert chain_node.value == 5000
+
+
+class LinkedNode(GraphNode):
+    """
+    A node which is linked to other nodes by the test.
+    """
+    def __init__(self, index, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = index
+
+
+def test_descendants_with_numpy():
+    """
+    Tests that the edge store finds the same descendants with numpy as
+    without it.
+    """
+    pytest.importorskip("numpy")
+    random.seed(1234)
+    graph_manager = GraphManager()
+    graph_manager.edge_store = EdgeStore()
+    nodes = [NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, LinkedNode, x) for x in range(300)]
+    for _ in range(1000):
+        parent_index, child_index = sorted(random.sample(range(len(nodes)), 2))
+        nodes[child_index].add_parent(nodes[parent_index])
+
+    # Removing links and nodes leaves gaps in the store's arrays...
+    for _ in range(200):
+        node = random.choice(nodes)
+        if node._parent_nodes:
+            node.remove_parent(random.choice(list(node._parent_nodes)))
+    for node in nodes[100:120]:
+        graph_manager.release_node(node)
+    graph_manager.calculate()
+    nodes = [x for x in nodes if graph_manager.find_node(x.node_id) is x]
+
+    edge_store = graph_manager.edge_store
+    descendant_count = 0
+    for _ in range(20):
+        indices = [x._edge_index for x in random.sample(nodes, random.randint(1, 5))]
+        expected_indices = sorted(edge_store._get_descendant_indices(indices))
+        assert sorted(edge_store._get_descendant_indices_numpy(indices)) == expected_indices
+        descendant_count += len(expected_indices) - len(indices)
+    assert descendant_count > 0
+    assert edge_store._get_descendant_indices_numpy([]) == []
@@ -0,0 +1,158 @@
+from graph import *
+import time
+
+
+class SourceNode(GraphNode):
+    """
+    A node whose value can be set from outside the graph. The new
+    value is picked up when the node calculates.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.new_value = 0
+        self.value = 0
+
+    def set_value(self, value):
+        self.new_value = value
+        self.needs_calculation()
+
+    def calculate(self):
+        self.value = self.new_value
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class SlowNode(GraphNode):
+    """
+    A node which takes a while to calculate, and which copies the
+    value from the source.
+    """
+    def __init__(self, index, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = index
+        self.source_node = None
+        self.value = 0
+
+    def set_dependencies(self):
+        self.source_node = self.add_parent_node(SourceNode)
+
+    def calculate(self):
+        time.sleep(0.002)
+        self.value = self.source_node.value
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def test_calculation_budget():
+    """
+    Tests that a calculation cycle stops when its budget is spent, and
+    is resumed by the next call to calculate().
+    """
+    graph_manager = GraphManager()
+    slow_nodes = [
+        NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, SlowNode, i)
+        for i in range(10)]
+    assert graph_manager.calculate() == 0
+    source_node = slow_nodes[0].source_node
+
+    # We update the source, and calculate with a budget that is
+    # only enough for a few nodes...
+    source_node.set_value(1)
+    pending_node_count = graph_manager.calculate(budget_seconds=0.005)
+    assert 0 < pending_node_count < 10
+    assert graph_manager.get_pending_node_count() == pending_node_count
+    updated_nodes = [node for node in slow_nodes if node.value == 1]
+    assert len(updated_nodes) == 10 - pending_node_count
+
+    # Changes made while a cycle is pending are processed after it
+    # has completed...
+    source_node.set_value(2)
+    while pending_node_count > 0:
+        previous_pending_node_count = pending_node_count
+        pending_node_count = graph_manager.calculate(budget_seconds=0.0)
+        assert pending_node_count < previous_pending_node_count
+    assert all(node.value == 1 for node in slow_nodes)
+
+    # The next cycle picks up the new value...
+    assert graph_manager.calculate() == 0
+    assert all(node.value == 2 for node in slow_nodes)
+    assert graph_manager.get_pending_node_count() == 0
+
+
+class FailingNode(GraphNode):
+    """
+    Copies the value from the source, or raises an exception if
+    is_failing is set.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.source_node = None
+        self.is_failing = False
+        self.value = 0
+
+    def set_dependencies(self):
+        self.source_node = self.add_parent_node(SourceNode)
+
+    def calculate(self):
+        if self.is_failing:
+            raise ValueError("Calculation failed")
+        self.value = self.source_node.value
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class TotalNode(GraphNode):
+    """
+    Adds up the values of a slow node and a failing node.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slow_node = None
+        self.failing_node = None
+        self.total = 0
+
+    def set_dependencies(self):
+        self.slow_node = self.add_parent_node(SlowNode, 0)
+        self.failing_node = self.add_parent_node(FailingNode)
+
+    def calculate(self):
+        self.total = self.slow_node.value + self.failing_node.value
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def test_calculation_error():
+    """
+    Tests that a cycle in which a node raises an exception is abandoned,
+    and that the next cycle calculates the nodes which did not calculate.
+    """
+    for is_compiled in (False, True):
+        graph_manager = GraphManager()
+        total_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, TotalNode)
+        graph_manager.calculate()
+        if is_compiled:
+            graph_manager.compile()
+        failing_node = total_node.failing_node
+
+        # The failing node raises, so the total is not calculated...
+        failing_node.is_failing = True
+        failing_node.source_node.set_value(3)
+        try:
+            graph_manager.calculate()
+            assert False
+        except ValueError:
+            pass
+        assert total_node.total == 0
+        assert graph_manager.get_pending_node_count() == 0
+
+        # The graph can be compiled and forked between cycles...
+        graph_manager.fork().dispose()
+        graph_manager.compile()
+
+        # The next cycle calculates the failing node and its descendants...
+        failing_node.is_failing = False
+        assert graph_manager.calculate() == 0
+        assert failing_node.value == 3
+        assert total_node.slow_node.value == 3
+        assert total_node.total == 6
+
+        # And later cycles carry on as usual...
+        failing_node.source_node.set_value(4)
+        graph_manager.calculate()
+        assert total_node.total == 8
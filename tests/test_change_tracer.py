@@ -0,0 +1,117 @@
+from graph import *
+from test_nodes import *
+from datetime import date
+import collections
+
+
+class RootNode(GraphNode):
+    """
+    Depends on a currency-pair holiday node.
+    """
+    def __init__(self, currency_pair, date, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.currency_pair = currency_pair
+        self.date = date
+        self.pair_holiday_node = None
+
+    def set_dependencies(self):
+        self.pair_holiday_node = self.add_parent_node(CurrencyPairHolidayNode, self.currency_pair, self.date)
+
+
+# A node as seen by the tracer, for tests which trace events directly...
+TracedNode = collections.namedtuple("TracedNode", ("node_id",))
+
+
+def _trace_node(tracer, node_id, parent_ids=(), is_changed=False):
+    """
+    Traces the events for a node which was invalidated by the parents passed
+    in, and which calculated its children.
+    """
+    if is_changed:
+        tracer.node_changed(TracedNode(node_id))
+    for parent_id in parent_ids:
+        tracer.node_invalidated(TracedNode(node_id), TracedNode(parent_id))
+    tracer.node_calculated(TracedNode(node_id), GraphNode.CalculateChildrenType.CALCULATE_CHILDREN)
+
+
+def test_change_tracer():
+    """
+    Tests that the tracer explains why nodes calculated, and finds
+    calculations which did not change anything.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    graph_manager.tracer = ChangeTracer()
+
+    root_node_1 = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE,
+        RootNode, "EUR/USD", date(2015, 7, 4))
+    root_node_2 = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE,
+        RootNode, "USD/JPY", date(2015, 7, 4))
+    graph_manager.environment.holiday_db.add_holiday("JPY", date(2015, 7, 4))
+    graph_manager.calculate()
+
+    # We add a USD holiday, which changes one of the pair nodes...
+    graph_manager.tracer.clear()
+    graph_manager.environment.holiday_db.add_holiday("USD", date(2015, 7, 4))
+    graph_manager.calculate()
+
+    usd_node_id = "CurrencyHolidaysNode.USD"
+    pair_node_id = root_node_1.pair_holiday_node.node_id
+    assert graph_manager.tracer.explain(root_node_1.node_id) == [
+        [usd_node_id, pair_node_id, root_node_1.node_id]]
+
+    # The other pair node was invalidated and calculated, but nothing changed,
+    # as the date was already a JPY holiday...
+    assert graph_manager.tracer.explain(root_node_2.node_id) == []
+    assert graph_manager.tracer.get_unchanged_calculations() == {
+        root_node_2.pair_holiday_node.node_id: 1}
+
+    # The CHANGED events are for the nodes observing the holiday database...
+    events = graph_manager.tracer.get_events()
+    changed_node_ids = set(x.node_id for x in events if x.event_type == ChangeTracer.EventType.CHANGED)
+    assert changed_node_ids == {usd_node_id}
+
+    # The ring buffer is bounded...
+    graph_manager.tracer = ChangeTracer(capacity=5)
+    graph_manager.environment.holiday_db.remove_holiday("USD", date(2015, 7, 4))
+    graph_manager.calculate()
+    assert len(graph_manager.tracer.get_events()) == 5
+
+
+def test_change_tracer_large_graphs():
+    """
+    Tests explaining calculations in deep graphs, and in graphs with many
+    diamonds, which have an exponential number of paths.
+    """
+    # A chain deeper than the recursion limit...
+    tracer = ChangeTracer()
+    _trace_node(tracer, "chain.0", is_changed=True)
+    for index in range(1, 5000):
+        _trace_node(tracer, "chain.%d" % index, ["chain.%d" % (index - 1)])
+    paths = tracer.explain("chain.4999")
+    assert len(paths) == 1 and len(paths[0]) == 5000
+
+    # A ladder of diamonds. Each level has two nodes, each depending on both
+    # nodes of the level below...
+    tracer = ChangeTracer()
+    _trace_node(tracer, "root", is_changed=True)
+    for level in range(50):
+        parent_ids = ["ladder.%d.0" % (level - 1), "ladder.%d.1" % (level - 1)] if level > 0 else ["root"]
+        for side in (0, 1):
+            _trace_node(tracer, "ladder.%d.%d" % (level, side), parent_ids)
+    paths = tracer.explain("ladder.49.0", max_paths=3)
+    assert len(paths) == 3
+    assert all(x[0] == "root" and x[-1] == "ladder.49.0" and len(x) == 51 for x in paths)
+
+    # If the bottom of the ladder was invalidated by a parent which did not
+    # change, there are no paths, however many routes there are through the ladder...
+    tracer.clear()
+    _trace_node(tracer, "root", is_changed=True)
+    tracer.node_calculated(TracedNode("unchanged"), GraphNode.CalculateChildrenType.DO_NOT_CALCULATE_CHILDREN)
+    for level in range(50):
+        parent_ids = ["ladder.%d.0" % (level - 1), "ladder.%d.1" % (level - 1)] if level > 0 else ["unchanged"]
+        for side in (0, 1):
+            _trace_node(tracer, "ladder.%d.%d" % (level, side), parent_ids)
+    assert tracer.explain("ladder.49.0") == []
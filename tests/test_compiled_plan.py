@@ -0,0 +1,173 @@
+from graph import *
+from test_nodes import *
+from datetime import date
+
+
+class SourceNode(GraphNode):
+    """
+    A node whose value can be set from outside the graph.
+    """
+    def __init__(self, name, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.new_value = 0
+        self.value = 0
+
+    def set_value(self, value):
+        self.new_value = value
+        self.needs_calculation()
+
+    def calculate(self):
+        if self.new_value == self.value:
+            return GraphNode.CalculateChildrenType.DO_NOT_CALCULATE_CHILDREN
+        self.value = self.new_value
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class SumNode(GraphNode):
+    """
+    Adds up the values of the source nodes it is given.
+    """
+    def __init__(self, name, source_names, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.source_names = source_names
+        self.source_nodes = []
+        self.value = 0
+
+    @staticmethod
+    def make_node_id(name, source_names):
+        return name
+
+    def set_dependencies(self):
+        self.source_nodes = [self.add_parent_node(SourceNode, x) for x in self.source_names]
+
+    def calculate(self):
+        self.value = sum(x.value for x in self.source_nodes)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class TotalNode(GraphNode):
+    """
+    Adds up the values of two sum nodes.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sum_nodes = []
+        self.value = 0
+
+    def set_dependencies(self):
+        self.sum_nodes = [
+            self.add_parent_node(SumNode, "AB", ("A", "B")),
+            self.add_parent_node(SumNode, "BC", ("B", "C"))]
+
+    def calculate(self):
+        self.value = sum(x.value for x in self.sum_nodes)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def test_compiled_plan():
+    """
+    Tests that a compiled graph calculates the same nodes, with the same
+    results, as the normal calculation.
+    """
+    graph_manager = GraphManager()
+    graph_manager.use_has_calculated_flags = True
+    total_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, TotalNode)
+    plan = graph_manager.compile()
+    assert graph_manager.is_compiled()
+    assert plan.get_node_count() == 6
+
+    # Each node comes after its parents...
+    for node in plan.nodes:
+        assert all(plan.positions[x] < plan.positions[node] for x in node._parent_nodes)
+
+    graph_manager.calculate()
+    ab_node, bc_node = total_node.sum_nodes
+    a_node, b_node = ab_node.source_nodes
+    c_node = bc_node.source_nodes[1]
+
+    # Changing A only calculates A, AB and the total...
+    a_node.set_value(1)
+    graph_manager.calculate()
+    assert total_node.value == 1
+    assert [x.has_calculated for x in (a_node, b_node, c_node, ab_node, bc_node, total_node)] == \
+        [True, False, False, True, False, True]
+
+    # Changing B feeds into both sums...
+    b_node.set_value(10)
+    graph_manager.calculate()
+    assert (ab_node.value, bc_node.value, total_node.value) == (11, 10, 21)
+
+    # A node which does not change does not calculate its children...
+    c_node.set_value(0)
+    graph_manager.calculate()
+    assert [x.has_calculated for x in (c_node, bc_node, total_node)] == [True, False, False]
+
+    # The plan is discarded when the graph changes shape...
+    assert graph_manager.is_compiled()
+    other_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE, SumNode, "AC", ("A", "C"))
+    assert not graph_manager.is_compiled()
+    c_node.set_value(100)
+    graph_manager.calculate()
+    assert (other_node.value, total_node.value) == (101, 121)
+
+
+def test_compiled_plan_shape_change():
+    """
+    Tests that if the graph changes shape while the plan is being run, the
+    rest of the cycle is calculated in the normal way.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    price_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE,
+        PriceNode, "EUR/USD", date(2015, 7, 4))
+    graph_manager.calculate()
+    assert price_node.price == 456.0
+
+    # The price node resets its dependencies when the holiday changes...
+    graph_manager.compile()
+    holiday_db = graph_manager.environment.holiday_db
+    holiday_db.add_holiday("USD", date(2015, 7, 4))
+    graph_manager.calculate()
+    assert price_node.price == 123.0
+    assert not graph_manager.is_compiled()
+
+    # We compile the new shape, and change back...
+    graph_manager.compile()
+    holiday_db.remove_holiday("USD", date(2015, 7, 4))
+    graph_manager.calculate()
+    assert price_node.price == 456.0
+
+
+def test_compiled_plan_budget():
+    """
+    Tests that a compiled plan can be run with a time-budget.
+    """
+    graph_manager = GraphManager()
+    total_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, TotalNode)
+    graph_manager.calculate()
+    graph_manager.compile()
+    b_node = total_node.sum_nodes[0].source_nodes[1]
+
+    # With no budget, we calculate one node per call...
+    b_node.set_value(5)
+    pending_node_counts = []
+    while True:
+        pending_node_count = graph_manager.calculate(budget_seconds=0.0)
+        pending_node_counts.append(pending_node_count)
+        if pending_node_count == 0:
+            break
+    assert pending_node_counts == [3, 2, 1, 0]
+    assert total_node.value == 10
+
+    # The plan cannot be compiled during a cycle...
+    b_node.set_value(6)
+    graph_manager.calculate(budget_seconds=0.0)
+    try:
+        graph_manager.compile()
+        assert False
+    except GraphException:
+        pass
+    graph_manager.calculate()
+    assert total_node.value == 12
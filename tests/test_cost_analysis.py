@@ -0,0 +1,63 @@
+from graph import *
+import time
+
+
+class WorkNode(GraphNode):
+    """
+    A node which takes a known time to calculate, and which depends on
+    the nodes named by its parent_names.
+    """
+    def __init__(self, name, duration, parent_names, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+        self.duration = duration
+        self.parent_names = parent_names
+
+    @staticmethod
+    def make_node_id(name, duration, parent_names):
+        return name
+
+    def set_dependencies(self):
+        for parent_name, parent_duration, parent_parent_names in self.parent_names:
+            self.add_parent_node(WorkNode, parent_name, parent_duration, parent_parent_names)
+
+    def calculate(self):
+        time.sleep(self.duration)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class SlowNode(WorkNode):
+    """
+    A different type of node, so that we can check the costs by type.
+    """
+    pass
+
+
+def test_cost_analysis():
+    """
+    Tests that we find the critical path through the graph, and the
+    most expensive node types.
+    """
+    graph_manager = GraphManager()
+    graph_manager.measure_calculation_times = True
+
+    # A -> C and B -> C, where A is much slower than B. D is independent...
+    a = ("A", 0.02, ())
+    b = ("B", 0.001, ())
+    c_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE, WorkNode, "C", 0.01, (a, b))
+    d_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE, SlowNode, "D", 0.015, ())
+    graph_manager.calculate()
+    assert graph_manager.get_calculation_time(d_node) >= 0.015
+
+    analysis = graph_manager.get_cost_analysis()
+    assert analysis.critical_path == ["WorkNode.A", "WorkNode.C"]
+    assert analysis.span >= 0.03
+    assert analysis.work >= 0.046
+    assert 1.0 < analysis.parallelism < 2.0
+
+    assert analysis.costs_by_type["SlowNode"] >= 0.015
+    assert analysis.costs_by_type["WorkNode"] >= 0.031
+    most_expensive_subtrees = analysis.get_most_expensive_subtrees()
+    assert [x[0] for x in most_expensive_subtrees] == ["WorkNode", "SlowNode"]
@@ -0,0 +1,118 @@
+from graph import *
+import pytest
+import random
+
+
+class RingNode(GraphNode):
+    """
+    Depends on the next node in a ring of nodes, which is a cycle.
+    """
+    def __init__(self, index, size, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = index
+        self.size = size
+
+    def set_dependencies(self):
+        self.add_parent_node(RingNode, (self.index + 1) % self.size, self.size)
+
+
+class SimpleNode(GraphNode):
+    """
+    A node which is linked to other nodes by the test.
+    """
+    def __init__(self, index, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = index
+
+
+def test_cycle_detection():
+    """
+    Tests that a cycle created by set_dependencies() is reported when the
+    link which closes it is added.
+    """
+    graph_manager = GraphManager()
+    graph_manager.topological_order = TopologicalOrder()
+    NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, RingNode, 0, 3)
+    with pytest.raises(GraphException) as exception_info:
+        graph_manager.calculate()
+    assert str(exception_info.value) == (
+        "Adding GraphNode RingNode.0_3 as a parent of RingNode.2_3 would create a cycle: "
+        "RingNode.0_3 -> RingNode.2_3 -> RingNode.1_3 -> RingNode.0_3")
+
+    # The link was not made...
+    ring_node_2 = graph_manager.get_node("RingNode.2_3")
+    assert len(ring_node_2._parent_nodes) == 0
+
+
+def test_topological_order():
+    """
+    Tests that the order is kept as random links are added, and that
+    links which would create cycles are rejected.
+    """
+    random.seed(1234)
+    graph_manager = GraphManager()
+    graph_manager.topological_order = TopologicalOrder()
+    nodes = [NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, SimpleNode, x) for x in range(50)]
+    order = graph_manager.topological_order
+
+    cycle_count = 0
+    for _ in range(500):
+        parent, child = random.sample(nodes, 2)
+        try:
+            child.add_parent(parent)
+        except GraphException:
+            cycle_count += 1
+    assert cycle_count > 0
+
+    for node in nodes:
+        for child in node._child_nodes:
+            assert order.get_rank(node) < order.get_rank(child)
+    sorted_nodes = order.sort(nodes)
+    positions = {node: position for position, node in enumerate(sorted_nodes)}
+    for node in nodes:
+        assert all(positions[x] < positions[node] for x in node._parent_nodes)
+    graph_manager.calculate()
+
+    # Nodes cannot be their own parents...
+    with pytest.raises(GraphException):
+        nodes[0].add_parent(nodes[0])
+
+
+class ChainNode(GraphNode):
+    """
+    Node i depends on node i-1.
+    """
+    def __init__(self, index, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = index
+
+    def set_dependencies(self):
+        if self.index > 0:
+            self.add_parent_node(ChainNode, self.index - 1)
+
+
+def test_topological_order_construction():
+    """
+    Tests that building a graph, where parents are created after their
+    children, does not need the order to be rearranged.
+    """
+    reorder_counts = []
+
+    class CountingTopologicalOrder(TopologicalOrder):
+        def _reorder(self, ancestors, descendants):
+            reorder_counts.append(len(ancestors) + len(descendants))
+            super()._reorder(ancestors, descendants)
+
+    graph_manager = GraphManager()
+    graph_manager.topological_order = CountingTopologicalOrder()
+    last_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, ChainNode, 999)
+    graph_manager.calculate()
+    assert reorder_counts == []
+
+    # New nodes which depend on existing nodes are ranked after them...
+    nodes = graph_manager.topological_order.sort(graph_manager._nodes.values())
+    assert [x.index for x in nodes] == list(range(1000))
+    new_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, SimpleNode, 0)
+    new_node.add_parent(last_node)
+    assert reorder_counts == []
+    assert graph_manager.topological_order.get_rank(new_node) > graph_manager.topological_order.get_rank(last_node)
@@ -0,0 +1,90 @@
+from graph import *
+from test_nodes import *
+from datetime import date
+
+
+class HolidayCountNode(GraphNode):
+    """
+    Counts the holidays for a currency, updating the count from the deltas
+    of the currency's holidays node where it can.
+    """
+    def __init__(self, currency, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.currency = currency
+        self.holidays_node = None
+        self.count = 0
+        self.full_calculation_count = 0
+
+    def set_dependencies(self):
+        self.holidays_node = self.add_parent_node(CurrencyHolidaysNode, self.currency)
+
+    def calculate(self):
+        delta = self.get_parent_delta(self.holidays_node)
+        if delta is not None:
+            self.count += len(delta.added) - len(delta.removed)
+        else:
+            self.full_calculation_count += 1
+            self.count = len(self.holidays_node.holidays)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def test_delta_propagation():
+    """
+    Tests that children can update themselves from the deltas of their parents.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    holiday_db = graph_manager.environment.holiday_db
+    holiday_db.add_holiday("USD", date(2015, 1, 1))
+    count_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, HolidayCountNode, "USD")
+    graph_manager.calculate()
+    assert (count_node.count, count_node.full_calculation_count) == (1, 1)
+
+    # Later changes are applied from the deltas...
+    holiday_db.add_holiday("USD", date(2015, 7, 4))
+    holiday_db.add_holiday("USD", date(2015, 12, 25))
+    graph_manager.calculate()
+    assert (count_node.count, count_node.full_calculation_count) == (3, 1)
+    holiday_db.remove_holiday("USD", date(2015, 1, 1))
+    graph_manager.calculate()
+    assert (count_node.count, count_node.full_calculation_count) == (2, 1)
+
+    # Explicitly recalculating the node sees no change in its parent...
+    count_node.needs_calculation()
+    graph_manager.calculate()
+    assert (count_node.count, count_node.full_calculation_count) == (2, 1)
+
+
+def test_delta_propagation_new_nodes():
+    """
+    Tests that nodes created in the same cycle as a change calculate from
+    the whole output of their parents.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    holiday_db = graph_manager.environment.holiday_db
+    eur_usd_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE, CurrencyPairHolidayNode, "EUR/USD", date(2015, 7, 4))
+    graph_manager.calculate()
+
+    # A EUR holiday on another date does not change the pair...
+    holiday_db.add_holiday("EUR", date(2015, 7, 4))
+    holiday_db.add_holiday("EUR", date(2015, 12, 25))
+    graph_manager.calculate()
+    assert eur_usd_node.is_holiday is True
+
+    # New pairs are created, as a USD holiday is added...
+    holiday_db.add_holiday("USD", date(2015, 12, 25))
+    usd_jpy_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE, CurrencyPairHolidayNode, "USD/JPY", date(2015, 12, 25))
+    eur_gbp_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE, CurrencyPairHolidayNode, "EUR/GBP", date(2015, 12, 25))
+    graph_manager.calculate()
+    assert usd_jpy_node.is_holiday is True
+    assert eur_gbp_node.is_holiday is True
+    assert eur_usd_node.is_holiday is True
+
+    holiday_db.remove_holiday("EUR", date(2015, 7, 4))
+    graph_manager.calculate()
+    assert eur_usd_node.is_holiday is False
+    assert eur_gbp_node.is_holiday is True
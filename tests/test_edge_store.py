@@ -0,0 +1,143 @@
+from graph import *
+from test_nodes import *
+from datetime import date
+import pytest
+import test_auto_rebuild
+import test_currency_pair_holiday_1
+import test_delta_propagation
+import test_forked_graph
+import test_graph_dispose
+import test_graph_queries
+import test_keyed_edges
+import test_late_parents
+import test_node_cleanup
+import test_parent_cache
+
+
+class FanInNode(GraphNode):
+    """
+    Depends on many other nodes.
+    """
+    def __init__(self, parent_count, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.parent_count = parent_count
+
+    def set_dependencies(self):
+        for index in range(self.parent_count):
+            self.add_parent_node(LeafNode, index)
+
+
+class LeafNode(GraphNode):
+    """
+    A node with no parents.
+    """
+    def __init__(self, index, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+
+def test_edge_store():
+    """
+    Tests that a graph whose links are held in an edge store calculates
+    and changes shape in the same way as one using sets.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    graph_manager.edge_store = EdgeStore()
+    price_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE,
+        PriceNode, "EUR/USD", date(2015, 7, 4))
+    graph_manager.calculate()
+    holiday_node = price_node.holiday_node
+    non_holiday_price_node = price_node.price_node
+    assert isinstance(price_node._parent_nodes, NodeLinks)
+    assert set(price_node._parent_nodes) == {holiday_node, non_holiday_price_node}
+    assert price_node in holiday_node._child_nodes
+    assert len(holiday_node._parent_nodes) == 2
+    assert holiday_node.is_holiday is False
+    assert price_node.price == 456.0
+
+    # Adding a holiday swaps the price node for the holiday one...
+    holiday_db = graph_manager.environment.holiday_db
+    holiday_db.add_holiday("USD", date(2015, 7, 4))
+    graph_manager.calculate()
+    assert holiday_node.is_holiday is True
+    holiday_price_node = price_node.price_node
+    assert isinstance(holiday_price_node, PriceForHolidayNode)
+    assert price_node._parent_nodes.copy() == {holiday_node, holiday_price_node}
+    assert price_node._parent_nodes.difference([holiday_node]) == {holiday_price_node}
+    assert price_node._parent_nodes == {holiday_node, holiday_price_node}
+    assert price_node._parent_nodes - {holiday_price_node} == {holiday_node}
+    assert type(price_node._parent_nodes | {price_node}) is set
+    assert non_holiday_price_node._child_nodes == set()
+
+    # When it is removed, the holiday price node is collected. Its index is
+    # reused for the next node...
+    holiday_db.remove_holiday("USD", date(2015, 7, 4))
+    graph_manager.calculate()
+    assert graph_manager.find_node(holiday_price_node.node_id) is None
+    assert holiday_price_node._parent_nodes == set() and holiday_price_node._child_nodes == set()
+    assert price_node._parent_nodes.copy() == {holiday_node, price_node.price_node}
+    assert price_node.price == 456.0
+    node_capacity = graph_manager.edge_store.get_node_capacity()
+    NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, LeafNode, 0)
+    assert graph_manager.edge_store.get_node_capacity() == node_capacity
+
+    graph_manager.dispose()
+    assert graph_manager.edge_store.get_node_capacity() == 0
+
+
+def test_edge_store_row_growth():
+    """
+    Tests that rows grow and are compacted as links are added and removed.
+    """
+    graph_manager = GraphManager()
+    graph_manager.edge_store = EdgeStore()
+    fan_in_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, FanInNode, 100)
+    graph_manager.calculate()
+    leaf_nodes = [graph_manager.get_node("LeafNode." + str(x)) for x in range(100)]
+    assert set(fan_in_node._parent_nodes) == set(leaf_nodes)
+    assert all(fan_in_node in x._child_nodes for x in leaf_nodes)
+
+    # We remove every other parent...
+    for leaf_node in leaf_nodes[::2]:
+        fan_in_node.remove_parent(leaf_node)
+    assert set(fan_in_node._parent_nodes) == set(leaf_nodes[1::2])
+    assert not leaf_nodes[0].has_children()
+
+    # And add some of them back again, which reuses the space...
+    for leaf_node in leaf_nodes[:10]:
+        fan_in_node.add_parent(leaf_node)
+    assert len(fan_in_node._parent_nodes) == 55
+    edges = graph_manager.edge_store.parents
+    assert edges._unused_count <= len(edges.indices) // 2
+
+    # The parents which were not added back are collected...
+    graph_manager.calculate()
+    assert graph_manager.get_node_count() == 56
+    assert set(fan_in_node._parent_nodes) == set(leaf_nodes[:10] + leaf_nodes[11::2])
+
+
+# Tests of links between nodes, which are run again with an EdgeStore...
+
+_LINK_TEST_MODULES = (
+    test_auto_rebuild, test_currency_pair_holiday_1, test_delta_propagation, test_forked_graph,
+    test_graph_dispose, test_graph_queries, test_keyed_edges, test_late_parents, test_node_cleanup,
+    test_parent_cache)
+
+
+@pytest.mark.parametrize("test_function", [
+    getattr(module, name) for module in _LINK_TEST_MODULES for name in sorted(vars(module)) if name.startswith("test_")],
+    ids=lambda x: x.__module__ + "." + x.__name__)
+def test_links_with_edge_store(test_function, monkeypatch):
+    """
+    Runs a test of links between nodes with the links held in an EdgeStore.
+    """
+    graph_manager_init = GraphManager.__init__
+
+    def __init__(self):
+        graph_manager_init(self)
+        if not isinstance(self, ForkedGraphManager):
+            self.edge_store = EdgeStore()
+
+    monkeypatch.setattr(GraphManager, "__init__", __init__)
+    test_function()
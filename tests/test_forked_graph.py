@@ -0,0 +1,67 @@
+from graph import *
+from test_nodes import *
+from datetime import date
+
+
+def test_forked_graph():
+    """
+    Tests that a scenario only clones and calculates the nodes affected
+    by an override, and leaves the base graph unchanged.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    christmas_eve = date(2026, 12, 24)
+    eur_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE, PriceNode, "EUR/USD", christmas_eve)
+    gbp_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE, PriceNode, "GBP/USD", christmas_eve)
+    graph_manager.use_has_calculated_flags = True
+    graph_manager.calculate()
+    assert graph_manager.get_node_count() == 8
+
+    # What if 24-Dec is a EUR holiday?
+    scenario = graph_manager.fork()
+    eur_holidays_node = graph_manager.get_node("CurrencyHolidaysNode.EUR")
+    scenario.override(eur_holidays_node, holidays=eur_holidays_node.holidays | {christmas_eve})
+    scenario.calculate()
+
+    # Only the EUR holidays and the nodes downstream of them are cloned, and
+    # the holiday price node is added...
+    assert scenario.get_node_count() == 4
+    assert scenario.get_node(eur_node.node_id).price == 123.0
+    assert scenario.get_node(gbp_node.node_id) is gbp_node
+    assert scenario.get_node("CurrencyHolidaysNode.USD") is graph_manager.get_node("CurrencyHolidaysNode.USD")
+    assert scenario.get_node(eur_node.node_id).has_calculated is True
+
+    # The base graph is unchanged...
+    assert eur_node.price == 456.0
+    assert eur_node.holiday_node.is_holiday is False
+    assert eur_holidays_node.holidays == set()
+    assert eur_holidays_node._child_nodes == {eur_node.holiday_node}
+    assert graph_manager.get_node("CurrencyHolidaysNode.USD")._child_nodes == \
+        {eur_node.holiday_node, gbp_node.holiday_node}
+
+    # Overriding an upstream node links it to the existing clones...
+    usd_holidays_node = graph_manager.get_node("CurrencyHolidaysNode.USD")
+    scenario.override(usd_holidays_node, holidays={christmas_eve})
+    scenario.calculate()
+    assert scenario.get_node_count() == 7
+    assert scenario.get_node(gbp_node.node_id).price == 123.0
+    forked_holiday_node = scenario.get_node(eur_node.node_id).holiday_node
+    assert forked_holiday_node in scenario.get_node("CurrencyHolidaysNode.USD")._child_nodes
+
+    # We can remove the holiday again...
+    scenario.override(eur_holidays_node, holidays=set())
+    scenario.override(usd_holidays_node, holidays=set())
+    scenario.calculate()
+    assert scenario.get_node(eur_node.node_id).price == 456.0
+    assert scenario.get_node(gbp_node.node_id).price == 456.0
+
+    # Disposing the scenario leaves the base graph intact...
+    scenario.dispose()
+    assert graph_manager.get_node_count() == 8
+    assert eur_holidays_node._child_nodes == {eur_node.holiday_node}
+    graph_manager.environment.holiday_db.add_holiday("EUR", christmas_eve)
+    graph_manager.calculate()
+    assert eur_node.price == 123.0
+    assert gbp_node.price == 456.0
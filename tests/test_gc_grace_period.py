@@ -0,0 +1,113 @@
+from graph import *
+from test_nodes import *
+from datetime import date
+
+
+def _reset_construction_counts():
+    """
+    Resets the counts of the price nodes constructed.
+    """
+    PriceForHolidayNode.construction_count = 0
+    PriceForNonHolidayNode.construction_count = 0
+
+
+def _get_construction_counts():
+    """
+    Returns the counts of the price nodes constructed.
+    """
+    return {"holiday": PriceForHolidayNode.construction_count,
+            "non-holiday": PriceForNonHolidayNode.construction_count}
+
+
+def _flip_holiday(graph_manager, price_node, flip_count):
+    """
+    Adds and removes a holiday, checking the price each time.
+    """
+    holiday_db = graph_manager.environment.holiday_db
+    for i in range(flip_count):
+        holiday_db.add_holiday("USD", date(2015, 7, 4))
+        graph_manager.calculate()
+        assert price_node.price == 123.0
+        holiday_db.remove_holiday("USD", date(2015, 7, 4))
+        graph_manager.calculate()
+        assert price_node.price == 456.0
+
+
+def test_gc_without_grace_period():
+    """
+    Without a grace period, the unused price node is rebuilt on each flip.
+    """
+    _reset_construction_counts()
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    price_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE,
+        PriceNode, "EUR/USD", date(2015, 7, 4))
+    graph_manager.calculate()
+
+    _flip_holiday(graph_manager, price_node, 3)
+    assert _get_construction_counts() == {"holiday": 3, "non-holiday": 4}
+
+
+def test_gc_grace_period():
+    """
+    With a grace period, unused nodes are revived rather than rebuilt,
+    and are disposed when the grace period expires.
+    """
+    _reset_construction_counts()
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    graph_manager.gc_grace_cycles = 3
+    price_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE,
+        PriceNode, "EUR/USD", date(2015, 7, 4))
+    graph_manager.calculate()
+
+    _flip_holiday(graph_manager, price_node, 3)
+    assert _get_construction_counts() == {"holiday": 1, "non-holiday": 1}
+    assert graph_manager.get_node_count() == 6
+
+    # We release the price node. Its subgraph is kept for the grace
+    # period of three further cycles, and then disposed...
+    graph_manager.release_node(price_node)
+    graph_manager.calculate()
+    for i in range(2):
+        graph_manager.calculate()
+        assert graph_manager.find_node(price_node.node_id) is price_node
+    graph_manager.calculate()
+    assert graph_manager.get_node_count() == 0
+
+
+def test_gc_pool_size():
+    """
+    Tests that the least recently used unreferenced nodes are disposed
+    when the pool is full.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    graph_manager.gc_grace_cycles = 1000
+    graph_manager.gc_pool_size = 2
+
+    # Each of these has its own pair node, and shares the EUR and USD nodes...
+    pair_nodes = [
+        NodeFactory.get_node(
+            graph_manager, GraphNode.GCType.NON_COLLECTABLE,
+            CurrencyPairHolidayNode, "EUR/USD", date(2015, 7, day))
+        for day in range(1, 5)]
+    graph_manager.calculate()
+    assert graph_manager.get_node_count() == 6
+
+    for pair_node in pair_nodes[:3]:
+        graph_manager.release_node(pair_node)
+        graph_manager.calculate()
+    assert graph_manager.get_node_count() == 5
+    assert graph_manager.find_node(pair_nodes[0].node_id) is None
+    assert graph_manager.find_node(pair_nodes[1].node_id) is pair_nodes[1]
+
+    # We revive a pooled node, which is returned with its state intact...
+    revived_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE,
+        CurrencyPairHolidayNode, "EUR/USD", date(2015, 7, 2))
+    assert revived_node is pair_nodes[1]
+    graph_manager.calculate()
+    assert graph_manager.get_node_count() == 5
@@ -0,0 +1,32 @@
+from graph import *
+
+
+class ChainNode(GraphNode):
+    """
+    Depends on the previous node in a long chain of nodes.
+    """
+    def __init__(self, index, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = index
+        self.parent_node = None
+        self.value = 0
+
+    def set_dependencies(self):
+        if self.index > 0:
+            self.parent_node = self.add_parent_node(ChainNode, self.index - 1)
+
+    def calculate(self):
+        self.value = self.parent_node.value + 1 if self.parent_node is not None else 0
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def test_deep_graph_construction():
+    """
+    Tests that a graph can be built when each generation of nodes creates
+    the next, for more generations than the recursion limit.
+    """
+    graph_manager = GraphManager()
+    chain_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, ChainNode, 5000)
+    graph_manager.calculate()
+    assert chain_node.value == 5000
+    assert graph_manager.get_node_count() == 5001
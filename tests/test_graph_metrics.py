@@ -0,0 +1,62 @@
+from graph import *
+from test_nodes import *
+from datetime import date
+import urllib.request
+
+
+def test_graph_metrics(tmp_path):
+    """
+    Tests that metrics are collected, and exported in the Prometheus format.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    graph_manager.metrics = GraphMetrics()
+    price_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE,
+        PriceNode, "EUR/USD", date(2015, 7, 4))
+    graph_manager.calculate()
+
+    metrics = graph_manager.metrics
+    assert metrics.node_counts == {
+        "PriceNode": 1, "PriceForNonHolidayNode": 1, "CurrencyPairHolidayNode": 1, "CurrencyHolidaysNode": 2}
+    assert metrics.set_dependencies_count == 5
+    assert metrics.cycle_count == 1
+    assert metrics.changed_node_count == 5
+
+    # The price node resets its dependencies when it first calculates, as it is
+    # triggered by its auto-rebuild parent...
+    assert metrics.reset_dependencies_count == 1
+
+    # We add a holiday, which adds the holiday price node, and then remove it...
+    holiday_db = graph_manager.environment.holiday_db
+    holiday_db.add_holiday("USD", date(2015, 7, 4))
+    graph_manager.calculate()
+    assert metrics.node_counts["PriceForHolidayNode"] == 1
+    assert metrics.reset_dependencies_count == 2
+    holiday_db.remove_holiday("USD", date(2015, 7, 4))
+    graph_manager.calculate()
+    assert metrics.node_counts["PriceForHolidayNode"] == 0
+    assert metrics.gc_collected_node_count == 2
+    assert metrics.cycle_count == 3
+
+    # We write the metrics to a file...
+    path = str(tmp_path / "graph.prom")
+    metrics.write_prometheus_file(path)
+    with open(path) as metrics_file:
+        text = metrics_file.read()
+    assert 'graph_nodes{node_type="CurrencyHolidaysNode"} 2' in text
+    assert "graph_cycles_total 3" in text
+    assert 'graph_cycle_seconds_bucket{le="+Inf"} 3' in text
+    assert "graph_reset_dependencies_total 3" in text
+
+    # And serve them over HTTP...
+    port = metrics.start_http_server(0)
+    try:
+        response = urllib.request.urlopen("http://127.0.0.1:%d/metrics" % port)
+        assert response.read().decode("utf-8") == metrics.get_prometheus_text()
+    finally:
+        metrics.stop_http_server()
+
+    graph_manager.release_node(price_node)
+    graph_manager.calculate()
+    assert sum(metrics.node_counts.values()) == 0
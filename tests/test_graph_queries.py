@@ -0,0 +1,88 @@
+from graph import *
+from test_nodes import *
+from datetime import date
+
+
+class PairCountNode(GraphNode):
+    """
+    Counts the holidays for a list of currency-pair / date nodes.
+    """
+    def __init__(self, name, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+        self.pairs = [("EUR/USD", date(2015, 12, 25)), ("USD/JPY", date(2015, 12, 25))]
+        self.count = 0
+
+    def set_dependencies(self):
+        for currency_pair, holiday_date in self.pairs:
+            self.add_parent_node(CurrencyPairHolidayNode, currency_pair, holiday_date)
+
+    def calculate(self):
+        self.count = sum(1 for x in self._parent_nodes if x.is_holiday)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def _create_graph():
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    count_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, PairCountNode, "count")
+    graph_manager.calculate()
+    return graph_manager, count_node
+
+
+def test_ancestors_and_descendants():
+    """
+    Tests finding the ancestors and descendants of nodes.
+    """
+    graph_manager, count_node = _create_graph()
+    usd_node = graph_manager.find_node("CurrencyHolidaysNode.USD")
+    eur_usd_node = graph_manager.find_node("CurrencyPairHolidayNode.EUR/USD_2015-12-25")
+    usd_jpy_node = graph_manager.find_node("CurrencyPairHolidayNode.USD/JPY_2015-12-25")
+
+    assert set(graph_manager.get_descendants(usd_node)) == {eur_usd_node, usd_jpy_node, count_node}
+    assert graph_manager.get_descendants(count_node) == []
+    assert set(x.node_id for x in graph_manager.get_ancestors(count_node, CurrencyHolidaysNode)) == {
+        "CurrencyHolidaysNode.EUR", "CurrencyHolidaysNode.USD", "CurrencyHolidaysNode.JPY"}
+
+    # The nearest nodes come first, and the limit stops the search...
+    ancestors = graph_manager.get_ancestors(count_node)
+    assert set(ancestors[:2]) == {eur_usd_node, usd_jpy_node} and len(ancestors) == 5
+    assert set(graph_manager.get_ancestors(count_node, limit=2)) == {eur_usd_node, usd_jpy_node}
+    assert len(graph_manager.get_ancestors(count_node, CurrencyHolidaysNode, limit=1)) == 1
+
+
+def test_paths():
+    """
+    Tests finding the paths between two nodes.
+    """
+    graph_manager, count_node = _create_graph()
+    usd_node = graph_manager.find_node("CurrencyHolidaysNode.USD")
+    eur_node = graph_manager.find_node("CurrencyHolidaysNode.EUR")
+    eur_usd_node = graph_manager.find_node("CurrencyPairHolidayNode.EUR/USD_2015-12-25")
+    usd_jpy_node = graph_manager.find_node("CurrencyPairHolidayNode.USD/JPY_2015-12-25")
+
+    paths = graph_manager.get_paths(usd_node, count_node)
+    assert sorted(paths, key=lambda x: x[1].node_id) == [
+        [usd_node, eur_usd_node, count_node], [usd_node, usd_jpy_node, count_node]]
+    assert graph_manager.get_paths(eur_node, count_node) == [[eur_node, eur_usd_node, count_node]]
+    assert len(graph_manager.get_paths(usd_node, count_node, limit=1)) == 1
+    assert graph_manager.get_paths(count_node, usd_node) == []
+    assert graph_manager.get_paths(eur_node, usd_jpy_node) == []
+
+
+def test_query_cache():
+    """
+    Tests that cached query results are updated when links change.
+    """
+    graph_manager, count_node = _create_graph()
+    jpy_node = graph_manager.find_node("CurrencyHolidaysNode.JPY")
+    assert count_node in graph_manager.get_descendants(jpy_node)
+    assert graph_manager.get_descendants(jpy_node) is not graph_manager.get_descendants(jpy_node)
+
+    # We stop depending on JPY. The JPY nodes are garbage-collected...
+    count_node.pairs = [("EUR/USD", date(2015, 12, 25))]
+    count_node.reset_dependencies()
+    assert graph_manager.get_descendants(jpy_node) == [graph_manager.find_node("CurrencyPairHolidayNode.USD/JPY_2015-12-25")]
+    graph_manager.calculate()
+    assert graph_manager.get_descendants(jpy_node) == []
+    assert len(graph_manager.get_ancestors(count_node)) == 3
@@ -0,0 +1,109 @@
+from graph import *
+from test_nodes import *
+from datetime import date
+
+
+def _make_graph():
+    """
+    Creates a graph with a holiday node for EUR/USD on 2015-07-04.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    holiday_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE, CurrencyPairHolidayNode, "EUR/USD", date(2015, 7, 4))
+    graph_manager.calculate()
+    return graph_manager, holiday_node
+
+
+def test_input_journal(tmp_path):
+    """
+    Tests recovering a graph from a snapshot and the tail of the journal.
+    """
+    path = str(tmp_path / "inputs.journal")
+    graph_manager, holiday_node = _make_graph()
+    holiday_db = graph_manager.environment.holiday_db
+
+    # We add a USD holiday, snapshot the database, then remove
+    # it and add a EUR holiday...
+    journal = InputJournal(path)
+    recorder = journal.get_recorder("holiday_db", holiday_db)
+    recorder.add_holiday("USD", date(2015, 7, 4))
+    journal.write_snapshot({"USD": {date(2015, 7, 4)}})
+    recorder.remove_holiday("USD", date(2015, 7, 4))
+    recorder.add_holiday("EUR", date(2015, 7, 4))
+    journal.record_needs_calculation(holiday_node)
+    journal.close()
+    assert journal.get_event_count() == 4
+    assert len(InputJournal.read_events(path)) == 4
+
+    # A 'restarted' graph restores the snapshot and replays the three events after it...
+    def restore_state(state):
+        for currency, holidays in state.items():
+            for holiday in holidays:
+                new_holiday_db.add_holiday(currency, holiday)
+
+    new_graph_manager, new_holiday_node = _make_graph()
+    new_holiday_db = new_graph_manager.environment.holiday_db
+    events_replayed = InputJournal.recover(
+        path, new_graph_manager, {"holiday_db": new_holiday_db}, restore_state)
+    assert events_replayed == 3
+    assert new_holiday_node.is_holiday is True
+    assert new_holiday_db.get_currency_holidays("USD").holidays == set()
+    assert new_holiday_db.get_currency_holidays("EUR").holidays == {date(2015, 7, 4)}
+
+    # Reopening the journal appends to it...
+    journal = InputJournal(path, sync=False)
+    assert journal.get_event_count() == 4
+    journal.record("holiday_db", "remove_holiday", ("EUR", date(2015, 7, 4)))
+    journal.flush()
+    assert journal.get_event_count() == 5
+    journal.close()
+    assert len(InputJournal.read_events(path)) == 5
+
+
+def test_input_journal_torn_write(tmp_path):
+    """
+    Tests that a partly-written event at the end of the journal is ignored.
+    """
+    path = str(tmp_path / "inputs.journal")
+    journal = InputJournal(path, sync=False)
+    journal.record("holiday_db", "add_holiday", ("USD", date(2015, 7, 4)))
+    journal.record("holiday_db", "add_holiday", ("EUR", date(2015, 7, 4)))
+    journal.close()
+
+    with open(path, "r+b") as journal_file:
+        journal_file.truncate(journal_file.seek(0, 2) - 3)
+    events = InputJournal.read_events(path)
+    assert len(events) == 1
+    assert events[0].args == ("USD", date(2015, 7, 4))
+
+    # Reopening the journal removes the partly-written event, so new events
+    # follow the complete ones...
+    journal = InputJournal(path, sync=False)
+    assert journal.get_event_count() == 1
+    journal.record("holiday_db", "add_holiday", ("GBP", date(2015, 12, 25)))
+    journal.close()
+    events = InputJournal.read_events(path)
+    assert [x.args[0] for x in events] == ["USD", "GBP"]
+
+
+def test_input_journal_keyword_arguments(tmp_path):
+    """
+    Tests that calls with keyword arguments are recorded and replayed.
+    """
+    path = str(tmp_path / "inputs.journal")
+    graph_manager, holiday_node = _make_graph()
+    journal = InputJournal(path, sync=False)
+    recorder = journal.get_recorder("holiday_db", graph_manager.environment.holiday_db)
+    recorder.add_holiday("USD", holiday=date(2015, 7, 4))
+    recorder.add_holiday(currency="EUR", holiday=date(2015, 7, 4))
+    journal.close()
+    events = InputJournal.read_events(path)
+    assert events[0].args == ("USD",) and events[0].kwargs == {"holiday": date(2015, 7, 4)}
+    assert events[1].args == () and events[1].kwargs == {"currency": "EUR", "holiday": date(2015, 7, 4)}
+
+    new_graph_manager, new_holiday_node = _make_graph()
+    new_holiday_db = new_graph_manager.environment.holiday_db
+    assert InputJournal.recover(path, new_graph_manager, {"holiday_db": new_holiday_db}) == 2
+    assert new_holiday_node.is_holiday is True
+    assert new_holiday_db.get_currency_holidays("EUR").holidays == {date(2015, 7, 4)}
@@ -0,0 +1,155 @@
+from graph import *
+
+
+class MultiplierNode(GraphNode):
+    """
+    A multiplier applied to all the values of a source node.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.multiplier = 1
+
+    def set_multiplier(self, multiplier):
+        self.multiplier = multiplier
+        self.needs_calculation()
+
+    def calculate(self):
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class SourceNode(GraphNode):
+    """
+    Holds a value for each key, which can be set from outside the graph.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.multiplier_node = None
+        self.inputs = {x: x for x in range(10)}
+        self.values = {}
+
+    def set_dependencies(self):
+        self.multiplier_node = self.add_parent_node(MultiplierNode)
+
+    def set_value(self, key, value):
+        self.inputs[key] = value
+        self.set_changed_keys([key])
+
+    def calculate(self):
+        self.values = {key: value * self.multiplier_node.multiplier for key, value in self.inputs.items()}
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class KeyNode(GraphNode):
+    """
+    Depends on the value for one key of the source node.
+    """
+    def __init__(self, key, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.key = key
+        self.source_node = None
+        self.value = None
+
+    def set_dependencies(self):
+        self.source_node = self.add_parent_node(SourceNode, keys=[self.key])
+
+    def calculate(self):
+        self.value = self.source_node.values[self.key]
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class TotalNode(GraphNode):
+    """
+    Depends on all the values of the source node.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.source_node = None
+        self.key_nodes = []
+        self.value = None
+
+    def set_dependencies(self):
+        self.source_node = self.add_parent_node(SourceNode)
+        self.key_nodes = [self.add_parent_node(KeyNode, x) for x in range(10)]
+
+    def calculate(self):
+        self.value = sum(self.source_node.values.values())
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def _test_keyed_edges(bulk_invalidation_threshold=None, edge_store=None, compile_graph=False):
+    """
+    Changes the graph, and checks which key nodes are recalculated.
+    """
+    graph_manager = GraphManager()
+    graph_manager.bulk_invalidation_threshold = bulk_invalidation_threshold
+    graph_manager.edge_store = edge_store
+    graph_manager.use_has_calculated_flags = True
+    total_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, TotalNode)
+    graph_manager.calculate()
+    if compile_graph:
+        graph_manager.compile()
+    source_node = total_node.source_node
+    multiplier_node = source_node.multiplier_node
+    key_nodes = total_node.key_nodes
+
+    def get_calculated_keys():
+        return [x.key for x in key_nodes if x.has_calculated]
+
+    # Only the key nodes for the changed keys are recalculated...
+    source_node.set_value(3, 30)
+    source_node.set_value(5, 50)
+    graph_manager.calculate()
+    assert get_calculated_keys() == [3, 5]
+    assert total_node.has_calculated is True
+    assert total_node.value == 45 - 8 + 80
+    assert [x.value for x in key_nodes] == [0, 1, 2, 30, 4, 50, 6, 7, 8, 9]
+
+    # Marking the source as changed without keys recalculates all the key nodes...
+    source_node.set_value(3, 3)
+    source_node.needs_calculation()
+    graph_manager.calculate()
+    assert get_calculated_keys() == list(range(10))
+
+    # If a parent of the source changes as well, any of its values may have changed...
+    source_node.set_value(5, 5)
+    multiplier_node.set_multiplier(2)
+    graph_manager.calculate()
+    assert get_calculated_keys() == list(range(10))
+    assert [x.value for x in key_nodes] == [x * 2 for x in range(10)]
+    assert total_node.value == 90
+    assert graph_manager.is_compiled() is compile_graph
+
+
+def test_keyed_edges():
+    """
+    Tests that keyed changes only invalidate the children linked with
+    those keys, when invalidating nodes in all the ways the graph can.
+    """
+    _test_keyed_edges()
+    _test_keyed_edges(bulk_invalidation_threshold=1)
+    _test_keyed_edges(bulk_invalidation_threshold=1, edge_store=EdgeStore())
+    _test_keyed_edges(compile_graph=True)
+
+
+def test_keyed_edges_relinking():
+    """
+    Tests linking a child to the same parent with different keys.
+    """
+    graph_manager = GraphManager()
+    source_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, SourceNode)
+    key_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, KeyNode, 1)
+    graph_manager.calculate()
+    assert source_node.get_changed_child_nodes() is None
+
+    key_node.add_parent(source_node, keys=[2])
+    source_node.set_changed_keys([2])
+    assert source_node.get_changed_child_nodes() == {key_node}
+
+    # Linking without keys makes the child depend on all the keys...
+    key_node.add_parent(source_node)
+    source_node.set_changed_keys([3])
+    assert source_node.get_changed_child_nodes() == {key_node}
+
+    key_node.remove_parent(source_node)
+    assert source_node.get_changed_child_nodes() == set()
+    graph_manager.calculate()
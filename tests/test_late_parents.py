@@ -0,0 +1,314 @@
+from graph import *
+import random
+
+
+class SourceNode(GraphNode):
+    """
+    A node whose value can be set from outside the graph.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.new_value = 0
+        self.value = 0
+
+    def set_value(self, value):
+        self.new_value = value
+        self.needs_calculation()
+
+    def calculate(self):
+        self.value = self.new_value
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class ChainNode(GraphNode):
+    """
+    One link in a chain of nodes which copy the value from the source.
+    The last link in a long chain calculates late in the cycle.
+    """
+    def __init__(self, length, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.length = length
+        self.parent_node = None
+        self.value = 0
+
+    def set_dependencies(self):
+        if self.length == 1:
+            self.parent_node = self.add_parent_node(SourceNode)
+        else:
+            self.parent_node = self.add_parent_node(ChainNode, self.length - 1)
+
+    def calculate(self):
+        self.value = self.parent_node.value
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class OffsetNode(GraphNode):
+    """
+    A node created on demand, which only works out its value when it
+    calculates.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.source_node = None
+        self.value = 0
+
+    def set_dependencies(self):
+        self.source_node = self.add_parent_node(SourceNode)
+
+    def calculate(self):
+        self.value = self.source_node.value + 1000
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class SwitchNode(GraphNode):
+    """
+    Chooses a parent depending on the value of the source.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.source_node = None
+        self.value_node = None
+        self.value = 0
+
+    def set_dependencies(self):
+        self.source_node = self.add_parent_node(SourceNode, auto_rebuild=True)
+        if self.source_node.value == 1:
+            self.value_node = self.add_parent_node(ChainNode, 5)
+        elif self.source_node.value == 2:
+            self.value_node = self.add_parent_node(OffsetNode)
+        else:
+            self.value_node = self.source_node
+
+    def calculate(self):
+        self.value = self.value_node.value
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class ResultNode(GraphNode):
+    """
+    Depends on the switch node.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.switch_node = None
+        self.value = 0
+
+    def set_dependencies(self):
+        self.switch_node = self.add_parent_node(SwitchNode)
+
+    def calculate(self):
+        self.value = self.switch_node.value
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def test_late_parents_are_handled_in_the_same_cycle():
+    """
+    Tests that when a node switches to parents which calculate later in
+    the cycle, or which are created during the cycle, one calculate() call
+    brings the graph to a consistent state.
+    """
+    graph_manager = GraphManager()
+    chain_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, ChainNode, 5)
+    result_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, ResultNode)
+    graph_manager.calculate()
+    source_node = result_node.switch_node.source_node
+    assert result_node.value == 0
+
+    # The switch node now depends on the end of the chain, which is
+    # calculated after the switch node itself...
+    source_node.set_value(1)
+    graph_manager.calculate()
+    assert chain_node.value == 1
+    assert result_node.switch_node.value == 1
+    assert result_node.value == 1
+
+    # The switch node now depends on a node which does not exist yet...
+    source_node.set_value(2)
+    graph_manager.calculate()
+    assert result_node.switch_node.value == 1002
+    assert result_node.value == 1002
+    assert graph_manager.get_pending_node_count() == 0
+
+
+class FollowerNode(GraphNode):
+    """
+    One link in a chain of nodes which copy the value from the switch node.
+    """
+    def __init__(self, length, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.length = length
+        self.parent_node = None
+        self.value = 0
+
+    def set_dependencies(self):
+        if self.length == 1:
+            self.parent_node = self.add_parent_node(SwitchNode)
+        else:
+            self.parent_node = self.add_parent_node(FollowerNode, self.length - 1)
+
+    def calculate(self):
+        self.value = self.parent_node.value
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class DiamondNode(GraphNode):
+    """
+    Depends on the switch node through two paths of different lengths.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.follower_node = None
+        self.result_node = None
+        self.value = 0
+        self.invalid_counts = []
+
+    def set_dependencies(self):
+        self.follower_node = self.add_parent_node(FollowerNode, 3)
+        self.result_node = self.add_parent_node(ResultNode)
+
+    def calculate(self):
+        self.invalid_counts.append(self._invalid_count)
+        self.value = self.follower_node.value + self.result_node.value
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class TopNode(GraphNode):
+    """
+    Depends on the diamond node.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.diamond_node = None
+        self.value = 0
+
+    def set_dependencies(self):
+        self.diamond_node = self.add_parent_node(DiamondNode)
+
+    def calculate(self):
+        self.value = self.diamond_node.value
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class InputNode(GraphNode):
+    """
+    A named node whose value can be set from outside the graph.
+    """
+    def __init__(self, name, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+        self.new_value = 0
+        self.value = 0
+
+    def set_value(self, value):
+        self.new_value = value
+        self.needs_calculation()
+
+    def calculate(self):
+        self.value = self.new_value
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class RandomNode(GraphNode):
+    """
+    Depends on up to three random lower-numbered nodes, chosen again whenever
+    its selector changes.
+    """
+    def __init__(self, index, seed, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = index
+        self.seed = seed
+        self.value_nodes = []
+        self.value = 0
+
+    def set_dependencies(self):
+        selector_node = self.add_parent_node(InputNode, "selector" + str(self.index % 3), auto_rebuild=True)
+        self.value_nodes = [self.add_parent_node(InputNode, "value")]
+        for index in get_random_parent_indices(self.seed, self.index, selector_node.value):
+            self.value_nodes.append(self.add_parent_node(RandomNode, index, self.seed))
+
+    def calculate(self):
+        self.value = self.index + sum(x.value for x in self.value_nodes)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def get_random_parent_indices(seed, index, selector):
+    """
+    Returns the indices of the parents of a RandomNode.
+    """
+    generator = random.Random("%d-%d-%d" % (seed, index, selector))
+    return [generator.randrange(index) for _ in range(generator.randint(0, 3)) if index > 0]
+
+
+def get_expected_value(seed, index, inputs):
+    """
+    Works out the value of a RandomNode without the graph.
+    """
+    parent_indices = get_random_parent_indices(seed, index, inputs["selector" + str(index % 3)])
+    return index + inputs["value"] + sum(get_expected_value(seed, x, inputs) for x in parent_indices)
+
+
+def test_late_parents_of_waiting_nodes():
+    """
+    Tests that nodes which are waiting to calculate when a late parent
+    invalidates them again are not calculated until their parents have been.
+    (The order in which nodes become ready depends on the order of sets of
+    nodes, so we try several graphs.)
+    """
+    for _ in range(20):
+        graph_manager = GraphManager()
+        NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, ChainNode, 5)
+        top_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, TopNode)
+        graph_manager.calculate()
+        diamond_node = top_node.diamond_node
+        source_node = diamond_node.result_node.switch_node.source_node
+
+        source_node.set_value(1)
+        graph_manager.calculate()
+        assert set(diamond_node.invalid_counts) == {0}
+        assert top_node.value == 2
+        assert graph_manager.get_pending_node_count() == 0
+
+
+def test_late_parents_reset_dependencies_once():
+    """
+    Tests that a node which is recalculated for a late parent does not reset
+    its dependencies again for the parent which caused the first reset.
+    """
+    reset_counts = []
+
+    class CountingSwitchNode(SwitchNode):
+        def reset_dependencies(self):
+            reset_counts.append(self.source_node.value)
+            super().reset_dependencies()
+
+    graph_manager = GraphManager()
+    NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, ChainNode, 5)
+    switch_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, CountingSwitchNode)
+    graph_manager.calculate()
+    switch_node.source_node.set_value(1)
+    del reset_counts[:]
+    graph_manager.calculate()
+    assert switch_node.value == 1
+    assert reset_counts == [1]
+
+
+def test_late_parents_in_random_graphs():
+    """
+    Tests random graphs whose nodes change their parents in each cycle.
+    """
+    for seed in range(30):
+        generator = random.Random(seed)
+        graph_manager = GraphManager()
+        root_nodes = [NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, RandomNode, x, seed)
+                      for x in range(20, 30)]
+        graph_manager.calculate()
+        inputs = {"selector0": 0, "selector1": 0, "selector2": 0, "value": 0}
+        for _ in range(10):
+            for name in inputs:
+                if generator.random() < 0.5:
+                    inputs[name] = generator.randrange(4)
+                    graph_manager.find_node("InputNode." + name).set_value(inputs[name])
+            graph_manager.calculate()
+            assert graph_manager.get_pending_node_count() == 0
+            for root_node in root_nodes:
+                assert root_node.value == get_expected_value(seed, root_node.index, inputs)
@@ -0,0 +1,29 @@
+from graph import *
+from test_nodes import *
+from datetime import date, timedelta
+import sys
+
+
+def test_memory_report():
+    """
+    Tests that the memory report estimates the memory used by each node type.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    for index in range(10):
+        NodeFactory.get_node(
+            graph_manager, GraphNode.GCType.NON_COLLECTABLE, CurrencyPairHolidayNode,
+            "EUR/USD", date(2015, 1, 1) + timedelta(days=index))
+    graph_manager.calculate()
+
+    report = graph_manager.memory_report()
+    assert [(x.node_type, x.node_count, x.edge_count) for x in report] == [
+        ("CurrencyPairHolidayNode", 10, 20),
+        ("CurrencyHolidaysNode", 2, 0)]
+
+    # Each node's estimate includes the node, its sets of links and its quality...
+    pair_node = graph_manager.find_node("CurrencyPairHolidayNode.EUR/USD_2015-01-01")
+    assert report[0].estimated_bytes >= 10 * (
+        sys.getsizeof(pair_node) + sys.getsizeof(pair_node._parent_nodes) + sys.getsizeof(pair_node.quality))
+    assert report[0].estimated_bytes > report[1].estimated_bytes
+    assert GraphManager().memory_report() == []
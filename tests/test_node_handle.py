@@ -0,0 +1,63 @@
+from graph import *
+from test_nodes import *
+from datetime import date
+import gc
+
+
+def test_node_handle():
+    """
+    Tests that nodes are released when their handles are released,
+    garbage-collected, or used in a with block.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+
+    # Each currency-pair holiday node keeps three nodes in the graph...
+    handle = NodeFactory.get_node_handle(graph_manager, CurrencyPairHolidayNode, "EUR/USD", date(2015, 7, 4))
+    graph_manager.calculate()
+    assert graph_manager.get_node_count() == 3
+    assert graph_manager.get_leak_report() == []
+
+    # Dropping the handle releases the node in the next cycle...
+    del handle
+    gc.collect()
+    graph_manager.calculate()
+    assert graph_manager.get_node_count() == 0
+
+    # With a with block...
+    with NodeFactory.get_node_handle(graph_manager, CurrencyPairHolidayNode, "EUR/USD", date(2015, 7, 4)) as node:
+        graph_manager.calculate()
+        assert node.is_holiday is False
+        assert graph_manager.get_node_count() == 3
+    graph_manager.calculate()
+    assert graph_manager.get_node_count() == 0
+
+    # Two handles for the same node...
+    handle_1 = NodeFactory.get_node_handle(graph_manager, CurrencyPairHolidayNode, "EUR/USD", date(2015, 7, 4))
+    handle_2 = NodeFactory.get_node_handle(graph_manager, CurrencyPairHolidayNode, "EUR/USD", date(2015, 7, 4))
+    handle_1.release()
+    handle_1.release()
+    assert handle_1.is_released() is True
+    graph_manager.calculate()
+    assert graph_manager.get_node_count() == 3
+    handle_2.release()
+    graph_manager.calculate()
+    assert graph_manager.get_node_count() == 0
+
+
+def test_leak_report():
+    """
+    Tests that non-collectable nodes without handles are reported.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    handle = NodeFactory.get_node_handle(graph_manager, CurrencyPairHolidayNode, "EUR/USD", date(2015, 7, 4))
+    NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, CurrencyHolidaysNode, "GBP")
+    NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE, CurrencyPairHolidayNode, "USD/JPY", date(2015, 7, 4))
+    graph_manager.calculate()
+
+    assert graph_manager.get_leak_report() == [
+        GraphManager.LeakedRoot("CurrencyPairHolidayNode.USD/JPY_2015-07-04", 1, 3),
+        GraphManager.LeakedRoot("CurrencyHolidaysNode.GBP", 1, 1)]
+    handle.release()
@@ -0,0 +1,89 @@
+from graph import *
+from test_nodes import *
+
+
+class CountingGraphManager(GraphManager):
+    """
+    Counts the lookups of nodes by ID.
+    """
+    def __init__(self):
+        super().__init__()
+        self.find_node_count = 0
+
+    def find_node(self, node_id):
+        self.find_node_count += 1
+        return super().find_node(node_id)
+
+
+class LeafNode(GraphNode):
+    def __init__(self, name, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+
+    def calculate(self):
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class BranchNode(GraphNode):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.names = ["A", "B"]
+        self.parents = []
+
+    def set_dependencies(self):
+        self.parents = [self.add_parent_node(LeafNode, x) for x in self.names]
+
+    def calculate(self):
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def test_parent_cache():
+    """
+    Tests that resetting dependencies reuses the parents found last time,
+    without looking them up again.
+    """
+    graph_manager = CountingGraphManager()
+    branch_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, BranchNode)
+    graph_manager.calculate()
+    leaf_nodes = branch_node.parents
+
+    # Only nodes whose dependencies are reset cache their parents...
+    assert branch_node._parent_cache is None
+    assert all(x._parent_cache is None for x in leaf_nodes)
+    branch_node.reset_dependencies()
+    assert branch_node.parents == leaf_nodes
+
+    graph_manager.find_node_count = 0
+    branch_node.reset_dependencies()
+    assert graph_manager.find_node_count == 0
+    assert branch_node.parents == leaf_nodes
+    assert branch_node._parent_nodes == set(leaf_nodes)
+
+    # New parameters are looked up, and parents no longer used are dropped
+    # from the cache...
+    branch_node.names = ["B", "C"]
+    branch_node.reset_dependencies()
+    assert graph_manager.find_node_count == 1
+    assert branch_node.parents[0] is leaf_nodes[1]
+    assert set(x[1] for x in branch_node._parent_cache) == {("B",), ("C",)}
+
+
+def test_parent_cache_disposed_parents():
+    """
+    Tests that parents which have been removed from the graph are not reused.
+    """
+    graph_manager = CountingGraphManager()
+    branch_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, BranchNode)
+    graph_manager.calculate()
+    leaf_node_a = branch_node.parents[0]
+
+    # We drop A, so it is garbage-collected, and then use it again...
+    branch_node.names = ["B"]
+    branch_node.reset_dependencies()
+    graph_manager.calculate()
+    assert leaf_node_a._is_disposed
+    branch_node.names = ["A", "B"]
+    branch_node.reset_dependencies()
+    graph_manager.calculate()
+    assert branch_node.parents[0] is not leaf_node_a
+    assert branch_node.parents[0] is graph_manager.find_node(leaf_node_a.node_id)
@@ -0,0 +1,122 @@
+from graph import *
+
+
+# The order in which nodes were calculated...
+calculation_order = []
+
+
+class SourceNode(GraphNode):
+    """
+    A node whose value can be set from outside the graph.
+    """
+    def __init__(self, name, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+        self.value = 0.0
+
+    def set_value(self, value):
+        self.value = value
+        self.needs_calculation()
+
+    def calculate(self):
+        calculation_order.append(self.name)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class RiskNode(GraphNode):
+    """
+    A (slow) low-priority node depending on a source.
+    """
+    def __init__(self, name, source, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+        self.source = source
+        self.source_node = None
+
+    def set_dependencies(self):
+        self.source_node = self.add_parent_node(SourceNode, self.source)
+
+    def calculate(self):
+        calculation_order.append(self.name)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class QuoteNode(GraphNode):
+    """
+    A latency-critical node depending on a source.
+    """
+    priority = 10
+
+    def __init__(self, name, source, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+        self.source = source
+        self.source_node = None
+
+    def set_dependencies(self):
+        self.source_node = self.add_parent_node(SourceNode, self.source)
+
+    def calculate(self):
+        calculation_order.append(self.name)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def test_high_priority_nodes_calculate_first():
+    """
+    Tests that high-priority nodes, and the nodes they depend on, are
+    calculated before lower-priority nodes, and that they are published
+    before the lower-priority nodes are calculated.
+    """
+    graph_manager = GraphManager()
+    risk_nodes = [
+        NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, RiskNode, "risk" + str(i), "A")
+        for i in range(5)]
+    quote_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, QuoteNode, "quote", "B")
+    graph_manager.calculate()
+
+    # The quote's source inherits the quote's priority...
+    source_b = quote_node.source_node
+    assert graph_manager.get_effective_priority(source_b) == 10
+    assert graph_manager.get_effective_priority(risk_nodes[0].source_node) == 0
+
+    # We publish the results as soon as the high-priority nodes are calculated...
+    published = []
+    graph_manager.priority_published_callback = \
+        lambda priority: published.append((priority, list(calculation_order)))
+
+    # We update both sources. The quote should calculate before any risk...
+    del calculation_order[:]
+    risk_nodes[0].source_node.set_value(1.0)
+    source_b.set_value(2.0)
+    graph_manager.calculate()
+    assert calculation_order.index("quote") < calculation_order.index("A")
+    assert calculation_order[:2] == ["B", "quote"]
+    assert len(calculation_order) == 8
+    assert published == [(10, ["B", "quote"])]
+
+
+def test_root_node_priority():
+    """
+    Tests setting the priority of an individual root node.
+    """
+    graph_manager = GraphManager()
+    risk_node_1 = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, RiskNode, "risk1", "A")
+    risk_node_2 = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, RiskNode, "risk2", "B")
+    graph_manager.calculate()
+
+    graph_manager.set_node_priority(risk_node_2, 5)
+    assert graph_manager.get_effective_priority(risk_node_2.source_node) == 5
+    assert graph_manager.get_effective_priority(risk_node_1.source_node) == 0
+
+    del calculation_order[:]
+    risk_node_1.source_node.set_value(1.0)
+    risk_node_2.source_node.set_value(2.0)
+    graph_manager.calculate()
+    assert calculation_order == ["B", "risk2", "A", "risk1"]
+
+    # Negative priorities are not allowed...
+    try:
+        graph_manager.set_node_priority(risk_node_1, -1)
+        assert False
+    except GraphException:
+        pass
@@ -0,0 +1,108 @@
+from graph import *
+from test_nodes import *
+from datetime import date
+
+
+def _make_engine():
+    """
+    Creates a graph with a price node, and a replay engine for it.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    price_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE, PriceNode, "EUR/USD", date(2015, 7, 4))
+    graph_manager.calculate()
+
+    engine = ReplayEngine(graph_manager, {"holiday_db": graph_manager.environment.holiday_db})
+    engine.output_node_ids = [price_node.node_id]
+    engine.get_output = lambda node: node.price
+    return engine
+
+
+def _get_prices(outputs):
+    """
+    Returns the prices captured in each cycle.
+    """
+    return [x.values["PriceNode.EUR/USD_2015-07-04"] for x in outputs]
+
+
+# The USD holiday is added and removed twice, then the EUR holiday is added...
+EVENTS = [
+    ReplayEngine.InputEvent(0.5, "holiday_db", "add_holiday", ("USD", date(2015, 7, 4))),
+    ReplayEngine.InputEvent(1.5, "holiday_db", "remove_holiday", ("USD", date(2015, 7, 4))),
+    ReplayEngine.InputEvent(1.7, "holiday_db", "add_holiday", ("USD", date(2015, 7, 4))),
+    ReplayEngine.InputEvent(1.9, "holiday_db", "remove_holiday", ("USD", date(2015, 7, 4))),
+    ReplayEngine.InputEvent(4.0, "holiday_db", "add_holiday", ("EUR", date(2015, 7, 4)))]
+
+
+def test_replay_engine():
+    """
+    Tests replaying events with different cycle boundaries.
+    """
+    engine = _make_engine()
+    outputs = engine.replay(EVENTS[:4])
+    assert _get_prices(outputs) == [123.0, 456.0, 123.0, 456.0]
+    assert [x.event_count for x in outputs] == [1, 2, 3, 4]
+
+    engine = _make_engine()
+    engine.cycle_boundary = ReplayEngine.CycleBoundary.PER_N_EVENTS
+    engine.events_per_cycle = 2
+    outputs = engine.replay(EVENTS)
+    assert _get_prices(outputs) == [456.0, 456.0, 123.0]
+    assert engine.cycle_count == 3
+
+    engine = _make_engine()
+    engine.cycle_boundary = ReplayEngine.CycleBoundary.PER_TIME_SLICE
+    engine.time_slice_seconds = 1.0
+    engine.compile_graph = True
+    outputs = engine.replay(EVENTS)
+    assert [x.timestamp for x in outputs] == [0.5, 1.9, 4.0]
+    assert _get_prices(outputs) == [123.0, 456.0, 123.0]
+
+
+def test_replay_engine_checkpoints():
+    """
+    Tests that a replay can be resumed from a checkpoint.
+    """
+    engine = _make_engine()
+    checkpoints = []
+    engine.checkpoint_cycles = 2
+    engine.checkpoint_callback = checkpoints.append
+    outputs = engine.replay(EVENTS[:3])
+    assert checkpoints == [2]
+
+    # We resume from the checkpoint, in a graph whose inputs are in the
+    # state they were in at the checkpoint...
+    engine = _make_engine()
+    engine.replay(EVENTS[:checkpoints[-1]])
+    outputs = engine.replay(EVENTS, start_index=checkpoints[-1])
+    assert [x.event_count for x in outputs] == [3, 4, 5]
+    assert _get_prices(outputs) == [123.0, 456.0, 123.0]
+
+
+class EventRecorder(object):
+    """
+    A target which records the holidays added to it.
+    """
+    def __init__(self):
+        self.holidays = []
+
+    def add_holiday(self, currency, holiday):
+        self.holidays.append((currency, holiday))
+
+
+def test_replay_engine_changed_targets():
+    """
+    Tests that events are applied to the current targets when the targets
+    are replaced between replays.
+    """
+    engine = _make_engine()
+    first_recorder = EventRecorder()
+    engine.targets = {"holiday_db": first_recorder}
+    engine.replay(EVENTS[:1])
+
+    second_recorder = EventRecorder()
+    engine.targets["holiday_db"] = second_recorder
+    engine.replay(EVENTS[4:])
+    assert first_recorder.holidays == [("USD", date(2015, 7, 4))]
+    assert second_recorder.holidays == [("EUR", date(2015, 7, 4))]
@@ -0,0 +1,83 @@
+from graph import *
+from test_nodes import *
+from datetime import date
+
+
+def _make_graph():
+    """
+    Creates a graph with EUR/USD and GBP/USD prices for 24-Dec.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    for currency_pair in ("EUR/USD", "GBP/USD"):
+        NodeFactory.get_node(
+            graph_manager, GraphNode.GCType.NON_COLLECTABLE, PriceNode, currency_pair, date(2026, 12, 24))
+    return graph_manager
+
+
+def _make_holiday_override(currency):
+    """
+    Returns a scenario which makes 24-Dec a holiday for the currency, by
+    overriding its holidays node.
+    """
+    def scenario(graph_manager):
+        node = graph_manager.get_node("CurrencyHolidaysNode." + currency)
+        graph_manager.override(node, holidays=node.holidays | {date(2026, 12, 24)})
+    return scenario
+
+
+def _make_holiday_edit(currency):
+    """
+    Returns a scenario which makes 24-Dec a holiday for the currency, by
+    changing the holiday database.
+    """
+    def scenario(graph_manager):
+        graph_manager.environment.holiday_db.add_holiday(currency, date(2026, 12, 24))
+    return scenario
+
+
+def test_scenario_runner():
+    """
+    Tests that scenarios run in worker processes, and serially, give
+    the expected results.
+    """
+    graph_manager = _make_graph()
+    scenarios = [_make_holiday_override(x) for x in ("EUR", "GBP", "USD")] + [lambda graph_manager: None]
+    output_node_ids = ["PriceNode.EUR/USD_2026-12-24", "PriceNode.GBP/USD_2026-12-24"]
+    expected_results = [
+        {output_node_ids[0]: 123.0, output_node_ids[1]: 456.0},
+        {output_node_ids[0]: 456.0, output_node_ids[1]: 123.0},
+        {output_node_ids[0]: 123.0, output_node_ids[1]: 123.0},
+        {output_node_ids[0]: 456.0, output_node_ids[1]: 456.0}]
+
+    for process_count in (1, 2):
+        runner = ScenarioRunner(graph_manager, process_count)
+        assert runner.run(scenarios, output_node_ids, lambda node: node.price) == expected_results
+
+    # The base graph is unchanged...
+    assert graph_manager.get_node(output_node_ids[0]).price == 456.0
+    assert graph_manager.get_node_count() == 8
+
+    # Scenarios isolated by process can change the holiday database...
+    scenarios = [_make_holiday_edit(x) for x in ("EUR", "GBP", "USD", "JPY")]
+    runner = ScenarioRunner(graph_manager, 2, ScenarioRunner.IsolationType.PROCESS)
+    assert runner.run(scenarios, output_node_ids, lambda node: node.price) == expected_results
+    assert graph_manager.environment.holiday_db.get_currency_holidays("USD").holidays == set()
+
+
+def test_scenario_runner_outputs():
+    """
+    Tests that the runner needs a get_output function which returns values
+    rather than nodes.
+    """
+    graph_manager = _make_graph()
+    runner = ScenarioRunner(graph_manager, 1)
+    output_node_ids = ["PriceNode.EUR/USD_2026-12-24"]
+    for get_output in (None, lambda node: node):
+        try:
+            runner.run([lambda graph_manager: None], output_node_ids, get_output)
+            assert False
+        except GraphException:
+            pass
+    assert runner.run([lambda graph_manager: None], output_node_ids, lambda node: node.price) == [
+        {output_node_ids[0]: 456.0}]
@@ -0,0 +1,74 @@
+from graph import *
+import time
+import tracemalloc
+
+
+class SleepNode(GraphNode):
+    """
+    A node which takes a configurable time to calculate.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.duration = 0.0
+
+    def set_duration(self, duration):
+        self.duration = duration
+        self.needs_calculation()
+
+    def calculate(self):
+        time.sleep(self.duration)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def test_slow_cycle_profiler(tmp_path):
+    """
+    Tests that reports are written for slow calculations, and not for
+    fast ones.
+    """
+    graph_manager = GraphManager()
+    profiler = SlowCycleProfiler(0.02, str(tmp_path), SlowCycleProfiler.ProfilerType.CPROFILE)
+    graph_manager.slow_cycle_profiler = profiler
+    sleep_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, SleepNode)
+    graph_manager.calculate()
+    assert profiler.report_paths == []
+
+    # A slow calculation is reported...
+    sleep_node.set_duration(0.03)
+    graph_manager.calculate()
+    assert len(profiler.report_paths) == 1
+    with open(profiler.report_paths[0]) as report_file:
+        report = report_file.read()
+    assert "SleepNode.ID" in report
+    assert "cProfile:" in report
+
+    # A fast one is not...
+    sleep_node.set_duration(0.0)
+    graph_manager.calculate()
+    assert len(profiler.report_paths) == 1
+
+
+def test_slow_cycle_profiler_tracemalloc(tmp_path):
+    """
+    Tests reporting memory allocations for slow calculations.
+    """
+    graph_manager = GraphManager()
+    profiler = SlowCycleProfiler(0.02, str(tmp_path), SlowCycleProfiler.ProfilerType.TRACEMALLOC)
+    graph_manager.slow_cycle_profiler = profiler
+    sleep_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, SleepNode)
+    sleep_node.set_duration(0.03)
+    graph_manager.calculate()
+    assert len(profiler.report_paths) == 1
+    with open(profiler.report_paths[0]) as report_file:
+        report = report_file.read()
+    assert "Traced memory" in report
+
+    # Removing the profiler stops the tracing it started...
+    graph_manager.slow_cycle_profiler = None
+    assert not tracemalloc.is_tracing()
+
+    # A profiler does not stop tracing which it did not start...
+    tracemalloc.start()
+    graph_manager.slow_cycle_profiler = SlowCycleProfiler(0.02, str(tmp_path), SlowCycleProfiler.ProfilerType.TRACEMALLOC)
+    graph_manager.dispose()
+    assert tracemalloc.is_tracing()
+    tracemalloc.stop()
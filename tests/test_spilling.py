@@ -0,0 +1,117 @@
+from graph import *
+from test_nodes import *
+
+
+class TableNode(GraphNode):
+    """
+    Holds a table of values, which can be spilled to disk.
+    """
+    spillable_attributes = ("rows", "total")
+
+    def __init__(self, name, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+        self.row_count = 3
+        self.rows = []
+        self.total = 0
+
+    def calculate(self):
+        self.rows = list(range(self.row_count))
+        self.total = sum(self.rows)
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+class TableTotalNode(GraphNode):
+    """
+    Reads the total of a table.
+    """
+    def __init__(self, name, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+        self.table_node = None
+        self.total = 0
+
+    def set_dependencies(self):
+        self.table_node = self.add_parent_node(TableNode, self.name)
+
+    def calculate(self):
+        self.total = self.table_node.total
+        return GraphNode.CalculateChildrenType.CALCULATE_CHILDREN
+
+
+def _create_graph(tmp_path, idle_cycles):
+    graph_manager = GraphManager()
+    graph_manager.node_spiller = NodeSpiller(str(tmp_path / "spill.db"), idle_cycles=idle_cycles)
+    return graph_manager
+
+
+def test_spilling(tmp_path):
+    """
+    Tests that the state of idle nodes is spilled to disk, and reloaded
+    when it is read.
+    """
+    graph_manager = _create_graph(tmp_path, 2)
+    table_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, TableNode, "A")
+    graph_manager.calculate()
+    assert "rows" in table_node.__dict__
+
+    # The node is spilled once it has been idle for two cycles...
+    graph_manager.calculate()
+    assert graph_manager.node_spiller.get_spilled_node_count() == 0
+    graph_manager.calculate()
+    assert graph_manager.node_spiller.get_spilled_node_count() == 1
+    assert "rows" not in table_node.__dict__ and "total" not in table_node.__dict__
+    assert table_node.row_count == 3
+
+    # Reading the state reloads it...
+    assert table_node.total == 3
+    assert table_node.rows == [0, 1, 2]
+    assert graph_manager.node_spiller.get_spilled_node_count() == 0
+
+    # Other missing attributes still raise...
+    try:
+        table_node.columns
+        assert False
+    except AttributeError:
+        pass
+
+
+def test_spilling_calculation(tmp_path):
+    """
+    Tests that spilled nodes are reloaded before they calculate, and that
+    their children see the reloaded state.
+    """
+    graph_manager = _create_graph(tmp_path, 1)
+    total_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, TableTotalNode, "A")
+    graph_manager.calculate()
+    table_node = total_node.table_node
+    graph_manager.calculate()
+    assert table_node._is_spilled
+
+    # The node reloads its state before it recalculates...
+    table_node.row_count = 5
+    table_node.needs_calculation()
+    graph_manager.calculate()
+    assert total_node.total == 10
+    assert table_node.rows == [0, 1, 2, 3, 4]
+
+    # Removing the node deletes its spilled state...
+    graph_manager.calculate()
+    assert graph_manager.node_spiller.get_spilled_node_count() == 1
+    graph_manager.release_node(total_node)
+    graph_manager.calculate()
+    assert graph_manager.get_node_count() == 0
+    assert graph_manager.node_spiller.get_spilled_node_count() == 0
+
+
+def test_spilling_unpicklable_state(tmp_path):
+    """
+    Tests that nodes whose state cannot be pickled stay in memory.
+    """
+    graph_manager = _create_graph(tmp_path, 1)
+    table_node = NodeFactory.get_node(graph_manager, GraphNode.GCType.NON_COLLECTABLE, TableNode, "A")
+    graph_manager.calculate()
+    table_node.rows = [lambda: None]
+    graph_manager.calculate()
+    assert graph_manager.node_spiller.get_spilled_node_count() == 0
+    assert not table_node._is_spilled and len(table_node.rows) == 1
@@ -0,0 +1,43 @@
+from graph import *
+from test_nodes import *
+from datetime import date
+
+
+def test_subscriptions():
+    """
+    Tests that subscribers are told about the nodes whose output changed
+    in each calculation cycle, in one callback per cycle.
+    """
+    graph_manager = GraphManager()
+    graph_manager.environment = Environment()
+    holiday_db = graph_manager.environment.holiday_db
+    eur_usd_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE, CurrencyPairHolidayNode, "EUR/USD", date(2015, 7, 4))
+    gbp_usd_node = NodeFactory.get_node(
+        graph_manager, GraphNode.GCType.NON_COLLECTABLE, CurrencyPairHolidayNode, "GBP/USD", date(2015, 7, 4))
+    graph_manager.calculate()
+    usd_node = graph_manager.get_node("CurrencyHolidaysNode.USD")
+
+    notifications = []
+    graph_manager.subscribe(eur_usd_node, notifications.append)
+    graph_manager.subscribe(gbp_usd_node, notifications.append)
+    graph_manager.subscribe(usd_node, notifications.append)
+
+    # The USD holiday changes the USD node and both pairs...
+    holiday_db.add_holiday("USD", date(2015, 7, 4))
+    graph_manager.calculate()
+    assert len(notifications) == 1
+    assert set(notifications[0]) == {eur_usd_node, gbp_usd_node, usd_node}
+
+    # A GBP holiday on a different date changes no subscribed nodes...
+    notifications.clear()
+    holiday_db.add_holiday("GBP", date(2015, 12, 25))
+    graph_manager.calculate()
+    assert notifications == []
+
+    # After unsubscribing from the pairs, we only hear about the USD node...
+    graph_manager.unsubscribe(eur_usd_node, notifications.append)
+    graph_manager.unsubscribe(gbp_usd_node, notifications.append)
+    holiday_db.remove_holiday("USD", date(2015, 7, 4))
+    graph_manager.calculate()
+    assert notifications == [[usd_node]]